@@ -5,6 +5,14 @@ from pyrogram.raw.all import layer
 from config import Config
 from aiohttp import web
 from route import web_server
+from helper.database import jishubotz
+from helper.transfer import transfer
+from helper.log_mirror import log_mirror
+from helper.workspace import workspace
+from helper.ratelimit import limiter
+from helper.broadcast import broadcaster
+from helper.leech import downloader
+from pyrogram.session import Session
 import pyromod
 import pyrogram.utils
 
@@ -36,11 +44,20 @@ class Bot(Client):
             pass
         # ------------------------------------------------------------
 
+        removed = workspace.sweep()
+        if removed:
+            print(f"Removed {removed} Leftover Files From The Last Run")
+        downloader.sweep()
+        await jishubotz.load_users()
+        await log_mirror.load()
+
         me = await self.get_me()
         self.mention = me.mention
         self.username = me.username  
         self.uptime = Config.BOT_UPTIME     
 
+        await broadcaster.resume(self)
+
         if Config.WEBHOOK:
             app = web.AppRunner(await web_server())
             await app.setup()       
@@ -69,6 +86,26 @@ class Bot(Client):
             except:
                 print("Please Make This Bot Admin In Your Log Channel")
 
+    async def invoke(self, query, retries=Session.MAX_RETRIES, timeout=Session.WAIT_TIMEOUT, sleep_threshold=None):
+        # every API call of the main session goes through the global rate limiter
+        threshold = self.sleep_threshold if sleep_threshold is None else sleep_threshold
+        return await limiter.invoke(super().invoke, query, retries, timeout, threshold)
+
+    async def save_file(self, path, file_id=None, file_part=0, progress=None, progress_args=()):
+        # every send_* goes through here: big local files are uploaded in parallel
+        if file_id is None and transfer.wants_upload(path):
+            try:
+                return await transfer.save_big_file(self, path, progress=progress, progress_args=progress_args)
+            except Exception as e:
+                print(f"Parallel Upload Failed, Falling Back : {e}")
+        return await super().save_file(path, file_id, file_part, progress, progress_args)
+
+    async def stop(self, *args):
+        await transfer.close()
+        await downloader.close()
+        await jishubotz.close()
+        await super().stop(*args)
+
 Bot().run()
 
 
@@ -12,6 +12,69 @@ class Config(object):
     # database config
     DATABASE_NAME = os.environ.get("DATABASE_NAME","Cluster0")     
     DATABASE_URL  = os.environ.get("DATABASE_URL","")
+    DATABASE_BACKEND = os.environ.get("DATABASE_BACKEND", "mongo")   # mongo / sqlite
+    SQLITE_PATH      = os.environ.get("SQLITE_PATH", "renamer.db")
+
+    # user settings cache config
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+    USER_CACHE_TTL  = int(os.environ.get("USER_CACHE_TTL", "300"))
+
+    # write-behind batching of user inserts / setting updates
+    DB_WRITE_BEHIND       = os.environ.get("DB_WRITE_BEHIND", "False").lower() == "true"
+    DB_FLUSH_INTERVAL     = float(os.environ.get("DB_FLUSH_INTERVAL", "1"))
+    DB_MAX_PENDING_WRITES = int(os.environ.get("DB_MAX_PENDING_WRITES", "1000"))
+
+    # result cache: reuse the upload of an identical earlier rename
+    RESULT_CACHE             = os.environ.get("RESULT_CACHE", "True").lower() == "true"
+    RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "100000"))
+    RESULT_CACHE_MAX_AGE     = int(os.environ.get("RESULT_CACHE_MAX_AGE", str(30 * 86400)))
+
+    # seconds a file waits for its new name / output type
+    RENAME_TIMEOUT = int(os.environ.get("RENAME_TIMEOUT", "1800"))
+
+    # rename job scheduler
+    MAX_CONCURRENT     = int(os.environ.get("MAX_CONCURRENT", "10"))        # jobs admitted into the pipeline
+    MAX_PER_USER       = int(os.environ.get("MAX_PER_USER", "1"))           # jobs running at once per user
+    EXPRESS_SIZE_LIMIT = int(os.environ.get("EXPRESS_SIZE_LIMIT", "50"))    # MB, smaller files skip ahead
+
+    # rename pipeline stages (download -> ffmpeg -> upload)
+    DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", "3"))
+    FFMPEG_WORKERS   = int(os.environ.get("FFMPEG_WORKERS", "0"))    # 0 = one per CPU core
+    UPLOAD_WORKERS   = int(os.environ.get("UPLOAD_WORKERS", "3"))
+    STAGE_QUEUE_SIZE = int(os.environ.get("STAGE_QUEUE_SIZE", "50"))
+
+    # pipe MKV/WebM/TS/audio downloads straight into ffmpeg when metadata is on
+    STREAM_REMUX = os.environ.get("STREAM_REMUX", "True").lower() == "true"
+    INPLACE_TAGS = os.environ.get("INPLACE_TAGS", "True").lower() == "true"
+
+    # parallel MTProto transfers for big files
+    TRANSFER_PARALLELISM = int(os.environ.get("TRANSFER_PARALLELISM", "4"))   # parts in flight per file, 1 = off
+    TRANSFER_SESSIONS    = int(os.environ.get("TRANSFER_SESSIONS", "2"))      # media sessions per DC
+    PARALLEL_MIN_SIZE    = int(os.environ.get("PARALLEL_MIN_SIZE", "20"))     # MB
+
+    # /leech direct link downloads
+    LEECH_DIR         = os.environ.get("LEECH_DIR", "leech")                  # partial downloads, kept for resuming
+    LEECH_CONNECTIONS = int(os.environ.get("LEECH_CONNECTIONS", "4"))         # Range requests in flight per file
+
+    # outbound Telegram API limits (messages per second / per chat / per group per minute)
+    OUTBOUND_RATE = float(os.environ.get("OUTBOUND_RATE", "30"))
+    CHAT_RATE     = float(os.environ.get("CHAT_RATE", "1"))
+    GROUP_RATE    = float(os.environ.get("GROUP_RATE", "20"))
+
+    # messages in flight while broadcasting
+    BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", "20"))
+
+    # seconds between progress bar edits of one status message
+    PROGRESS_INTERVAL = int(os.environ.get("PROGRESS_INTERVAL", "5"))
+
+    # per-job scratch directories and disk quota
+    WORKSPACE_DIR   = os.environ.get("WORKSPACE_DIR", "downloads")
+    WORKSPACE_QUOTA = int(os.environ.get("WORKSPACE_QUOTA", "20"))     # GB, 0 = only check free space
+    MIN_FREE_SPACE  = int(os.environ.get("MIN_FREE_SPACE", "1024"))    # MB kept free on the disk
+
+    # prepared custom thumbnails kept on disk
+    THUMB_CACHE_DIR  = os.environ.get("THUMB_CACHE_DIR", "thumbs")
+    THUMB_CACHE_SIZE = int(os.environ.get("THUMB_CACHE_SIZE", "1000"))
  
     # other configs
     BOT_UPTIME  = time.time()
@@ -20,6 +83,8 @@ class Config(object):
 
     # channels logs
     FORCE_SUBS   = os.environ.get("FORCE_SUBS", "") 
+    FORCE_SUB_CACHE_TTL    = int(os.environ.get("FORCE_SUB_CACHE_TTL", "600"))
+    FORCE_SUB_NEGATIVE_TTL = int(os.environ.get("FORCE_SUB_NEGATIVE_TTL", "30"))
     LOG_CHANNEL = int(os.environ.get("LOG_CHANNEL", ""))
 
     # wes response configuration     
@@ -75,9 +140,31 @@ class Txt(object):
 
 ➪ Send Any File And Type New File Name And Select The Format [ Document, Video, Audio ].           
 
+🔗 <b><u>How To Rename A Link</u></b>
+
+➪ /leech - Send <code>/leech</code> With A Direct Download Link, Then Rename It Like Any File.
+
+📦 <b><u>How To Rename Many Files</u></b>
+
+➪ /batch - Send The Files (Or An Album), Then One Name Template For All Of Them.
+
 𝗔𝗻𝘆 𝗢𝘁𝗵𝗲𝗿 𝗛𝗲𝗹𝗽 𝗖𝗼𝗻𝘁𝗮𝗰𝘁 :- <a href=https://t.me/World_Fastest_Bots>Developer</a>
 """
 
+    BATCH_TXT = """<b>📦 Batch Rename Started</b>
+
+➪ Send Up To {max_files} Files Or Albums Now.
+➪ Then Send One Name Template, For Example:
+<code>Show S01E{{episode:02}} {{quality}}.mkv</code>
+
+<b>Variables :</b>
+<code>{{n}}</code> - Position Of The File In The Batch (1, 2, 3...)
+<code>{{season}}</code> / <code>{{episode}}</code> - From Names Like S01E05, Ep 05, - 05
+<code>{{quality}}</code> - 1080p, 720p... From The Old Name
+<code>{{name}}</code> / <code>{{ext}}</code> - Old Name And Extension
+
+➪ /cancel_batch - Stop Collecting Files"""
+
     PROGRESS_BAR = """\n
  <b>🔗 Size :</b> {1} | {2}
 ️ <b>⏳️ Done :</b> {0}%
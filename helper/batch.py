@@ -0,0 +1,140 @@
+import asyncio
+import re
+import string
+import types
+from config import Config
+from .ratelimit import outbound_priority, LOW
+
+# word boundaries that also treat "_" as a separator, so "hd" isn't found in "Mahdi" but is in "Show_HD"
+QUALITY = re.compile(r"(?<![a-z0-9])(2160p|1440p|1080p|720p|576p|480p|360p|240p|4k|uhd|hd)(?![a-z0-9])", re.I)
+SEASON_EPISODE = re.compile(r"s(\d{1,2})[ ._-]*e(\d{1,4})", re.I)
+# "Show - 2019" and "[2019]" are years, not episodes
+NOT_YEAR = r"(?!(?:19|20)\d\d(?!\d))"
+EPISODE = re.compile(rf"(?:\bep?(?:isode)?[ ._-]*(\d{{1,4}})\b|[ _-]-[ _-]?{NOT_YEAR}(\d{{1,4}})\b|\[{NOT_YEAR}(\d{{1,4}})\])", re.I)
+
+TEMPLATE_VARIABLES = ("n", "season", "episode", "quality", "name", "ext")
+
+
+def name_variables(file_name, n):
+    """Variables a batch template can use, pulled from the original file name."""
+    file_name = file_name or ""
+    stem, dot, ext = file_name.rpartition(".")
+    if not dot:
+        stem, ext = file_name, ""
+    season, episode = 1, n
+    match = SEASON_EPISODE.search(stem)
+    if match:
+        season, episode = int(match.group(1)), int(match.group(2))
+    else:
+        match = EPISODE.search(stem)
+        if match:
+            episode = int(next(g for g in match.groups() if g))
+    quality = QUALITY.search(stem)
+    return {
+        "n": n,
+        "season": season,
+        "episode": episode,
+        "quality": quality.group(1) if quality else "",
+        "name": stem,
+        "ext": ext,
+    }
+
+
+def check_template(template):
+    """Raise ValueError if `template` uses an unknown variable or a broken format."""
+    try:
+        fields = [f for _, f, _, _ in string.Formatter().parse(template) if f is not None]
+    except ValueError as e:
+        raise ValueError(f"Broken Template: {e}")
+    for field in fields:
+        if field.split(".")[0].split("[")[0] not in TEMPLATE_VARIABLES:
+            raise ValueError(f"Unknown Variable `{{{field}}}`")
+
+
+def render_template(template, file_name, n):
+    variables = name_variables(file_name, n)
+    new_name = " ".join(template.format(**variables).split())
+    if "." not in new_name and variables["ext"]:
+        new_name = f"{new_name}.{variables['ext']}"
+    return new_name
+
+
+class JobStatus:
+    """
+    Stands in for a job's status message inside a batch: the job "edits"
+    it like a normal message, and the batch shows one line per job.
+    """
+
+    def __init__(self, batch, index, name):
+        self.batch = batch
+        self.chat = types.SimpleNamespace(id=batch.message.chat.id)
+        self.id = f"batch-{batch.message.id}-{index}"
+        self.name = name
+        self.text = "⏳ Queued"
+        self.finished = False
+        self.ok = None
+
+    async def edit(self, text=None, *args, **kwargs):
+        first = (text or "").strip().splitlines()[0] if text else ""
+        percent = re.search(r"Done :</b> ([\d.]+)%", text or "")
+        self.text = f"{first} {percent.group(1)}%" if percent else first
+        return self
+
+    async def delete(self, *args, **kwargs):
+        self.finished = True
+
+
+class BatchStatus:
+    """One status message for a whole batch, refreshed every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self, message, names):
+        self.message = message
+        self.jobs = [JobStatus(self, i, name) for i, name in enumerate(names)]
+        self.done = 0
+        self.failed = 0
+        self._rendered = None
+
+    def finish(self, job_status, ok):
+        job_status.finished = True
+        job_status.ok = ok
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+
+    def render(self, final=False):
+        total = len(self.jobs)
+        head = "✅ **Batch Finished**" if final else "📦 **Batch Rename**"
+        lines = [f"{head}\n\n**Done :** `{self.done}` / `{total}` | **Failed :** `{self.failed}`"]
+        if not final:
+            active = [j for j in self.jobs if not j.finished and not j.text.startswith("⏳")]
+            for job in active[:5]:
+                lines.append(f"• `{job.name}`\n   {job.text}")
+            waiting = sum(1 for j in self.jobs if not j.finished and j.text.startswith("⏳"))
+            if waiting:
+                lines.append(f"\n⏳ {waiting} More Waiting")
+        else:
+            failed = [j for j in self.jobs if j.ok is False]
+            for job in failed[:10]:
+                lines.append(f"• `{job.name}` : {job.text}")
+        return "\n".join(lines)
+
+    async def _edit(self, text):
+        if text == self._rendered:
+            return
+        try:
+            await self.message.edit(text)
+            self._rendered = text
+        except Exception as e:
+            print(f"Batch Status Error: {e}")
+
+    async def run(self, jobs):
+        """Await the job coroutines while keeping the combined message fresh."""
+        tasks = [asyncio.ensure_future(job) for job in jobs]
+        outbound_priority.set(LOW)  # after creating the jobs, so only the status edits are background
+        waiter = asyncio.ensure_future(asyncio.gather(*tasks, return_exceptions=True))
+        while not waiter.done():
+            await self._edit(self.render())
+            await asyncio.wait([waiter], timeout=Config.PROGRESS_INTERVAL)
+        await self._edit(self.render(final=True))
+        return waiter.result()
@@ -0,0 +1,171 @@
+import asyncio
+import datetime
+import time
+from pyrogram.errors import FloodWait, InputUserDeactivated, UserIsBlocked, PeerIdInvalid
+from config import Config
+from .database import jishubotz
+from .ratelimit import outbound_priority, LOW
+
+DEAD_USER_ERRORS = (InputUserDeactivated, UserIsBlocked, PeerIdInvalid)
+
+
+class BroadcastEngine:
+    """
+    Copies one message to every user with `concurrency` sends in flight.
+
+    User ids are read in ascending order, `batch_size` at a time. After
+    every batch the last id and the counters are checkpointed in the
+    "config" table, so a restarted bot resumes where it stopped (at most
+    one batch is sent twice). Dead users are deleted `delete_batch` at a
+    time. Sending speed is capped by the global rate limiter, not here.
+    """
+
+    TABLE = "config"
+    KEY = "broadcast"
+
+    def __init__(self, database, concurrency=20, batch_size=1000, delete_batch=500, report_interval=10):
+        self.database = database
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.delete_batch = delete_batch
+        self.report_interval = report_interval
+        self.state = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def start(self, bot, message, status_msg):
+        """Broadcast `message` to all users, reporting into `status_msg`. False if one is already running."""
+        if self.running:
+            return False
+        self.state = {
+            "from_chat": message.chat.id,
+            "message_id": message.id,
+            "status_chat": status_msg.chat.id,
+            "status_id": status_msg.id,
+            "after": None,
+            "total": 0,
+            "done": 0,
+            "success": 0,
+            "failed": 0,
+            "removed": 0,
+            "elapsed": 0,
+        }
+        # claim the slot before the first await, so a second /broadcast sees it running
+        self._task = asyncio.create_task(self._begin(bot))
+        return True
+
+    async def _begin(self, bot):
+        self.state["total"] = await self.database.total_users_count()
+        await self._save(True)
+        await self._run(bot)
+
+    async def resume(self, bot):
+        """Continue a broadcast that was interrupted by a restart (call once at startup)."""
+        try:
+            doc = await self.database.backend.find_one(self.TABLE, self.KEY)
+        except Exception as e:
+            print(f"Broadcast Resume Error: {e}")
+            return
+        if not doc or not doc.get("running") or self.running:
+            return
+        doc.pop("_id", None)
+        doc.pop("running", None)
+        self.state = doc
+        self._task = asyncio.create_task(self._run(bot))
+
+    async def _save(self, running):
+        try:
+            await self.database.backend.update_one(self.TABLE, self.KEY, {**self.state, "running": running}, upsert=True)
+        except Exception as e:
+            print(f"Broadcast Checkpoint Error: {e}")
+
+    async def _send(self, bot, user_id):
+        while True:
+            try:
+                await bot.copy_message(int(user_id), self.state["from_chat"], self.state["message_id"])
+                return 200
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+            except DEAD_USER_ERRORS:
+                return 400
+            except Exception as e:
+                print(f"Broadcast Error {user_id} : {e}")
+                return 500
+
+    async def _send_batch(self, bot, batch, dead):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(user_id):
+            async with semaphore:
+                return user_id, await self._send(bot, user_id)
+
+        for user_id, code in await asyncio.gather(*(one(user_id) for user_id in batch)):
+            if code == 200:
+                self.state["success"] += 1
+            else:
+                self.state["failed"] += 1
+            if code == 400:
+                dead.append(user_id)
+        self.state["done"] += len(batch)
+        self.state["after"] = batch[-1]
+
+    async def _remove(self, dead):
+        if dead:
+            await self.database.delete_users(dead)
+            self.state["removed"] += len(dead)
+            dead.clear()
+
+    def _status(self, title, speed):
+        state = self.state
+        left = max(state["total"] - state["done"], 0)
+        eta = datetime.timedelta(seconds=int(left / speed)) if speed else "-"
+        return (
+            f"**{title}** \n\nTotal Users {state['total']}\nCompleted: {state['done']} / {state['total']}\n"
+            f"Success: {state['success']}\nFailed: {state['failed']}\nRemoved: {state['removed']}\n\n"
+            f"Speed: `{speed:.1f} msg/s`\nElapsed: `{datetime.timedelta(seconds=int(state['elapsed']))}`\nETA: `{eta}`"
+        )
+
+    async def _report(self, bot, text):
+        try:
+            await bot.edit_message_text(self.state["status_chat"], self.state["status_id"], text)
+        except Exception as e:
+            print(f"Broadcast Status Error: {e}")
+
+    async def _run(self, bot):
+        outbound_priority.set(LOW)
+        started = time.time()
+        elapsed_before = self.state["elapsed"]
+        done_before = self.state["done"]
+        last_report = started
+
+        def speed():
+            # this run only, so a resume doesn't skew it
+            self.state["elapsed"] = elapsed_before + time.time() - started
+            return (self.state["done"] - done_before) / max(time.time() - started, 1)
+
+        batch, dead = [], []
+        async for user_id in self.database.iter_user_ids(after=self.state["after"], batch_size=self.batch_size):
+            batch.append(user_id)
+            if len(batch) < self.batch_size:
+                continue
+            await self._send_batch(bot, batch, dead)
+            batch = []
+            if len(dead) >= self.delete_batch:
+                await self._remove(dead)
+            rate = speed()
+            await self._save(True)
+            if time.time() - last_report >= self.report_interval:
+                last_report = time.time()
+                await self._report(bot, self._status("Broadcast In Progress:", rate))
+        if batch:
+            await self._send_batch(bot, batch, dead)
+        await self._remove(dead)
+        rate = speed()
+        await self._save(False)
+        await self._report(bot, self._status("Broadcast Completed:", rate))
+
+
+broadcaster = BroadcastEngine(jishubotz, concurrency=Config.BROADCAST_CONCURRENCY)
@@ -0,0 +1,52 @@
+from config import Config
+from .cache import TTLCache
+
+
+class PendingRename:
+    """A file waiting for its new name and output type."""
+
+    __slots__ = ("source", "media", "new_name", "type_")
+
+    def __init__(self, source, media=None):
+        self.source = source
+        self.media = media or getattr(source, source.media.value)
+        self.new_name = None
+        self.type_ = None
+
+
+class ConversationStore:
+    """
+    Rename conversations waiting on the user, in memory.
+
+    An entry is keyed by the chat and the bot message the user answers
+    next: first the "enter new filename" prompt, then the output type
+    buttons. Handlers store the state and return right away; entries the
+    user never answers expire after `ttl` seconds.
+    """
+
+    def __init__(self, ttl, maxsize=10000):
+        self.cache = TTLCache(maxsize, ttl)
+
+    def open(self, chat_id, prompt_id, source, media=None):
+        pending = PendingRename(source, media)
+        self.cache.set((chat_id, prompt_id), pending)
+        return pending
+
+    def get(self, chat_id, message_id):
+        return self.cache.peek((chat_id, message_id))
+
+    def move(self, chat_id, old_id, new_id):
+        """Re-key a conversation when the bot asks its next question in a new message."""
+        pending = self.cache.pop((chat_id, old_id))
+        if pending is not None:
+            self.cache.set((chat_id, new_id), pending)
+        return pending
+
+    def pop(self, chat_id, message_id):
+        return self.cache.pop((chat_id, message_id))
+
+    def __len__(self):
+        return len(self.cache)
+
+
+conversations = ConversationStore(Config.RENAME_TIMEOUT)
@@ -1,13 +1,46 @@
-import motor.motor_asyncio
 from config import Config
+from .cache import TTLCache
+from .storage import create_backend
+from .write_buffer import WriteBehindBuffer
+from .registry import UserRegistry
 from .utils import send_log
+from .metrics import metrics
+
+
+class UserSettings:
+    """Snapshot of the per-user settings stored in the `user` collection."""
+
+    FIELDS = ("file_id", "caption", "prefix", "suffix", "metadata", "metadata_code")
+
+    __slots__ = ("id",) + FIELDS
+
+    def __init__(self, doc):
+        self.id = doc['_id']
+        for field in self.FIELDS:
+            setattr(self, field, doc.get(field))
+
+    @property
+    def thumbnail(self):
+        return self.file_id
+
+    def update(self, fields):
+        for field, value in fields.items():
+            setattr(self, field, value)
+
 
 class Database:
 
-    def __init__(self, uri, database_name):
-        self._client = motor.motor_asyncio.AsyncIOMotorClient(uri)
-        self.jishubotz = self._client[database_name]
-        self.col = self.jishubotz.user
+    def __init__(self, backend):
+        self.backend = backend
+        self.cache = TTLCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL)
+        self.registry = UserRegistry()
+        self.buffer = None
+        if Config.DB_WRITE_BEHIND:
+            self.buffer = WriteBehindBuffer(
+                self.backend, "user",
+                interval=Config.DB_FLUSH_INTERVAL,
+                max_pending=Config.DB_MAX_PENDING_WRITES
+            )
 
     def new_user(self, id):
         return dict(
@@ -24,93 +57,147 @@ class Database:
         u = m.from_user
         if not await self.is_user_exist(u.id):
             user = self.new_user(u.id)
-            await self.col.insert_one(user)            
+            if self.buffer is not None:
+                await self.buffer.insert(user)
+            else:
+                await self.backend.insert_one("user", user)
+            self.cache.set(user['_id'], UserSettings(user))
+            self.registry.add(user['_id'])
             await send_log(b, u)
 
+    @metrics.timed
+    async def load_users(self):
+        """Load every known user id into the in-memory registry (call once at startup)."""
+        ids = [id async for id in self.backend.iter_ids("user", batch_size=10000)]
+        self.registry.load(ids)
+
     async def is_user_exist(self, id):
-        user = await self.col.find_one({'_id': int(id)})
-        return bool(user)
+        if self.registry.loaded:
+            return int(id) in self.registry
+        if self.buffer is not None and self.buffer.has_insert(id):
+            return True
+        return await self.get_user(id) is not None
 
+    @metrics.timed
     async def total_users_count(self):
-        count = await self.col.count_documents({})
+        if self.registry.loaded:
+            return len(self.registry)
+        count = await self.backend.count("user")
         return count
 
     async def get_all_users(self):
-        all_users = self.col.find({})
+        all_users = self.backend.iter_docs("user")
         return all_users
 
+    async def iter_user_ids(self, after=None, batch_size=5000):
+        """Only the `_id`s, in ascending order (what a broadcast needs)."""
+        async for id in self.backend.iter_ids("user", after=after, batch_size=batch_size):
+            yield id
+
+    @metrics.timed
     async def delete_user(self, user_id):
-        await self.col.delete_many({'_id': int(user_id)})
+        await self.flush()
+        await self.backend.delete_many("user", [int(user_id)])
+        self.cache.pop(int(user_id))
+        self.registry.discard(user_id)
+
+    @metrics.timed
+    async def delete_users(self, user_ids):
+        ids = [int(id) for id in user_ids]
+        if not ids:
+            return
+        await self.flush()
+        await self.backend.delete_many("user", ids)
+        for id in ids:
+            self.cache.pop(id)
+        self.registry.discard_many(ids)
     
 
 
-    #======================= Thumbnail ========================#
+    #======================= Settings ========================#
+
+    @metrics.timed
+    async def get_user(self, id):
+        id = int(id)
+        settings = self.cache.get(id)
+        if settings is None:
+            if self.registry.loaded and id not in self.registry:
+                return None
+            # writes still in the write-behind buffer aren't in the backend yet
+            before = self.buffer.pending(id) if self.buffer is not None else None
+            doc = await self.backend.find_one("user", id, UserSettings.FIELDS)
+            if self.buffer is not None:
+                doc = self.buffer.overlay(id, doc, before)
+            if doc is not None:
+                settings = UserSettings(doc)
+                self.cache.set(id, settings)
+        return settings
+
+    async def get_user_settings(self, id):
+        """All settings of a user in one projected read (served from cache when warm)."""
+        settings = await self.get_user(id)
+        if settings is None:
+            settings = UserSettings(self.new_user(id))
+        return settings
+
+    @metrics.timed
+    async def update_user_settings(self, id, **fields):
+        """Apply several setting changes with a single `$set`."""
+        unknown = set(fields) - set(UserSettings.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown user setting(s): {', '.join(sorted(unknown))}")
+        if self.buffer is not None:
+            await self.buffer.update(id, fields)
+        else:
+            await self.backend.update_one("user", int(id), fields)
+        settings = self.cache.peek(int(id))
+        if settings is not None:
+            settings.update(fields)
+
+    @metrics.timed
+    async def flush(self):
+        """Write out anything still waiting in the write-behind buffer."""
+        if self.buffer is not None:
+            await self.buffer.flush()
+
+    async def close(self):
+        if self.buffer is not None:
+            await self.buffer.close()
+        await self.backend.close()
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+
+
+    #======================= Setters ========================#
 
     async def set_thumbnail(self, id, file_id):
-        await self.col.update_one({'_id': int(id)}, {'$set': {'file_id': file_id}})
-
-    async def get_thumbnail(self, id):
-        user = await self.col.find_one({'_id': int(id)})
-        return user.get('file_id', None)
-    
-    
-
-    #======================= Caption ========================#
+        await self.update_user_settings(id, file_id=file_id)
 
     async def set_caption(self, id, caption):
-        await self.col.update_one({'_id': int(id)}, {'$set': {'caption': caption}})
-
-    async def get_caption(self, id):
-        user = await self.col.find_one({'_id': int(id)})
-        return user.get('caption', None)
-
-
-
-    #======================= Prefix ========================#
+        await self.update_user_settings(id, caption=caption)
 
     async def set_prefix(self, id, prefix):
-        await self.col.update_one({'_id': int(id)}, {'$set': {'prefix': prefix}})  
-        
-    async def get_prefix(self, id):
-        user = await self.col.find_one({'_id': int(id)})
-        return user.get('prefix', None)      
-    
-
-
-    #======================= Suffix ========================#
+        await self.update_user_settings(id, prefix=prefix)
 
     async def set_suffix(self, id, suffix):
-        await self.col.update_one({'_id': int(id)}, {'$set': {'suffix': suffix}})  
-        
-    async def get_suffix(self, id):
-        user = await self.col.find_one({'_id': int(id)})
-        return user.get('suffix', None)
-
+        await self.update_user_settings(id, suffix=suffix)
 
-
-    #======================= Metadata ========================#
-        
     async def set_metadata(self, id, bool_meta):
-        await self.col.update_one({'_id': int(id)}, {'$set': {'metadata': bool_meta}})
-        
-    async def get_metadata(self, id):
-        user = await self.col.find_one({'_id': int(id)})
-        return user.get('metadata', None)
-        
-        
-        
-    #======================= Metadata Code ========================#    
-        
-    async def set_metadata_code(self, id, metadata_code):
-        await self.col.update_one({'_id': int(id)}, {'$set': {'metadata_code': metadata_code}})
+        await self.update_user_settings(id, metadata=bool_meta)
 
-    async def get_metadata_code(self, id):
-        user = await self.col.find_one({'_id': int(id)})
-        return user.get('metadata_code', None)   
+    async def set_metadata_code(self, id, metadata_code):
+        await self.update_user_settings(id, metadata_code=metadata_code)
 
 
 
-jishubotz = Database(Config.DATABASE_URL, Config.DATABASE_NAME)
+jishubotz = Database(create_backend(
+    Config.DATABASE_BACKEND,
+    uri=Config.DATABASE_URL,
+    database_name=Config.DATABASE_NAME,
+    path=Config.SQLITE_PATH
+))
 
 
 
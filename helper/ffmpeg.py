@@ -1,12 +1,28 @@
 import time
 import os
 import asyncio
-import aiohttp
-import subprocess
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-from hachoir.metadata import extractMetadata
-from hachoir.parser import createParser
 from pyrogram.types import Message
+from .probe import MediaInfo
+from .leech import downloader
+
+# Pillow work runs here so it never blocks the event loop
+image_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image")
+
+THUMB_SIZE = 320  # Telegram's thumbnail limit (px)
+THUMB_CANDIDATES = 6
+THUMB_SCALE = f"scale={THUMB_SIZE}:{THUMB_SIZE}:force_original_aspect_ratio=decrease"
+
+
+def prepare_thumb(thumb):
+    """Convert `thumb` in place to an RGB JPEG no bigger than 320x320, return its size."""
+    with Image.open(thumb) as img:
+        img = img.convert("RGB")
+        img.thumbnail((THUMB_SIZE, THUMB_SIZE))
+        img.save(thumb, "JPEG", quality=90)
+        return img.size
 
 
 async def fix_thumb(thumb):
@@ -14,18 +30,8 @@ async def fix_thumb(thumb):
     height = 0
     try:
         if thumb is not None:
-            parser = createParser(thumb)
-            metadata = extractMetadata(parser)
-            if metadata.has("width"):
-                width = metadata.get("width")
-            if metadata.has("height"):
-                height = metadata.get("height")
-
-            with Image.open(thumb) as img:
-                img.convert("RGB").save(thumb)
-                resized_img = img.resize((width, height))
-                resized_img.save(thumb, "JPEG")
-            parser.close()
+            loop = asyncio.get_running_loop()
+            width, height = await loop.run_in_executor(image_pool, prepare_thumb, thumb)
     except Exception as e:
         print(e)
         thumb = None
@@ -33,37 +39,97 @@ async def fix_thumb(thumb):
     return width, height, thumb
 
 
-async def take_screen_shot(video_file, output_directory, ttl):
-    out_put_file_name = f"{output_directory}/{time.time()}.jpg"
-    file_genertor_command = [
-        "ffmpeg", "-ss", str(ttl), "-i", video_file,
-        "-vframes", "1", out_put_file_name
-    ]
+def pick_best_frame(paths):
+    """
+    Score candidate frames in one vectorized pass and return the most
+    informative one: highest grey-level entropy, with near-black and
+    near-white frames pushed to the bottom.
+    """
+    frames = []
+    for path in paths:
+        with Image.open(path) as img:
+            frames.append(np.asarray(img.convert("L").resize((160, 90)), dtype=np.uint8))
+    stack = np.stack(frames).reshape(len(frames), -1)
+
+    # per-frame 256-bin histograms with a single bincount
+    offsets = (np.arange(len(frames)) * 256)[:, None]
+    hist = np.bincount((stack + offsets).ravel(), minlength=len(frames) * 256).reshape(len(frames), 256)
+    prob = hist / stack.shape[1]
+    entropy = -(prob * np.log2(prob, where=prob > 0, out=np.zeros_like(prob))).sum(axis=1)
+
+    brightness = stack.mean(axis=1)
+    contrast = stack.std(axis=1)
+    score = entropy * np.clip(contrast / 32, 0.1, 1.0)
+    score[(brightness < 20) | (brightness > 235)] *= 0.1
+    return paths[int(score.argmax())]
+
+
+def candidate_times(duration, candidates=THUMB_CANDIDATES):
+    """Where thumbnail candidates are taken: spread evenly, skipping the very start and end."""
+    if duration and duration > 1:
+        return [duration * (i + 1) / (candidates + 1) for i in range(candidates)]
+    return [0]
+
+
+async def keep_best_frame(outputs):
+    """Score the candidates that ffmpeg wrote with pick_best_frame, delete the rest."""
+    found = [out for out in outputs if os.path.exists(out)]
+    if not found:
+        return None
+    try:
+        loop = asyncio.get_running_loop()
+        best = await loop.run_in_executor(image_pool, pick_best_frame, found)
+    except Exception as e:
+        print(f"Thumbnail Scoring Error : {e}")
+        best = found[0]
+    for out in found:
+        if out != best:
+            os.remove(out)
+    return best
+
+
+async def smart_thumbnail(video_file, output_directory, duration, candidates=THUMB_CANDIDATES):
+    """
+    Grab `candidates` keyframes spread over the video in ONE ffmpeg run
+    (fast input seek + keyframe-only decoding, scaled to 320px inside
+    ffmpeg) and keep the best-looking one. Returns the JPEG path or None.
+    """
+    times = candidate_times(duration, candidates)
+    stamp = time.time()
+    outputs = [f"{output_directory}/{stamp}_{i}.jpg" for i in range(len(times))]
+
+    command = ["ffmpeg", "-v", "error", "-y"]
+    for t in times:
+        command += ["-skip_frame", "nokey", "-noaccurate_seek", "-ss", f"{t:.2f}", "-i", video_file]
+    for i, out in enumerate(outputs):
+        command += ["-map", f"{i}:v:0", "-frames:v", "1", "-vf", THUMB_SCALE, "-q:v", "3", out]
+
     process = await asyncio.create_subprocess_exec(
-        *file_genertor_command,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
+        *command,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
     )
-    stdout, stderr = await process.communicate()
-    if os.path.lexists(out_put_file_name):
-        return out_put_file_name
-    return None
+    await process.wait()
+    return await keep_best_frame(outputs)
+
+
+def metadata_args(metadata):
+    return [
+        '-map', '0',
+        '-c:s', 'copy', '-c:a', 'copy', '-c:v', 'copy',
+        '-metadata', f'title={metadata}',
+        '-metadata', f'author={metadata}',
+        '-metadata:s:s', f'title={metadata}',
+        '-metadata:s:a', f'title={metadata}',
+        '-metadata:s:v', f'title={metadata}',
+        '-metadata', f'artist={metadata}',
+    ]
 
 
 async def add_metadata(input_path, output_path, metadata, ms):
     try:
         await ms.edit("<i>I Found Metadata, Adding Into Your File ⚡</i>")
-        command = [
-            'ffmpeg', '-y', '-i', input_path, '-map', '0',
-            '-c:s', 'copy', '-c:a', 'copy', '-c:v', 'copy',
-            '-metadata', f'title={metadata}',
-            '-metadata', f'author={metadata}',
-            '-metadata:s:s', f'title={metadata}',
-            '-metadata:s:a', f'title={metadata}',
-            '-metadata:s:v', f'title={metadata}',
-            '-metadata', f'artist={metadata}',
-            output_path
-        ]
+        command = ['ffmpeg', '-y', '-i', input_path, *metadata_args(metadata), output_path]
         process = await asyncio.create_subprocess_exec(
             *command,
             stdout=asyncio.subprocess.PIPE,
@@ -83,21 +149,144 @@ async def add_metadata(input_path, output_path, metadata, ms):
         return None
 
 
+FASTSTART_EXTENSIONS = {"mp4", "m4v", "m4a", "mov"}
+
+
+async def process_media(input_path, output_path=None, metadata=None, thumb_path=None, duration=0):
+    """
+    One ffmpeg run over `input_path` instead of one process per step. Every
+    output is optional:
+
+    - `output_path`: stream-copied file with `metadata` (+faststart for MP4/MOV)
+    - `thumb_path`: 320px JPEG, the best of the same keyframe candidates
+      smart_thumbnail() takes, split off the one decode and scored with
+      pick_best_frame (the input is opened with `-skip_frame nokey`, which
+      only affects the decoded thumbnail stream, never the copied streams)
+
+    Duration and streams come from ffmpeg's own input summary on stderr, with
+    the `-progress` clock as fallback; with no outputs at all ffmpeg only
+    prints that summary and exits, which works as a quick probe.
+    Returns (output, thumb, MediaInfo); output is None if ffmpeg failed.
+    """
+    command = ["ffmpeg", "-hide_banner", "-y", "-nostats", "-progress", "pipe:1"]
+    if thumb_path:
+        command += ["-skip_frame", "nokey"]
+    command += ["-i", input_path]
+    if output_path:
+        command += metadata_args(metadata) if metadata else ["-map", "0", "-c", "copy"]
+        if output_path.rsplit(".", 1)[-1].lower() in FASTSTART_EXTENSIONS:
+            command += ["-movflags", "+faststart"]
+        command.append(output_path)
+    candidates = []
+    if thumb_path:
+        times = candidate_times(duration)
+        base = thumb_path.rsplit(".", 1)[0]
+        candidates = [f"{base}_{i}.jpg" for i in range(len(times))]
+        branches = "".join(f"[c{i}]" for i in range(len(times)))
+        graph = [f"[0:v:0]split={len(times)}{branches}"]
+        graph += [f"[c{i}]select=gte(t\\,{t:.2f}),{THUMB_SCALE}[t{i}]" for i, t in enumerate(times)]
+        command += ["-filter_complex", ";".join(graph)]
+        for i, out in enumerate(candidates):
+            command += ["-map", f"[t{i}]", "-frames:v", "1", "-q:v", "3", out]
+
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    errors = asyncio.create_task(process.stderr.read())
+    out_time = 0
+    async for line in process.stdout:
+        key, _, value = line.decode(errors="ignore").strip().partition("=")
+        if key == "out_time_us" and value.isdigit():
+            out_time = max(out_time, int(value) // 1000000)
+    await process.wait()
+    log = (await errors).decode(errors="ignore")
+
+    info = MediaInfo.from_ffmpeg_log(log)
+    if not info.duration and output_path:
+        info.duration = out_time
+
+    ok = process.returncode == 0
+    if not ok and (output_path or thumb_path):
+        print(f"Combined ffmpeg Job Failed : {log[-500:]}")
+    output = output_path if ok and output_path and os.path.exists(output_path) else None
+    if output_path and not output and os.path.exists(output_path):
+        os.remove(output_path)
+    thumb = None
+    if ok and candidates:
+        best = await keep_best_frame(candidates)
+        if best:
+            os.replace(best, thumb_path)
+            thumb = thumb_path
+    else:
+        for path in candidates:
+            if os.path.exists(path):
+                os.remove(path)
+    return output, thumb, info
+
+
+# Containers ffmpeg can demux from a non-seekable pipe. MP4/MOV are left out
+# because their index (moov) is often at the end of the file.
+PIPE_REMUX_EXTENSIONS = {"mkv", "mka", "webm", "ts", "m2ts", "mp3", "flac", "ogg", "opus", "wav"}
+
+
+def can_stream_remux(file_name):
+    if not file_name or "." not in file_name:
+        return False
+    return file_name.rsplit(".", 1)[-1].lower() in PIPE_REMUX_EXTENSIONS
+
+
+async def stream_add_metadata(bot, message, output_path, metadata, file_size=0, progress=None, progress_args=()):
+    """
+    Feed the Telegram file chunk by chunk into ffmpeg's stdin and write the
+    tagged copy straight to `output_path`. The remux starts with the first
+    chunk and the untagged original never touches the disk.
+    Returns `output_path`, or None if ffmpeg failed (caller falls back to
+    the download + add_metadata path).
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    command = ['ffmpeg', '-v', 'error', '-y', '-i', 'pipe:0', *metadata_args(metadata), output_path]
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    # drain stderr concurrently so ffmpeg never blocks on a full pipe
+    errors = asyncio.create_task(process.stderr.read())
+    current = 0
+    try:
+        async for chunk in bot.stream_media(message):
+            process.stdin.write(chunk)
+            await process.stdin.drain()
+            current += len(chunk)
+            if progress:
+                await progress(current, file_size or current, *progress_args)
+        process.stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    except BaseException:
+        process.kill()
+        await process.wait()
+        errors.cancel()
+        raise
+    await process.wait()
+    stderr = await errors
+
+    if process.returncode == 0 and os.path.exists(output_path):
+        return output_path
+    print(f"Streaming Remux Failed : {stderr.decode(errors='ignore')[-500:]}")
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    return None
+
+
 # 🔥 New Helpers for Leech + Metadata Fix
 
 async def download_file(url, filename):
-    """Download file from direct link (supports Azalea-style links)."""
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as resp:
-            if resp.status != 200:
-                raise Exception(f"Failed to download: {resp.status}")
-            with open(filename, "wb") as f:
-                while True:
-                    chunk = await resp.content.read(1024 * 1024)
-                    if not chunk:
-                        break
-                    f.write(chunk)
-    return filename
+    """Download file from direct link (supports Azalea-style links), see helper/leech.py."""
+    return await downloader.download(await downloader.probe(url), filename)
 
 
 async def fix_metadata(input_file, output_file):
@@ -110,7 +299,14 @@ async def fix_metadata(input_file, output_file):
         "-fflags", "+genpts",
         "-y", output_file
     ]
-    subprocess.run(command, check=True)
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise Exception(f"ffmpeg exited with {process.returncode}: {stderr.decode(errors='ignore')[-300:]}")
     return output_file
 
 
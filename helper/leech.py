@@ -0,0 +1,293 @@
+import asyncio
+import hashlib
+import ipaddress
+import json
+import mimetypes
+import os
+import shutil
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse, unquote
+import aiohttp
+from aiohttp.abc import AbstractResolver
+from yarl import URL
+from config import Config
+
+
+def is_public(address):
+    """False for loopback, private, link-local (cloud metadata), reserved and multicast addresses."""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+class PublicResolver(AbstractResolver):
+    """aiohttp's resolver, refusing host names that point inside the bot's own network."""
+
+    def __init__(self, resolver=None):
+        self.resolver = resolver or aiohttp.DefaultResolver()
+
+    async def resolve(self, host, port=0, family=0):
+        hosts = await self.resolver.resolve(host, port, family)
+        for item in hosts:
+            if not is_public(item["host"]):
+                raise Exception("Links to private or local addresses are not allowed")
+        return hosts
+
+    async def close(self):
+        await self.resolver.close()
+
+
+class UrlFile:
+    """Stands in for Telegram's media object when a file comes from a direct link."""
+
+    file_unique_id = None   # links can change content, never reuse an old result
+    duration = 0
+
+    def __init__(self, url, file_name, file_size, mime_type, ranges):
+        self.url = url
+        self.file_name = file_name
+        self.file_size = file_size
+        self.mime_type = mime_type
+        self.ranges = ranges    # server answers Range requests
+
+
+class HttpDownloader:
+    """
+    Downloads direct links with several HTTP Range requests in flight.
+
+    All requests share one pooled aiohttp session. The file is preallocated
+    and every chunk is written at its own offset with pwrite in a thread,
+    so the event loop never blocks on the disk. Finished chunks are listed
+    in a sidecar file next to the partial download under `root` (outside
+    the job workspaces, which are emptied at startup): a failed or
+    interrupted download of the same link continues where it stopped.
+
+    Servers without Range support or a known size get one plain request,
+    cut off once it sends more than `max_size` bytes.
+
+    Only public addresses are fetched: every redirect hop is checked and
+    host names are checked when they are resolved, so a link can't reach
+    localhost, the LAN or a cloud metadata service.
+    """
+
+    CHUNK = 8 * 1024 * 1024     # bytes per Range request
+    READ = 256 * 1024           # bytes per read from the socket / pwrite
+    MAX_REDIRECTS = 10
+
+    def __init__(self, root, connections=4, retries=5, keep=86400, max_size=2000 * 1024 * 1024, allow_private=False):
+        self.root = root
+        self.connections = connections
+        self.retries = retries
+        self.keep = keep
+        self.max_size = max_size
+        self.allow_private = allow_private
+        self.bytes_down = 0
+        self._active = set()
+        self._session = None
+
+    #======================= Session ========================#
+
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=100, limit_per_host=max(self.connections * 4, 10), ttl_dns_cache=300,
+                    resolver=None if self.allow_private else PublicResolver()
+                ),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60),
+                auto_decompress=False,  # byte offsets must match the file on the server
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _check_url(self, url):
+        if url.scheme not in ("http", "https") or not url.host:
+            raise Exception("Only http(s) links are supported")
+        if self.allow_private:
+            return
+        try:
+            public = is_public(url.host)
+        except ValueError:
+            return  # a host name: PublicResolver checks what it resolves to
+        if not public:
+            raise Exception("Links to private or local addresses are not allowed")
+
+    @asynccontextmanager
+    async def _get(self, url, headers=None):
+        """GET `url`, following redirects here so every hop is checked before it is requested."""
+        url = URL(url)
+        for _ in range(self.MAX_REDIRECTS + 1):
+            self._check_url(url)
+            async with self.session().get(url, headers=headers, allow_redirects=False) as resp:
+                location = resp.headers.get("Location")
+                if resp.status in (301, 302, 303, 307, 308) and location:
+                    url = resp.url.join(URL(location))
+                    continue
+                yield resp
+                return
+        raise Exception("Too many redirects")
+
+    #======================= Probe ========================#
+
+    async def probe(self, url):
+        """Size, name, type and Range support of `url`, with a one-byte GET (HEAD is often broken)."""
+        async with self._get(url, headers={"Range": "bytes=0-0"}) as resp:
+            if resp.status == 206:
+                total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+                size, ranges = (int(total), True) if total.isdigit() else (0, False)
+            elif resp.status == 200:
+                size, ranges = resp.content_length or 0, False
+            else:
+                raise Exception(f"Failed to download: {resp.status}")
+            if resp.headers.get("Content-Encoding", "identity") != "identity":
+                ranges = False
+            file_name = (resp.content_disposition and resp.content_disposition.filename) or \
+                unquote(os.path.basename(urlparse(str(resp.url)).path)) or "file"
+            mime_type = resp.content_type
+            if not mime_type or mime_type == "application/octet-stream":
+                mime_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+            return UrlFile(str(resp.url), file_name, size, mime_type, ranges and size > 0)
+
+    #======================= Download ========================#
+
+    async def download(self, file, path, progress=None, progress_args=()):
+        """Fetch the probed `file` into `path` and return the path."""
+        if file.file_size > self.max_size:
+            raise Exception("This bot doesn’t support files bigger than 2GB")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if not file.ranges:
+            return await self._stream(file, path, progress, progress_args)
+
+        key = hashlib.sha1(f"{file.url}|{file.file_size}".encode()).hexdigest()
+        if key in self._active:
+            raise Exception("This link is already being downloaded")
+        self._active.add(key)
+        try:
+            partial = os.path.join(self.root, key)
+            await self._ranged(file, partial, progress, progress_args)
+            await asyncio.get_running_loop().run_in_executor(None, shutil.move, partial, path)
+            os.remove(partial + ".parts")
+        finally:
+            self._active.discard(key)
+        return path
+
+    async def _stream(self, file, path, progress, progress_args):
+        loop = asyncio.get_running_loop()
+        done = 0
+        # without a Content-Length only the running count stops an endless body
+        limit = file.file_size or self.max_size
+        async with self._get(file.url) as resp:
+            if resp.status != 200:
+                raise Exception(f"Failed to download: {resp.status}")
+            with open(path, "wb") as f:
+                async for chunk in resp.content.iter_chunked(self.READ):
+                    if done + len(chunk) > limit:
+                        if file.file_size:
+                            raise Exception("The link sent more data than it announced")
+                        raise Exception("This bot doesn’t support files bigger than 2GB")
+                    await loop.run_in_executor(None, f.write, chunk)
+                    done += len(chunk)
+                    self.bytes_down += len(chunk)
+                    if progress:
+                        await progress(done, file.file_size or done, *progress_args)
+        return path
+
+    def _open(self, partial, size):
+        """Open (or create and preallocate) the partial file; returns (fd, finished chunk set)."""
+        os.makedirs(self.root, exist_ok=True)
+        finished = set()
+        if os.path.exists(partial) and os.path.getsize(partial) == size:
+            try:
+                with open(partial + ".parts") as f:
+                    finished = set(json.load(f))
+            except (OSError, ValueError):
+                pass
+        else:
+            with open(partial, "wb") as f:
+                f.truncate(size)  # preallocate so every chunk can be written at its offset
+        return os.open(partial, os.O_WRONLY), finished
+
+    @staticmethod
+    def _checkpoint(partial, finished):
+        with open(partial + ".tmp", "w") as f:
+            json.dump(finished, f)
+        os.replace(partial + ".tmp", partial + ".parts")
+
+    async def _ranged(self, file, partial, progress, progress_args):
+        loop = asyncio.get_running_loop()
+        size = file.file_size
+        chunks = -(-size // self.CHUNK)
+        fd, finished = await loop.run_in_executor(None, self._open, partial, size)
+        done = sum(min(self.CHUNK, size - i * self.CHUNK) for i in finished)
+        pending = iter([i for i in range(chunks) if i not in finished])
+        checkpoint = asyncio.Lock()
+
+        async def fetch(index):
+            nonlocal done
+            offset = index * self.CHUNK
+            end = min(offset + self.CHUNK, size)
+            for attempt in range(self.retries):
+                try:
+                    # after a dropped connection only the missing tail of the chunk is asked again
+                    headers = {"Range": f"bytes={offset}-{end - 1}"}
+                    async with self._get(file.url, headers=headers) as resp:
+                        if resp.status != 206:
+                            raise Exception(f"Failed to download: {resp.status}")
+                        async for data in resp.content.iter_chunked(self.READ):
+                            data = data[:end - offset]
+                            await loop.run_in_executor(None, os.pwrite, fd, data, offset)
+                            offset += len(data)
+                            done += len(data)
+                            self.bytes_down += len(data)
+                            if progress:
+                                await progress(done, size, *progress_args)
+                    if offset < end:
+                        raise aiohttp.ClientPayloadError("Connection closed early")
+                    return
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == self.retries - 1:
+                        raise
+                    print(f"Leech Chunk {index} Retry ({e})")
+                    await asyncio.sleep(2 ** attempt)
+
+        async def worker():
+            for index in pending:
+                await fetch(index)
+                finished.add(index)
+                async with checkpoint:  # one writer, or the threads race on the temp file
+                    await loop.run_in_executor(None, self._checkpoint, partial, sorted(finished))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.connections, chunks))]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            raise
+        finally:
+            os.close(fd)
+
+    def sweep(self):
+        """Delete partial downloads nobody resumed within `keep` seconds."""
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if now - os.path.getmtime(path) > self.keep:
+                    os.remove(path)
+                    removed += 1
+            except OSError as e:
+                print(f"Leech Sweep Error: {e}")
+        return removed
+
+
+downloader = HttpDownloader(Config.LEECH_DIR, Config.LEECH_CONNECTIONS)
@@ -0,0 +1,96 @@
+import asyncio
+from pyrogram.errors import FloodWait
+from config import Config
+from .database import jishubotz
+from .ratelimit import outbound_priority, LOW
+
+
+class LogMirror:
+    """
+    Mirrors finished uploads into the log channel by copying the message
+    that was already sent to the user, so the file is reused by file_id
+    instead of being uploaded a second time. Copies run from a background
+    queue, outside the job's pipeline slot, and are retried on failure.
+    """
+
+    MEDIA_TYPES = ("document", "video", "audio")
+    TABLE = "config"
+    KEY = "log_mirror"
+
+    def __init__(self, backend, chat_id, retries=3, maxsize=1000):
+        self.backend = backend
+        self.chat_id = chat_id
+        self.retries = retries
+        self.maxsize = maxsize
+        self.enabled = {media_type: True for media_type in self.MEDIA_TYPES}
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue = None
+        self._task = None
+
+    async def load(self):
+        try:
+            doc = await self.backend.find_one(self.TABLE, self.KEY)
+        except Exception as e:
+            print(f"Log Mirror Settings Error: {e}")
+            return
+        if doc:
+            for media_type in self.MEDIA_TYPES:
+                self.enabled[media_type] = doc.get(media_type, True)
+
+    async def set_enabled(self, media_type, value):
+        self.enabled[media_type] = value
+        await self.backend.update_one(self.TABLE, self.KEY, {media_type: value}, upsert=True)
+
+    def submit(self, message, caption=None, user=None):
+        """Queue `message` (already sent by the bot) for copying into the log channel."""
+        if not self.chat_id or not message or not message.media:
+            return
+        if not self.enabled.get(message.media.value, True):
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.maxsize)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._worker())
+        try:
+            self._queue.put_nowait((message, caption, user))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print("Log Mirror Queue Full, Dropping Log Copy")
+
+    async def _retry(self, step):
+        """Await `step()` up to `retries` times; None if every attempt failed."""
+        for attempt in range(self.retries):
+            try:
+                return await step()
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+            except Exception as e:
+                print(f"Log Forward Error: {e}")
+                await asyncio.sleep(2 ** attempt)
+        return None
+
+    async def _worker(self):
+        outbound_priority.set(LOW)
+        while True:
+            message, caption, user = await self._queue.get()
+            # retried separately: a failed reply must not post the file a second time
+            copied = await self._retry(lambda: message.copy(self.chat_id, caption=caption))
+            if copied is None:
+                self.failed += 1
+                continue
+            self.sent += 1
+            if user is not None:
+                await self._retry(lambda: copied.reply_text(f"This file was renamed by {user.mention}", quote=True))
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "sent": self.sent,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+
+log_mirror = LogMirror(jishubotz.backend, Config.LOG_CHANNEL)
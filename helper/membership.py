@@ -0,0 +1,52 @@
+from pyrogram import enums
+from pyrogram.errors import UserNotParticipant
+from config import Config
+from .cache import TTLCache
+
+NOT_MEMBER = "not_member"
+
+
+class MembershipCache:
+    """
+    Caches force-subscribe membership lookups. Members are kept for
+    `positive_ttl` seconds, non-members and banned users for the shorter
+    `negative_ttl` so that joining the channel is noticed quickly.
+    ChatMemberUpdated events from the channel overwrite entries early.
+    """
+
+    def __init__(self, positive_ttl=600, negative_ttl=30, maxsize=50000):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.cache = TTLCache(maxsize, positive_ttl)
+
+    def _ttl(self, status):
+        if status in (NOT_MEMBER, enums.ChatMemberStatus.BANNED, enums.ChatMemberStatus.LEFT):
+            return self.negative_ttl
+        return self.positive_ttl
+
+    def set(self, user_id, status):
+        self.cache.set(int(user_id), status, self._ttl(status))
+
+    def invalidate(self, user_id):
+        self.cache.pop(int(user_id))
+
+    async def get_status(self, client, user_id):
+        """Member status of `user_id` in FORCE_SUBS, or NOT_MEMBER."""
+        status = self.cache.get(int(user_id))
+        if status is None:
+            try:
+                member = await client.get_chat_member(Config.FORCE_SUBS, user_id)
+                status = member.status
+            except UserNotParticipant:
+                status = NOT_MEMBER
+            self.set(user_id, status)
+        return status
+
+    def stats(self):
+        return self.cache.stats()
+
+
+membership = MembershipCache(
+    positive_ttl=Config.FORCE_SUB_CACHE_TTL,
+    negative_ttl=Config.FORCE_SUB_NEGATIVE_TTL
+)
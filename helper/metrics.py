@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import os
+import time
+from bisect import bisect_left
+
+DURATION_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+THROUGHPUT_BUCKETS = tuple(int(mb * 1024 * 1024) for mb in (0.5, 1, 2, 5, 10, 20, 50, 100, 200))
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+def _labels(label, value, extra=""):
+    if label is None:
+        return "{%s}" % extra if extra else ""
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return '{%s="%s"%s}' % (label, value, "," + extra if extra else "")
+
+
+def series(name, help, type, values, label=None):
+    """Prometheus text lines for one metric; `values` maps label value -> number."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+    for value, number in values.items():
+        lines.append(f"{name}{_labels(label, value)} {number}")
+    return lines
+
+
+class Counter:
+    """Monotonic counter with at most one label. inc() is a dict update."""
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = {}
+
+    def inc(self, value="", amount=1):
+        self.values[value] = self.values.get(value, 0) + amount
+
+    def render(self):
+        return series(self.name, self.help, "counter", self.values, self.label)
+
+
+class Histogram:
+    """Fixed-bucket histogram with at most one label. observe() is one bisect."""
+
+    def __init__(self, name, help, buckets, label=None):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.label = label
+        self._series = {}   # label value -> [bucket counts, sum, count]
+
+    def observe(self, amount, value=""):
+        data = self._series.get(value)
+        if data is None:
+            data = self._series[value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        data[0][bisect_left(self.buckets, amount)] += 1
+        data[1] += amount
+        data[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.label, value, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label, value)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label, value)} {count}")
+        return lines
+
+
+class Metrics:
+    """
+    Counters and histograms recorded on the hot path. Gauges that other
+    modules already track (queues, API calls, disk) are read by route.py
+    at scrape time instead, so they cost nothing in between.
+    """
+
+    def __init__(self):
+        self.jobs = Counter("renamer_jobs_total", "Finished rename jobs by result.", "result")
+        self.stage_duration = Histogram("renamer_stage_duration_seconds", "Time a job spends in a pipeline stage.", DURATION_BUCKETS, "stage")
+        self.stage_throughput = Histogram("renamer_stage_throughput_bytes_per_second", "Bytes per second of one job in a pipeline stage.", THROUGHPUT_BUCKETS, "stage")
+        self.db_latency = Histogram("renamer_db_call_duration_seconds", "Latency of Database methods.", LATENCY_BUCKETS, "method")
+        self.loop_lag = Histogram("renamer_event_loop_lag_seconds", "How late the event loop wakes a sleeping task.", LAG_BUCKETS)
+        self.last_lag = 0.0
+        self._lag_task = None
+
+    def timed(self, func):
+        """Decorator recording the latency of an async Database method."""
+        name = func.__name__
+        observe = self.db_latency.observe
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                observe(time.perf_counter() - started, name)
+        return wrapper
+
+    def start_lag_monitor(self, interval=1.0):
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.create_task(self._watch_loop(interval))
+
+    async def _watch_loop(self, interval):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(interval)
+            self.last_lag = max(time.monotonic() - started - interval, 0.0)
+            self.loop_lag.observe(self.last_lag)
+
+    def render(self):
+        lines = []
+        for metric in (self.jobs, self.stage_duration, self.stage_throughput, self.db_latency, self.loop_lag):
+            lines += metric.render()
+        lines += series("renamer_event_loop_lag_last_seconds", "Lag of the last event loop check.", "gauge", {"": self.last_lag})
+        return lines
+
+
+def directory_size(path):
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+metrics = Metrics()
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import time
+from config import Config
+from .metrics import metrics
+
+
+class Stage:
+    """
+    A pool of `workers` coroutines fed by a bounded queue. Callers `await
+    stage.run(func, *args)`; when the queue is full they wait, which is
+    the backpressure between stages.
+    """
+
+    def __init__(self, name, workers, queue_size):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+        self.max_time = 0.0
+        self._queue = None
+        self._tasks = []
+
+    def _start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def run(self, func, *args, size=0):
+        """`size` is the bytes the job moves in this stage, for the throughput metric."""
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((func, args, future, time.monotonic(), size))
+        return await future
+
+    async def _worker(self):
+        while True:
+            func, args, future, queued_at, size = await self._queue.get()
+            if future.cancelled():
+                continue
+            started = time.monotonic()
+            self.wait_time += started - queued_at
+            self.active += 1
+            # The job runs as its own task: whatever it dies of, even CancelledError,
+            # the caller's future gets resolved and this worker keeps going.
+            task = asyncio.ensure_future(func(*args))
+            try:
+                await asyncio.wait([task])
+            except asyncio.CancelledError:
+                # the worker itself is being stopped
+                task.cancel()
+                if not future.done():
+                    future.cancel()
+                raise
+            finally:
+                self.active -= 1
+                took = time.monotonic() - started
+                self.busy_time += took
+                self.max_time = max(self.max_time, took)
+
+            if task.cancelled():
+                error = Exception(f"{self.name} job was cancelled")
+            else:
+                error = task.exception()
+            if error is not None:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                self.completed += 1
+                metrics.stage_duration.observe(took, self.name)
+                if size and took > 0:
+                    metrics.stage_throughput.observe(size / took, self.name)
+                if not future.done():
+                    future.set_result(task.result())
+
+    def stats(self):
+        done = self.completed + self.failed
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_time": (self.busy_time / done) if done else 0.0,
+            "avg_wait": (self.wait_time / done) if done else 0.0,
+            "max_time": self.max_time,
+        }
+
+
+class Pipeline:
+    """The download -> process (ffmpeg) -> upload stages of a rename job."""
+
+    def __init__(self, download_workers, process_workers, upload_workers, queue_size):
+        self.download = Stage("download", download_workers, queue_size)
+        self.process = Stage("process", process_workers, queue_size)
+        self.upload = Stage("upload", upload_workers, queue_size)
+        self.stages = (self.download, self.process, self.upload)
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
+
+
+pipeline = Pipeline(
+    download_workers=Config.DOWNLOAD_WORKERS,
+    process_workers=Config.FFMPEG_WORKERS or os.cpu_count() or 1,
+    upload_workers=Config.UPLOAD_WORKERS,
+    queue_size=Config.STAGE_QUEUE_SIZE
+)
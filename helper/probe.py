@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import re
+from .cache import TTLCache
+
+
+class StreamInfo:
+    __slots__ = ("index", "codec_type", "codec_name", "width", "height", "bitrate", "language", "title")
+
+    def __init__(self, data):
+        tags = data.get("tags") or {}
+        self.index = data.get("index", 0)
+        self.codec_type = data.get("codec_type")
+        self.codec_name = data.get("codec_name")
+        self.width = data.get("width") or 0
+        self.height = data.get("height") or 0
+        self.bitrate = int(data.get("bit_rate") or 0)
+        self.language = tags.get("language")
+        self.title = tags.get("title")
+
+
+class MediaInfo:
+    """What one `ffprobe -print_format json` run tells about a file."""
+
+    __slots__ = ("duration", "width", "height", "bitrate", "format_name", "streams")
+
+    def __init__(self, duration=0, width=0, height=0, bitrate=0, format_name=None, streams=()):
+        self.duration = duration
+        self.width = width
+        self.height = height
+        self.bitrate = bitrate
+        self.format_name = format_name
+        self.streams = list(streams)
+
+    @classmethod
+    def from_ffprobe(cls, data):
+        fmt = data.get("format") or {}
+        streams = [StreamInfo(s) for s in data.get("streams") or []]
+        video = next((s for s in streams if s.codec_type == "video"), None)
+        return cls(
+            duration=int(float(fmt.get("duration") or 0)),
+            width=video.width if video else 0,
+            height=video.height if video else 0,
+            bitrate=int(fmt.get("bit_rate") or 0),
+            format_name=fmt.get("format_name"),
+            streams=streams
+        )
+
+    @classmethod
+    def from_ffmpeg_log(cls, log):
+        """Parse the input summary ffmpeg prints to stderr (saves a separate ffprobe run)."""
+        log = log.split("Stream mapping:")[0].split("\nOutput #")[0]
+        fmt = re.search(r"Input #0, (.+?), from", log)
+        duration = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", log)
+        bitrate = re.search(r"bitrate: (\d+) kb/s", log)
+        streams = []
+        for m in re.finditer(r"Stream #0:(\d+)[^:]*?(?:\((\w+)\))?: (Video|Audio|Subtitle|Data|Attachment): (\w+)([^\n]*)", log):
+            size = re.search(r", (\d{2,5})x(\d{2,5})", m.group(5))
+            rate = re.search(r"(\d+) kb/s", m.group(5))
+            streams.append(StreamInfo({
+                "index": int(m.group(1)),
+                "codec_type": m.group(3).lower(),
+                "codec_name": m.group(4),
+                "width": int(size.group(1)) if size else 0,
+                "height": int(size.group(2)) if size else 0,
+                "bit_rate": int(rate.group(1)) * 1000 if rate else 0,
+                "tags": {"language": m.group(2)} if m.group(2) else {}
+            }))
+        video = next((s for s in streams if s.codec_type == "video"), None)
+        return cls(
+            duration=int(int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3))) if duration else 0,
+            width=video.width if video else 0,
+            height=video.height if video else 0,
+            bitrate=int(bitrate.group(1)) * 1000 if bitrate else 0,
+            format_name=fmt.group(1) if fmt else None,
+            streams=streams
+        )
+
+    @classmethod
+    def from_media(cls, media):
+        """Build from what Telegram already reports on a Video/Audio/Document object."""
+        return cls(
+            duration=getattr(media, "duration", 0) or 0,
+            width=getattr(media, "width", 0) or 0,
+            height=getattr(media, "height", 0) or 0
+        )
+
+    @property
+    def codecs(self):
+        return [s.codec_name for s in self.streams]
+
+    def stream(self, codec_type):
+        return next((s for s in self.streams if s.codec_type == codec_type), None)
+
+
+class MediaProbe:
+    """
+    Async ffprobe with a small cache keyed by the file path (plus its size
+    and mtime) and by the Telegram `file_unique_id` of the source.
+    """
+
+    def __init__(self, maxsize=512, ttl=3600):
+        self.cache = TTLCache(maxsize, ttl)
+
+    async def probe(self, path, file_unique_id=None):
+        if file_unique_id:
+            info = self.cache.get(("uid", file_unique_id))
+            if info is not None:
+                return info
+        try:
+            st = os.stat(path)
+        except OSError:
+            return MediaInfo()
+        path_key = ("path", path, st.st_size, st.st_mtime)
+        info = self.cache.get(path_key)
+        if info is None:
+            info = await self._run(path)
+            self.cache.set(path_key, info)
+        if file_unique_id:
+            self.cache.set(("uid", file_unique_id), info)
+        return info
+
+    async def media_info(self, media, path=None):
+        """
+        Telegram's own duration/dimensions when the media object has them,
+        otherwise a real probe of `path`.
+        """
+        info = MediaInfo.from_media(media)
+        if info.duration or path is None:
+            return info
+        return await self.probe(path, getattr(media, "file_unique_id", None))
+
+    async def _run(self, path):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "ffprobe", "-v", "error", "-print_format", "json",
+                "-show_format", "-show_streams", path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            stdout, _ = await process.communicate()
+            return MediaInfo.from_ffprobe(json.loads(stdout or b"{}"))
+        except Exception as e:
+            print(f"Probe Error : {e}")
+            return MediaInfo()
+
+
+media_probe = MediaProbe()
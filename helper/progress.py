@@ -0,0 +1,145 @@
+import asyncio
+import math
+import time
+from pyrogram.errors import FloodWait, BadRequest, MessageNotModified
+from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from config import Config, Txt
+from .utils import humanbytes, TimeFormatter
+from .ratelimit import outbound_priority, LOW
+
+CANCEL_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("✖️ Cancel ✖️", callback_data="close")]])
+
+
+class Tracker:
+    __slots__ = ("message", "ud_type", "start", "current", "total", "touched", "edited", "rendered")
+
+    def __init__(self, message, ud_type, start):
+        self.message = message
+        self.ud_type = ud_type
+        self.start = start
+        self.current = 0
+        self.total = 0
+        self.touched = time.time()
+        self.edited = 0
+        self.rendered = None  # (current, text) of the last edit
+
+    def render(self):
+        diff = max(time.time() - self.start, 0.001)
+        percentage = self.current * 100 / self.total if self.total else 0
+        speed = self.current / diff
+        elapsed_time = round(diff) * 1000
+        time_to_completion = round((self.total - self.current) / speed) * 1000 if speed else 0
+        estimated_total_time = TimeFormatter(milliseconds=elapsed_time + time_to_completion)
+
+        filled = min(20, math.floor(percentage / 5))
+        progress = "▣" * filled + "▢" * (20 - filled)
+        tmp = progress + Txt.PROGRESS_BAR.format(
+            round(percentage, 2),
+            humanbytes(self.current),
+            humanbytes(self.total),
+            humanbytes(speed),
+            estimated_total_time if estimated_total_time != '' else "0 s"
+        )
+        return f"{self.ud_type}\n\n{tmp}"
+
+
+class ProgressService:
+    """
+    Transfer callbacks only store counters here; one ticker renders and
+    edits every status message once per `interval` seconds. Edits are
+    skipped when nothing moved or the text is unchanged, each chat gets at
+    most one edit per tick, and a FloodWait pauses only that chat.
+    """
+
+    def __init__(self, interval=5, stale_after=120):
+        self.interval = interval
+        self.stale_after = stale_after
+        self.trackers = {}
+        self.chat_pause = {}
+        self.edits = 0
+        self.skipped = 0
+        self.updates = 0
+        self.flood_waits = 0
+        self._task = None
+
+    def update(self, current, total, ud_type, message, start):
+        key = (message.chat.id, message.id)
+        tracker = self.trackers.get(key)
+        if tracker is None or tracker.ud_type != ud_type:
+            tracker = self.trackers[key] = Tracker(message, ud_type, start)
+        self.updates += 1
+        if total and current >= total:
+            # the next status edit replaces the bar, don't race it with a late 100%
+            self.trackers.pop(key, None)
+            return
+        tracker.current = current
+        tracker.total = total
+        tracker.touched = time.time()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._ticker())
+
+    def stop(self, message):
+        self.trackers.pop((message.chat.id, message.id), None)
+
+    async def _ticker(self):
+        outbound_priority.set(LOW)
+        while self.trackers:
+            await asyncio.sleep(self.interval)
+            now = time.time()
+            self.chat_pause = {c: t for c, t in self.chat_pause.items() if t > now}
+            picked = {}
+            for key, tracker in list(self.trackers.items()):
+                if now - tracker.touched > self.stale_after:
+                    self.trackers.pop(key, None)
+                    continue
+                chat_id = key[0]
+                if chat_id in self.chat_pause:
+                    continue
+                if tracker.rendered and tracker.rendered[0] == tracker.current:
+                    self.skipped += 1
+                    continue
+                # one edit per chat per tick, least recently edited message first
+                other = picked.get(chat_id)
+                if other is None or tracker.edited < other.edited:
+                    picked[chat_id] = tracker
+            if picked:
+                await asyncio.gather(*(self._edit(t) for t in picked.values()))
+
+    async def _edit(self, tracker):
+        current = tracker.current
+        text = tracker.render()
+        if tracker.rendered and tracker.rendered[1] == text:
+            self.skipped += 1
+            return
+        try:
+            await tracker.message.edit(text=text, reply_markup=CANCEL_MARKUP)
+            self.edits += 1
+            tracker.edited = time.time()
+            tracker.rendered = (current, text)
+        except FloodWait as e:
+            self.flood_waits += 1
+            self.chat_pause[tracker.message.chat.id] = time.time() + e.value
+        except MessageNotModified:
+            # same text already on screen (a BadRequest, but the message is fine)
+            tracker.rendered = (current, text)
+        except BadRequest:
+            # message deleted or no longer editable: stop tracking it
+            self.trackers.pop((tracker.message.chat.id, tracker.message.id), None)
+        except Exception as e:
+            print(f"Progress Edit Error: {e}")
+
+    def stats(self):
+        return {
+            "tracked": len(self.trackers),
+            "updates": self.updates,
+            "edits": self.edits,
+            "skipped": self.skipped,
+            "flood_waits": self.flood_waits,
+        }
+
+
+progress_service = ProgressService(Config.PROGRESS_INTERVAL)
+
+
+async def progress_for_pyrogram(current, total, ud_type, message, start):
+    progress_service.update(current, total, ud_type, message, start)
@@ -0,0 +1,212 @@
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from pyrogram.errors import FloodWait
+from config import Config
+
+HIGH = 0        # user-facing: replies, uploads, status messages
+LOW = 1         # background: broadcast, log channel, progress bars
+
+# Tasks doing background traffic call `outbound_priority.set(LOW)` once;
+# every API call made from that task then yields to user-facing calls.
+outbound_priority = contextvars.ContextVar("outbound_priority", default=HIGH)
+
+
+@contextmanager
+def background():
+    """LOW priority for a block of code; use this in handlers, which run inside shared dispatcher tasks."""
+    token = outbound_priority.set(LOW)
+    try:
+        yield
+    finally:
+        outbound_priority.reset(token)
+
+# Methods Telegram counts against the message limits
+MESSAGE_METHODS = {"SendMessage", "SendMedia", "SendMultiMedia", "ForwardMessages", "EditMessage"}
+
+
+class TokenBucket:
+    """`rate` tokens per second up to `burst`; the rate is halved on FloodWait and slowly recovers."""
+
+    __slots__ = ("base_rate", "rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate, burst):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, now, reserve=0):
+        """Seconds until a token is available while keeping `reserve` tokens untouched."""
+        self._refill(now)
+        missing = 1 + reserve - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self):
+        self.tokens -= 1
+
+    def penalize(self):
+        self.rate = max(self.base_rate / 64, self.rate / 2)
+        self.tokens = min(self.tokens, 0)
+
+    def reward(self):
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate / 50)
+
+
+class RateLimiter:
+    """
+    Single gate for every outbound API call of the bot client:
+
+    - message-type calls take a token from the global bucket and from the
+      bucket of the target chat (private chats and groups have their own rate)
+    - a FloodWait pauses only what it was about (the chat, else the method)
+      and halves that bucket's rate; successful calls let it recover
+    - background calls leave `reserve` global tokens for user-facing ones
+      and wait while a user-facing call is held by the global bucket
+    """
+
+    def __init__(self, global_rate=30, chat_rate=1, group_rate=20 / 60, reserve=5):
+        self.global_bucket = TokenBucket(global_rate, max(global_rate, 1))
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.reserve = reserve
+        self.chat_buckets = {}
+        self.method_buckets = {}
+        self.pauses = {}
+        self.high_waiting = 0
+        self.calls = {}
+        self.flood_waits = {}
+        self.flood_seconds = {}
+        self.waited = 0.0
+
+    @staticmethod
+    def chat_key(query):
+        peer = getattr(query, "peer", None) or getattr(query, "to_peer", None)
+        if peer is None:
+            return None
+        if getattr(peer, "channel_id", None):
+            return ("group", peer.channel_id)
+        if getattr(peer, "chat_id", None):
+            return ("group", peer.chat_id)
+        if getattr(peer, "user_id", None):
+            return ("user", peer.user_id)
+        return None
+
+    def _chat_bucket(self, chat):
+        bucket = self.chat_buckets.get(chat)
+        if bucket is None:
+            rate = self.group_rate if chat[0] == "group" else self.chat_rate
+            bucket = self.chat_buckets[chat] = TokenBucket(rate, 3)
+        return bucket
+
+    def _delay(self, method, chat, priority, now):
+        wall = time.time()
+        delay = max(self.pauses.get(chat, 0) - wall, self.pauses.get(method, 0) - wall, 0)
+        bucket = self.method_buckets.get(method)
+        if bucket:
+            delay = max(delay, bucket.wait_time(now))
+        if method in MESSAGE_METHODS:
+            # never reserve the whole burst, or a low OUTBOUND_RATE starves LOW calls
+            reserve = min(self.reserve, self.global_bucket.burst - 1) if priority == LOW else 0
+            delay = max(delay, self.global_bucket.wait_time(now, reserve))
+            if chat is not None:
+                delay = max(delay, self._chat_bucket(chat).wait_time(now))
+        if priority == LOW and self.high_waiting:
+            delay = max(delay, 0.05)
+        return delay
+
+    async def acquire(self, method, chat):
+        priority = outbound_priority.get()
+        started = time.monotonic()
+        waiting = False
+        try:
+            while True:
+                now = time.monotonic()
+                delay = self._delay(method, chat, priority, now)
+                if delay <= 0:
+                    break
+                # only a user-facing call held by the *global* bucket holds back background calls
+                if priority == HIGH and not waiting and method in MESSAGE_METHODS and self.global_bucket.wait_time(now) > 0:
+                    waiting = True
+                    self.high_waiting += 1
+                await asyncio.sleep(delay)
+        finally:
+            if waiting:
+                self.high_waiting -= 1
+        bucket = self.method_buckets.get(method)
+        if bucket:
+            bucket.take()
+        if method in MESSAGE_METHODS:
+            self.global_bucket.take()
+            if chat is not None:
+                self._chat_bucket(chat).take()
+        self.waited += time.monotonic() - started
+
+    def learn(self, method, chat, seconds):
+        self.flood_waits[method] = self.flood_waits.get(method, 0) + 1
+        self.flood_seconds[method] = self.flood_seconds.get(method, 0) + seconds
+        until = time.time() + seconds
+        if chat is not None and method in MESSAGE_METHODS:
+            self.pauses[chat] = max(self.pauses.get(chat, 0), until)
+            self._chat_bucket(chat).penalize()
+        else:
+            self.pauses[method] = max(self.pauses.get(method, 0), until)
+            bucket = self.method_buckets.get(method)
+            if bucket is None:
+                bucket = self.method_buckets[method] = TokenBucket(10, 10)
+            bucket.penalize()
+
+    def _reward(self, method, chat):
+        bucket = self.method_buckets.get(method)
+        if bucket:
+            bucket.reward()
+        if chat is not None and chat in self.chat_buckets:
+            self.chat_buckets[chat].reward()
+
+    async def invoke(self, call, query, retries, timeout, sleep_threshold):
+        """
+        Run `call` (the client's own invoke) through the limiter. FloodWaits
+        up to `sleep_threshold` seconds are waited out here, so other calls to
+        the same chat/method pause too, instead of inside the session.
+        """
+        method = type(query).__name__
+        chat = self.chat_key(query)
+        while True:
+            await self.acquire(method, chat)
+            self.calls[method] = self.calls.get(method, 0) + 1
+            try:
+                result = await call(query, retries, timeout, 0)
+            except FloodWait as e:
+                self.learn(method, chat, e.value)
+                if e.value > sleep_threshold:
+                    raise
+                continue
+            self._reward(method, chat)
+            self._cleanup()
+            return result
+
+    def _cleanup(self):
+        if len(self.pauses) > 1000:
+            wall = time.time()
+            self.pauses = {k: t for k, t in self.pauses.items() if t > wall}
+        if len(self.chat_buckets) > 10000:
+            self.chat_buckets.clear()
+
+    def stats(self):
+        return {
+            "calls": sum(self.calls.values()),
+            "flood_waits": sum(self.flood_waits.values()),
+            "flood_seconds": sum(self.flood_seconds.values()),
+            "waited": self.waited,
+            "paused": sum(1 for t in self.pauses.values() if t > time.time()),
+        }
+
+
+limiter = RateLimiter(Config.OUTBOUND_RATE, Config.CHAT_RATE, Config.GROUP_RATE / 60)
@@ -0,0 +1,46 @@
+from array import array
+from bisect import bisect_left
+
+
+class UserRegistry:
+    """
+    Set of known user ids kept as a sorted int64 array.
+
+    Uses 8 bytes per user instead of a Python set's ~60, and answers
+    membership with a binary search. New users are rare compared to
+    lookups, so the O(n) insert is fine.
+    """
+
+    def __init__(self):
+        self._ids = array('q')
+        self.loaded = False
+
+    def load(self, ids):
+        self._ids = array('q', sorted(set(int(i) for i in ids)))
+        self.loaded = True
+
+    def __contains__(self, id):
+        id = int(id)
+        i = bisect_left(self._ids, id)
+        return i < len(self._ids) and self._ids[i] == id
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, id):
+        id = int(id)
+        i = bisect_left(self._ids, id)
+        if i == len(self._ids) or self._ids[i] != id:
+            self._ids.insert(i, id)
+
+    def discard(self, id):
+        id = int(id)
+        i = bisect_left(self._ids, id)
+        if i < len(self._ids) and self._ids[i] == id:
+            del self._ids[i]
+
+    def discard_many(self, ids):
+        """Remove a batch of ids with one O(n) rebuild instead of one shift per id."""
+        drop = set(int(i) for i in ids)
+        if drop:
+            self._ids = array('q', (i for i in self._ids if i not in drop))
@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import json
+import time
+from config import Config
+from .database import jishubotz
+
+
+class ResultCache:
+    """
+    Remembers the Telegram file_id of every finished rename, keyed by the
+    source file's `file_unique_id` plus a hash of the transformation, so a
+    repeated job can be answered with send_cached_media instead of a full
+    download / ffmpeg / upload cycle.
+
+    Identical jobs running at the same time are coalesced: the first one
+    owns the key, the others wait for its result.
+    """
+
+    TABLE = "results"
+
+    def __init__(self, backend, max_entries=100000, max_age=30 * 86400, enabled=True):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight = {}
+        self._last_evict = 0
+
+    @staticmethod
+    def make_key(file_unique_id, file_name, metadata, output_type, thumb):
+        transform = json.dumps([file_name, metadata, output_type, thumb], ensure_ascii=False)
+        digest = hashlib.sha256(transform.encode()).hexdigest()[:32]
+        return f"{file_unique_id}:{digest}"
+
+    async def acquire(self, key):
+        """
+        Return the cached file_id for `key`, or None. On None the caller owns
+        the key and must call release() once the job is over.
+        """
+        while True:
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            file_id = await asyncio.shield(pending)
+            if file_id:
+                self.coalesced += 1
+                self.hits += 1
+                return file_id
+
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            file_id = await self._get(key)
+        except BaseException:
+            # cancelled: don't leave the waiters of this key hanging
+            self.release(key)
+            raise
+        if file_id:
+            self.hits += 1
+            self.release(key, file_id)
+            return file_id
+        self.misses += 1
+        return None
+
+    def release(self, key, file_id=None):
+        pending = self._inflight.pop(key, None)
+        if pending is not None and not pending.done():
+            pending.set_result(file_id)
+
+    async def _get(self, key):
+        try:
+            doc = await self.backend.find_one(self.TABLE, key)
+            if doc is None:
+                return None
+            if time.time() - doc.get('created', 0) > self.max_age:
+                await self.backend.delete_many(self.TABLE, [key])
+                return None
+            await self.backend.update_one(self.TABLE, key, {'hits': doc.get('hits', 0) + 1, 'used': time.time()})
+            return doc['file_id']
+        except Exception as e:
+            print(f"Result Cache Error: {e}")
+            return None
+
+    async def discard(self, key):
+        """Forget a stored file_id that Telegram no longer accepts."""
+        try:
+            await self.backend.delete_many(self.TABLE, [key])
+        except Exception as e:
+            print(f"Result Cache Error: {e}")
+
+    async def put(self, key, file_id, media_type):
+        now = time.time()
+        try:
+            await self.backend.update_one(
+                self.TABLE, key,
+                {'file_id': file_id, 'media_type': media_type, 'created': now, 'used': now, 'hits': 0},
+                upsert=True
+            )
+            await self._evict()
+        except Exception as e:
+            print(f"Result Cache Error: {e}")
+
+    async def _evict(self):
+        # Size eviction is a count + sort, so run it at most once a minute
+        if time.monotonic() - self._last_evict < 60:
+            return
+        self._last_evict = time.monotonic()
+        extra = await self.backend.count(self.TABLE) - self.max_entries
+        if extra > 0:
+            await self.backend.delete_many(self.TABLE, await self.backend.oldest_ids(self.TABLE, 'used', extra))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+result_cache = ResultCache(
+    jishubotz.backend,
+    max_entries=Config.RESULT_CACHE_MAX_ENTRIES,
+    max_age=Config.RESULT_CACHE_MAX_AGE,
+    enabled=Config.RESULT_CACHE
+)
@@ -0,0 +1,154 @@
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from config import Config
+
+
+class Ticket:
+    __slots__ = ("user_id", "size", "express", "future")
+
+    def __init__(self, user_id, size, express):
+        self.user_id = user_id
+        self.size = size
+        self.express = express
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class JobScheduler:
+    """
+    Hands out `concurrency` job slots fairly:
+
+    - every user has their own FIFO queue and users are served round-robin,
+      so one user's backlog cannot starve everyone else
+    - a user never has more than `per_user` jobs running at once
+    - jobs up to `express_limit` bytes go first (express lane); after
+      `max_skips` express jobs in a row a waiting big job is let through
+    """
+
+    def __init__(self, concurrency=3, per_user=1, express_limit=50 * 1024 * 1024, max_skips=4):
+        self.concurrency = concurrency
+        self.per_user = per_user
+        self.express_limit = express_limit
+        self.max_skips = max_skips
+        self.running = 0
+        self.user_running = {}
+        self.queues = OrderedDict()
+        self._skips = 0
+
+    @property
+    def depth(self):
+        return sum(len(q) for q in self.queues.values())
+
+    def _can_run(self, user_id):
+        return self.user_running.get(user_id, 0) < self.per_user
+
+    def _pick(self):
+        express = big = None
+        for user_id, queue in self.queues.items():
+            if not self._can_run(user_id):
+                continue
+            if express is None:
+                express = next((t for t in queue if t.express), None)
+            if big is None and not queue[0].express:
+                big = queue[0]
+            if express is not None and big is not None:
+                break
+        if express is not None and (big is None or self._skips < self.max_skips):
+            return express
+        return big
+
+    def _dispatch(self):
+        while self.running < self.concurrency:
+            ticket = self._pick()
+            if ticket is None:
+                return
+            queue = self.queues.pop(ticket.user_id)
+            queue.remove(ticket)
+            if queue:
+                self.queues[ticket.user_id] = queue  # re-added at the end: round-robin
+            waiting_big = any(not t.express for q in self.queues.values() for t in q)
+            self._skips = self._skips + 1 if ticket.express and waiting_big else 0
+            self.running += 1
+            self.user_running[ticket.user_id] = self.user_running.get(ticket.user_id, 0) + 1
+            ticket.future.set_result(None)
+
+    def position(self, ticket):
+        """1-based place of `ticket` in the order queued jobs would start in."""
+        lanes = [
+            deque(deque(t for t in q if t.express == express) for q in self.queues.values())
+            for express in (True, False)
+        ]
+        place = 0
+        for lane in lanes:
+            while lane:
+                queue = lane.popleft()
+                if not queue:
+                    continue
+                place += 1
+                if queue.popleft() is ticket:
+                    return place
+                lane.append(queue)
+        return 0
+
+    def _release(self, user_id):
+        self.running -= 1
+        self.user_running[user_id] -= 1
+        if not self.user_running[user_id]:
+            del self.user_running[user_id]
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id, size=0, on_position=None, interval=5):
+        """
+        Wait for a job slot. `on_position(position, depth)` is awaited while
+        the job is queued, whenever its place in the queue changes.
+        """
+        ticket = Ticket(user_id, size or 0, (size or 0) <= self.express_limit)
+        self.queues.setdefault(user_id, deque()).append(ticket)
+        self._dispatch()
+
+        last = None
+        try:
+            while not ticket.future.done():
+                current = (self.position(ticket), self.depth)
+                if on_position is not None and current != last:
+                    last = current
+                    try:
+                        await on_position(*current)
+                    except Exception:
+                        pass
+                try:
+                    await asyncio.wait_for(asyncio.shield(ticket.future), interval)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            if ticket.future.done():
+                self._release(user_id)
+            else:
+                ticket.future.cancel()
+                queue = self.queues.get(user_id)
+                if queue is not None and ticket in queue:
+                    queue.remove(ticket)
+                    if not queue:
+                        del self.queues[user_id]
+            raise
+
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "queued": self.depth,
+            "users_waiting": len(self.queues),
+            "concurrency": self.concurrency,
+        }
+
+
+scheduler = JobScheduler(
+    concurrency=Config.MAX_CONCURRENT,
+    per_user=Config.MAX_PER_USER,
+    express_limit=Config.EXPRESS_SIZE_LIMIT * 1024 * 1024
+)
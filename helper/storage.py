@@ -0,0 +1,256 @@
+import asyncio
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+import motor.motor_asyncio
+from pymongo import UpdateOne
+
+
+class StorageBackend:
+    """
+    What `Database` needs from a store. Documents are plain dicts keyed by
+    `_id`; `table` is the collection name.
+
+    Write ops for bulk_write are tuples:
+        ("insert", doc)        - insert if `_id` does not exist yet
+        ("set", _id, fields)   - `$set` fields on an existing document
+    """
+
+    async def find_one(self, table, _id, fields=None):
+        raise NotImplementedError
+
+    async def insert_one(self, table, doc):
+        raise NotImplementedError
+
+    async def update_one(self, table, _id, fields, upsert=False):
+        raise NotImplementedError
+
+    async def bulk_write(self, table, ops):
+        raise NotImplementedError
+
+    async def delete_many(self, table, ids):
+        raise NotImplementedError
+
+    async def count(self, table):
+        raise NotImplementedError
+
+    async def iter_ids(self, table, after=None, batch_size=1000):
+        """Yield every `_id` in ascending order, starting after `after`."""
+        raise NotImplementedError
+        yield
+
+    async def iter_docs(self, table, batch_size=1000):
+        raise NotImplementedError
+        yield
+
+    async def oldest_ids(self, table, field, limit):
+        """`_id`s of the `limit` documents with the smallest `field`."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+
+#======================= MongoDB ========================#
+
+class MongoBackend(StorageBackend):
+
+    def __init__(self, uri, database_name):
+        self._client = motor.motor_asyncio.AsyncIOMotorClient(uri)
+        self.db = self._client[database_name]
+
+    async def find_one(self, table, _id, fields=None):
+        projection = {field: 1 for field in fields} if fields else None
+        return await self.db[table].find_one({'_id': _id}, projection)
+
+    async def insert_one(self, table, doc):
+        await self.db[table].insert_one(doc)
+
+    async def update_one(self, table, _id, fields, upsert=False):
+        await self.db[table].update_one({'_id': _id}, {'$set': fields}, upsert=upsert)
+
+    async def bulk_write(self, table, ops):
+        requests = []
+        for op in ops:
+            if op[0] == "insert":
+                doc = op[1]
+                fields = {k: v for k, v in doc.items() if k != '_id'}
+                requests.append(UpdateOne({'_id': doc['_id']}, {'$setOnInsert': fields}, upsert=True))
+            else:
+                requests.append(UpdateOne({'_id': op[1]}, {'$set': op[2]}))
+        if requests:
+            await self.db[table].bulk_write(requests, ordered=True)
+
+    async def delete_many(self, table, ids):
+        ids = list(ids)
+        if ids:
+            await self.db[table].delete_many({'_id': {'$in': ids}})
+
+    async def count(self, table):
+        return await self.db[table].count_documents({})
+
+    async def iter_ids(self, table, after=None, batch_size=1000):
+        query = {} if after is None else {'_id': {'$gt': after}}
+        cursor = self.db[table].find(query, {'_id': 1}).sort('_id', 1).batch_size(batch_size)
+        async for doc in cursor:
+            yield doc['_id']
+
+    async def iter_docs(self, table, batch_size=1000):
+        async for doc in self.db[table].find({}).batch_size(batch_size):
+            yield doc
+
+    async def oldest_ids(self, table, field, limit):
+        cursor = self.db[table].find({}, {'_id': 1}).sort(field, 1).limit(limit)
+        return [doc['_id'] async for doc in cursor]
+
+    async def close(self):
+        self._client.close()
+
+
+
+#======================= SQLite ========================#
+
+class SQLiteBackend(StorageBackend):
+    """
+    Embedded single-file store for single-node deployments. Every table
+    is `(_id PRIMARY KEY, doc TEXT)` with the document as JSON. All
+    queries run on one worker thread, so each call is atomic.
+    """
+
+    def __init__(self, path):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._tables = set()
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _table(self, table):
+        if table not in self._tables:
+            self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (_id PRIMARY KEY, doc TEXT NOT NULL)')
+            self._tables.add(table)
+        return f'"{table}"'
+
+    def _load(self, _id, raw):
+        doc = json.loads(raw)
+        doc['_id'] = _id
+        return doc
+
+    def _dump(self, doc):
+        return json.dumps({k: v for k, v in doc.items() if k != '_id'})
+
+    def _find_one(self, table, _id, fields):
+        row = self._conn.execute(f"SELECT doc FROM {self._table(table)} WHERE _id = ?", (_id,)).fetchone()
+        if row is None:
+            return None
+        doc = self._load(_id, row[0])
+        if fields:
+            doc = {k: v for k, v in doc.items() if k == '_id' or k in fields}
+        return doc
+
+    def _insert(self, table, doc, ignore):
+        verb = "INSERT OR IGNORE" if ignore else "INSERT"
+        self._conn.execute(f"{verb} INTO {self._table(table)} (_id, doc) VALUES (?, ?)", (doc['_id'], self._dump(doc)))
+
+    def _set(self, table, _id, fields, upsert):
+        name = self._table(table)
+        row = self._conn.execute(f"SELECT doc FROM {name} WHERE _id = ?", (_id,)).fetchone()
+        if row is None:
+            if upsert:
+                self._conn.execute(f"INSERT INTO {name} (_id, doc) VALUES (?, ?)", (_id, self._dump(fields)))
+            return
+        doc = json.loads(row[0])
+        doc.update(fields)
+        self._conn.execute(f"UPDATE {name} SET doc = ? WHERE _id = ?", (self._dump(doc), _id))
+
+    def _bulk_write(self, table, ops):
+        self._conn.execute("BEGIN")
+        try:
+            for op in ops:
+                if op[0] == "insert":
+                    self._insert(table, op[1], ignore=True)
+                else:
+                    self._set(table, op[1], op[2], upsert=False)
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _delete_many(self, table, ids):
+        self._conn.executemany(f"DELETE FROM {self._table(table)} WHERE _id = ?", [(i,) for i in ids])
+
+    def _count(self, table):
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self._table(table)}").fetchone()[0]
+
+    def _oldest_ids(self, table, field, limit):
+        rows = self._conn.execute(
+            f"SELECT _id FROM {self._table(table)} ORDER BY json_extract(doc, ?) LIMIT ?",
+            (f"$.{field}", limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def _page(self, table, column, after, limit):
+        name = self._table(table)
+        if after is None:
+            return self._conn.execute(f"SELECT _id, {column} FROM {name} ORDER BY _id LIMIT ?", (limit,)).fetchall()
+        return self._conn.execute(f"SELECT _id, {column} FROM {name} WHERE _id > ? ORDER BY _id LIMIT ?", (after, limit)).fetchall()
+
+    async def find_one(self, table, _id, fields=None):
+        return await self._run(self._find_one, table, _id, fields)
+
+    async def insert_one(self, table, doc):
+        await self._run(self._insert, table, doc, False)
+
+    async def update_one(self, table, _id, fields, upsert=False):
+        await self._run(self._set, table, _id, fields, upsert)
+
+    async def bulk_write(self, table, ops):
+        if ops:
+            await self._run(self._bulk_write, table, list(ops))
+
+    async def delete_many(self, table, ids):
+        await self._run(self._delete_many, table, list(ids))
+
+    async def count(self, table):
+        return await self._run(self._count, table)
+
+    async def iter_ids(self, table, after=None, batch_size=1000):
+        while True:
+            rows = await self._run(self._page, table, "NULL", after, batch_size)
+            for _id, _ in rows:
+                yield _id
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][0]
+
+    async def iter_docs(self, table, batch_size=1000):
+        after = None
+        while True:
+            rows = await self._run(self._page, table, "doc", after, batch_size)
+            for _id, raw in rows:
+                yield self._load(_id, raw)
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][0]
+
+    async def oldest_ids(self, table, field, limit):
+        return await self._run(self._oldest_ids, table, field, limit)
+
+    async def close(self):
+        await self._run(self._conn.close)
+        self._executor.shutdown(wait=False)
+
+
+
+def create_backend(name, **options):
+    """Build the backend selected by `DATABASE_BACKEND` ("mongo" or "sqlite")."""
+    name = (name or "mongo").lower()
+    if name == "mongo":
+        return MongoBackend(options["uri"], options["database_name"])
+    if name == "sqlite":
+        return SQLiteBackend(options["path"])
+    raise ValueError(f"Unknown database backend: {name}")
@@ -0,0 +1,550 @@
+"""
+In-place title/artist tagging for Matroska and MP4 files.
+
+Only the small header elements are rewritten; the media data is never
+read or moved. When the new header does not fit into the space that is
+available (the old element plus padding), nothing is written and the
+caller falls back to the ffmpeg remux.
+
+Matroska: Info/Title, every TrackEntry/Name and global ARTIST/AUTHOR
+tags. Rewritten elements are placed into their own slot or into Void
+padding before the first Cluster (the old slot becomes Void), Tags may
+also go to the end of the file, and the SeekHead is updated.
+
+MP4: moov/udta/meta/ilst ©nam and ©ART. The new moov replaces the old
+one when it fits into the old moov plus adjacent free/skip boxes, or
+when moov is the last box in the file. mdat never moves, so chunk
+offsets stay valid.
+"""
+import asyncio
+import os
+import struct
+import zlib
+
+
+class TagWriteError(Exception):
+    pass
+
+
+
+#======================= EBML ========================#
+
+EBML_HEADER = 0x1A45DFA3
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+SEEK = 0x4DBB
+SEEK_ID = 0x53AB
+SEEK_POSITION = 0x53AC
+INFO = 0x1549A966
+TITLE = 0x7BA9
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_NAME = 0x536E
+TAGS = 0x1254C367
+TAG = 0x7373
+TARGETS = 0x63C0
+TARGET_TYPE_VALUE = 0x68CA
+TAG_UIDS = (0x63C5, 0x63C9, 0x63C4, 0x63C6)
+SIMPLE_TAG = 0x67C8
+TAG_NAME = 0x45A3
+TAG_STRING = 0x4487
+CLUSTER = 0x1F43B675
+VOID = 0xEC
+CRC32 = 0xBF
+
+
+def read_vint(buf, pos, keep_marker=False):
+    if pos >= len(buf) or buf[pos] == 0:
+        raise TagWriteError("invalid EBML number")
+    first = buf[pos]
+    length, mask = 1, 0x80
+    while not first & mask:
+        mask >>= 1
+        length += 1
+    if pos + length > len(buf):
+        raise TagWriteError("truncated EBML number")
+    value = first if keep_marker else first & (mask - 1)
+    for b in buf[pos + 1:pos + length]:
+        value = (value << 8) | b
+    return value, length
+
+
+def read_element_header(buf, pos):
+    """(id, size or None when unknown, header length)"""
+    eid, id_len = read_vint(buf, pos, keep_marker=True)
+    size, size_len = read_vint(buf, pos + id_len)
+    if size == (1 << (7 * size_len)) - 1:
+        size = None
+    return eid, size, id_len + size_len
+
+
+def encode_id(eid):
+    return eid.to_bytes((eid.bit_length() + 7) // 8, "big")
+
+
+def encode_size(size, length=None):
+    if length is None:
+        length = 1
+        while size >= (1 << (7 * length)) - 1:
+            length += 1
+    if length > 8 or size >= (1 << (7 * length)) - 1:
+        raise TagWriteError("EBML size does not fit")
+    return ((1 << (7 * length)) | size).to_bytes(length, "big")
+
+
+def ebml_element(eid, data):
+    return encode_id(eid) + encode_size(len(data)) + data
+
+
+def ebml_void_header(total):
+    """Header of a Void element that covers exactly `total` bytes."""
+    if total < 2:
+        raise TagWriteError("no room for Void padding")
+    if total <= 128:
+        return bytes([VOID]) + encode_size(total - 2, 1)
+    return bytes([VOID]) + encode_size(total - 9, 8)
+
+
+def iter_children(data):
+    """Yield (id, payload, raw bytes) for every child of a master element."""
+    pos = 0
+    while pos < len(data):
+        eid, size, header = read_element_header(data, pos)
+        if size is None or pos + header + size > len(data):
+            raise TagWriteError("bad child element")
+        end = pos + header + size
+        yield eid, data[pos + header:end], data[pos:end]
+        pos = end
+
+
+def ebml_master(eid, children):
+    """Build a master element; a leading CRC-32 child is recomputed."""
+    if children and children[0][:1] == bytes([CRC32]):
+        body = b"".join(children[1:])
+        crc = ebml_element(CRC32, zlib.crc32(body).to_bytes(4, "little"))
+        return ebml_element(eid, crc + body)
+    return ebml_element(eid, b"".join(children))
+
+
+def retitle_info(payload, title):
+    kids = [raw for eid, _, raw in iter_children(payload) if eid != TITLE]
+    kids.append(ebml_element(TITLE, title.encode()))
+    return ebml_master(INFO, kids)
+
+
+def rename_tracks(payload, name):
+    entries = []
+    for eid, entry, raw in iter_children(payload):
+        if eid == TRACK_ENTRY:
+            kids = [r for e, _, r in iter_children(entry) if e != TRACK_NAME]
+            kids.append(ebml_element(TRACK_NAME, name.encode()))
+            raw = ebml_master(TRACK_ENTRY, kids)
+        entries.append(raw)
+    return ebml_master(TRACKS, entries)
+
+
+def _is_global_tag(payload):
+    for eid, data, _ in iter_children(payload):
+        if eid == TARGETS:
+            return not any(e in TAG_UIDS for e, _, _ in iter_children(data))
+    return True
+
+
+def _simple_tag_name(payload):
+    for eid, data, _ in iter_children(payload):
+        if eid == TAG_NAME:
+            return data.decode(errors="ignore").upper()
+    return None
+
+
+def _simple_tag(name, value):
+    return ebml_element(SIMPLE_TAG, ebml_element(TAG_NAME, name.encode()) + ebml_element(TAG_STRING, value.encode()))
+
+
+def retag_tags(payload, metadata):
+    replaced = {"TITLE", "ARTIST", "AUTHOR"}
+    tags = []
+    for eid, data, raw in iter_children(payload or b""):
+        if eid == TAG and _is_global_tag(data):
+            kids = [r for e, d, r in iter_children(data) if not (e == SIMPLE_TAG and _simple_tag_name(d) in replaced)]
+            if not any(r[:2] == encode_id(SIMPLE_TAG) for r in kids):
+                continue
+            raw = ebml_master(TAG, kids)
+        tags.append(raw)
+    targets = ebml_element(TARGETS, ebml_element(TARGET_TYPE_VALUE, bytes([50])))
+    tags.append(ebml_element(TAG, targets + _simple_tag("ARTIST", metadata) + _simple_tag("AUTHOR", metadata)))
+    return ebml_master(TAGS, tags)
+
+
+def _seek_entry(eid, position):
+    return ebml_element(SEEK, ebml_element(SEEK_ID, encode_id(eid)) + ebml_element(SEEK_POSITION, position.to_bytes(8, "big")))
+
+
+def _seek_entries(payload):
+    entries = []
+    for eid, data, raw in iter_children(payload):
+        if eid != SEEK:
+            continue
+        seek_id = position = None
+        for e, d, _ in iter_children(data):
+            if e == SEEK_ID:
+                seek_id = int.from_bytes(d, "big")
+            elif e == SEEK_POSITION:
+                position = int.from_bytes(d, "big")
+        if seek_id is not None and position is not None:
+            entries.append((seek_id, position))
+    return entries
+
+
+class Slot:
+    __slots__ = ("eid", "offset", "length", "free")
+
+    def __init__(self, eid, offset, length):
+        self.eid = eid
+        self.offset = offset
+        self.length = length
+        self.free = eid == VOID
+
+    @property
+    def end(self):
+        return self.offset + self.length
+
+
+def _header_at(f, offset):
+    f.seek(offset)
+    buf = f.read(12)
+    eid, size, header = read_element_header(buf, 0)
+    return eid, size, header
+
+
+def _read_payload(f, slot, header):
+    f.seek(slot.offset + header)
+    return f.read(slot.length - header)
+
+
+def tag_matroska(f, file_size, metadata):
+    eid, size, header = _header_at(f, 0)
+    if eid != EBML_HEADER or size is None:
+        raise TagWriteError("not an EBML file")
+    seg_offset = header + size
+    eid, seg_size, header = _header_at(f, seg_offset)
+    if eid != SEGMENT:
+        raise TagWriteError("no Segment")
+    seg_size_offset = seg_offset + 4
+    seg_size_len = header - 4
+    seg_start = seg_offset + header
+    seg_end = file_size if seg_size is None else seg_start + seg_size
+
+    # Level-1 elements up to the first Cluster
+    slots, headers = [], {}
+    pos = seg_start
+    while pos < seg_end:
+        eid, size, header = _header_at(f, pos)
+        if eid == CLUSTER or size is None:
+            break
+        slot = Slot(eid, pos, header + size)
+        slots.append(slot)
+        headers[pos] = header
+        pos = slot.end
+    head_end = pos
+
+    def first(eid):
+        return next((s for s in slots if s.eid == eid), None)
+
+    seek_head, info, tracks, tags = first(SEEK_HEAD), first(INFO), first(TRACKS), first(TAGS)
+    if info is None or tracks is None:
+        raise TagWriteError("Info/Tracks not before the first Cluster")
+
+    seek_entries = _seek_entries(_read_payload(f, seek_head, headers[seek_head.offset])) if seek_head else []
+    seek_crc = False
+    if seek_head:
+        seek_crc = _read_payload(f, seek_head, headers[seek_head.offset])[:1] == bytes([CRC32])
+
+    # Tags written after the clusters are only reachable through a SeekHead
+    if tags is None:
+        pending = list(seek_entries)
+        seen = set()
+        while pending and tags is None:
+            seek_id, position = pending.pop(0)
+            offset = seg_start + position
+            if offset in seen or offset >= seg_end:
+                continue
+            seen.add(offset)
+            eid, size, header = _header_at(f, offset)
+            if size is None or eid != seek_id:
+                continue
+            if eid == TAGS:
+                tags = Slot(TAGS, offset, header + size)
+                headers[offset] = header
+            elif eid == SEEK_HEAD and offset >= head_end:
+                f.seek(offset + header)
+                pending += _seek_entries(f.read(size))
+
+    new_info = retitle_info(_read_payload(f, info, headers[info.offset]), metadata)
+    new_tracks = rename_tracks(_read_payload(f, tracks, headers[tracks.offset]), metadata)
+    new_tags = retag_tags(_read_payload(f, tags, headers[tags.offset]) if tags else b"", metadata)
+
+    for slot in (seek_head, info, tracks):
+        if slot:
+            slot.free = True
+    tags_in_head = tags is not None and tags.offset < head_end
+    if tags_in_head:
+        tags.free = True
+
+    # Free space before the first Cluster as [start, cursor, end] runs
+    runs = []
+    for slot in slots:
+        if slot.free and runs and runs[-1][2] == slot.offset:
+            runs[-1][2] = slot.end
+        elif slot.free:
+            runs.append([slot.offset, slot.offset, slot.end])
+
+    def allocate(length):
+        for run in runs:
+            left = run[2] - run[1] - length
+            if left == 0 or left >= 2:
+                offset = run[1]
+                run[1] += length
+                return offset
+        return None
+
+    placements = []
+    new_positions = {}
+    seek_len = 0
+    if seek_head:
+        count = len(seek_entries) + (0 if any(e == TAGS for e, _ in seek_entries) else 1)
+        seek_len = len(ebml_master(SEEK_HEAD, ([bytes([CRC32]) + b"\x84" + b"\0" * 4] if seek_crc else []) + [_seek_entry(TAGS, 0)] * count))
+        seek_offset = allocate(seek_len)
+        if seek_offset is None:
+            raise TagWriteError("no room for SeekHead")
+
+    for key, blob, old in ((INFO, new_info, info), (TRACKS, new_tracks, tracks)):
+        offset = allocate(len(blob))
+        if offset is None:
+            raise TagWriteError("no room for header element")
+        placements.append((offset, blob))
+        new_positions[(key, old.offset)] = offset
+
+    truncate_to = None
+    old_tags_void = None
+    tags_offset = allocate(len(new_tags))
+    if tags_offset is None:
+        # Tags can also live at the end of the file when a SeekHead points to it
+        if not seek_head or seg_end != file_size:
+            raise TagWriteError("no room for Tags")
+        if tags is not None and not tags_in_head and tags.end == file_size:
+            tags_offset = tags.offset
+        else:
+            tags_offset = file_size
+            if tags is not None and not tags_in_head:
+                old_tags_void = tags
+        truncate_to = tags_offset + len(new_tags)
+        if seg_size is not None:
+            # checked now: once writing starts nothing may fail half way
+            new_seg_size = encode_size(truncate_to - seg_start, seg_size_len)
+    elif tags is not None and not tags_in_head:
+        old_tags_void = tags
+    placements.append((tags_offset, new_tags))
+    if tags is not None:
+        new_positions[(TAGS, tags.offset)] = tags_offset
+
+    if seek_head:
+        entries, has_tags = [], False
+        for seek_id, position in seek_entries:
+            offset = new_positions.get((seek_id, seg_start + position))
+            if seek_id == TAGS and offset is None and tags is None:
+                offset = tags_offset
+            has_tags = has_tags or seek_id == TAGS
+            entries.append(_seek_entry(seek_id, (offset - seg_start) if offset is not None else position))
+        if not has_tags:
+            entries.append(_seek_entry(TAGS, tags_offset - seg_start))
+        if seek_crc:
+            entries.insert(0, ebml_element(CRC32, b"\0" * 4))
+        new_seek = ebml_master(SEEK_HEAD, entries)
+        if len(new_seek) != seek_len:
+            raise TagWriteError("SeekHead size changed")
+        placements.append((seek_offset, new_seek))
+
+    # Everything fits: write it
+    for offset, blob in placements:
+        f.seek(offset)
+        f.write(blob)
+    for run in runs:
+        if run[2] > run[1]:
+            f.seek(run[1])
+            f.write(ebml_void_header(run[2] - run[1]))
+    if old_tags_void is not None:
+        f.seek(old_tags_void.offset)
+        f.write(ebml_void_header(old_tags_void.length))
+    if truncate_to is not None:
+        f.truncate(truncate_to)
+        if seg_size is not None:
+            f.seek(seg_size_offset)
+            f.write(new_seg_size)
+
+
+
+#======================= MP4 ========================#
+
+FREE_BOXES = (b"free", b"skip")
+ILST_TITLE = b"\xa9nam"
+ILST_ARTIST = b"\xa9ART"
+
+
+def mp4_box(btype, payload):
+    return struct.pack(">I4s", 8 + len(payload), btype) + payload
+
+
+def iter_boxes(data):
+    pos = 0
+    while pos + 8 <= len(data):
+        size, btype = struct.unpack(">I4s", data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = len(data) - pos
+        if size < header or pos + size > len(data):
+            raise TagWriteError("bad MP4 box")
+        yield btype, data[pos + header:pos + size], data[pos:pos + size]
+        pos += size
+
+
+def _ilst_item(key, text):
+    return mp4_box(key, mp4_box(b"data", struct.pack(">II", 1, 0) + text.encode()))
+
+
+def retag_ilst(payload, items):
+    kids = [raw for btype, _, raw in iter_boxes(payload) if btype not in items]
+    kids += [_ilst_item(key, value) for key, value in items.items()]
+    return mp4_box(b"ilst", b"".join(kids))
+
+
+def retag_meta(payload, items):
+    # ISO meta is a FullBox (4 bytes version/flags), QuickTime meta is not
+    quicktime = payload[4:8] == b"hdlr"
+    prefix, body = (b"", payload) if quicktime else (payload[:4], payload[4:])
+    kids, found = [], False
+    for btype, data, raw in iter_boxes(body):
+        if btype == b"ilst":
+            raw = retag_ilst(data, items)
+            found = True
+        kids.append(raw)
+    if not found:
+        kids.append(retag_ilst(b"", items))
+    return mp4_box(b"meta", prefix + b"".join(kids))
+
+
+def new_meta(items):
+    hdlr = mp4_box(b"hdlr", b"\0" * 8 + b"mdir" + b"appl" + b"\0" * 9)
+    return mp4_box(b"meta", b"\0" * 4 + hdlr + retag_ilst(b"", items))
+
+
+def retag_moov(payload, metadata):
+    items = {ILST_TITLE: metadata, ILST_ARTIST: metadata}
+    kids, found = [], False
+    for btype, data, raw in iter_boxes(payload):
+        if btype == b"udta":
+            udta, has_meta = [], False
+            for t, d, r in iter_boxes(data):
+                if t == b"meta":
+                    r = retag_meta(d, items)
+                    has_meta = True
+                udta.append(r)
+            if not has_meta:
+                udta.append(new_meta(items))
+            raw = mp4_box(b"udta", b"".join(udta))
+            found = True
+        kids.append(raw)
+    if not found:
+        kids.append(mp4_box(b"udta", new_meta(items)))
+    return mp4_box(b"moov", b"".join(kids))
+
+
+def tag_mp4(f, file_size, metadata):
+    boxes = []
+    pos = 0
+    while pos + 8 <= file_size:
+        f.seek(pos)
+        head = f.read(16)
+        size, btype = struct.unpack(">I4s", head[:8])
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", head[8:16])[0]
+            header = 16
+        elif size == 0:
+            size = file_size - pos
+        if size < header:
+            raise TagWriteError("bad MP4 box")
+        boxes.append((btype, pos, size, header))
+        pos += size
+
+    index = next((i for i, b in enumerate(boxes) if b[0] == b"moov"), None)
+    if index is None:
+        raise TagWriteError("no moov box")
+    btype, moov_offset, moov_size, header = boxes[index]
+    if moov_size > 64 * 1024 * 1024:
+        raise TagWriteError("moov too big")
+    f.seek(moov_offset + header)
+    new_moov = retag_moov(f.read(moov_size - header), metadata)
+
+    # moov plus the free/skip padding around it
+    first = index
+    while first > 0 and boxes[first - 1][0] in FREE_BOXES:
+        first -= 1
+    last = index
+    while last + 1 < len(boxes) and boxes[last + 1][0] in FREE_BOXES:
+        last += 1
+    start = boxes[first][1]
+    end = boxes[last][1] + boxes[last][2]
+
+    if end >= file_size:
+        # moov is last: the file can simply end after the new one
+        f.seek(start)
+        f.write(new_moov)
+        f.truncate(start + len(new_moov))
+        return
+    left = end - start - len(new_moov)
+    if left != 0 and left < 8:
+        raise TagWriteError("no room for moov")
+    f.seek(start)
+    f.write(new_moov)
+    if left:
+        f.write(struct.pack(">I4s", left, b"free"))
+
+
+
+INPLACE_EXTENSIONS = {"mkv", "mka", "mk3d", "webm", "mp4", "m4v", "m4a", "mov"}
+
+
+def can_tag_in_place(file_name):
+    if not file_name or "." not in file_name:
+        return False
+    return file_name.rsplit(".", 1)[-1].lower() in INPLACE_EXTENSIONS
+
+
+def write_tags(path, metadata):
+    """Tag `path` in place. Returns True on success, False if the ffmpeg path is needed."""
+    file_size = os.path.getsize(path)
+    with open(path, "r+b") as f:
+        magic = f.read(12)
+        try:
+            if magic[:4] == encode_id(EBML_HEADER):
+                tag_matroska(f, file_size, metadata)
+                return True
+            if magic[4:8] in (b"ftyp", b"moov", b"free", b"wide", b"mdat"):
+                tag_mp4(f, file_size, metadata)
+                return True
+        except TagWriteError as e:
+            print(f"In-Place Tagging Not Possible : {e}")
+    return False
+
+
+async def write_tags_in_place(path, metadata):
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, write_tags, path, metadata)
+    except Exception as e:
+        print(f"In-Place Tagging Error : {e}")
+        return False
@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+import os
+from config import Config
+from .ffmpeg import fix_thumb
+
+
+class ThumbnailCache:
+    """
+    On-disk LRU of ready-to-upload custom thumbnails, keyed by the photo's
+    file_id. A thumbnail is downloaded and converted once (normally when the
+    user sends the photo) and every later job reuses the file.
+    """
+
+    def __init__(self, directory="thumbs", max_entries=1000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._building = {}
+
+    def path(self, file_id):
+        name = hashlib.sha1(file_id.encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.jpg")
+
+    async def get(self, bot, file_id):
+        """Path of the prepared thumbnail for `file_id`, building it if needed."""
+        path = self.path(file_id)
+        if os.path.exists(path):
+            self.hits += 1
+            os.utime(path)  # mtime is the LRU clock
+            return path
+        self.misses += 1
+        return await self.build(bot, file_id)
+
+    async def build(self, bot, file_id):
+        pending = self._building.get(file_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._build(bot, file_id))
+            self._building[file_id] = pending
+            pending.add_done_callback(lambda _: self._building.pop(file_id, None))
+        return await asyncio.shield(pending)
+
+    async def _build(self, bot, file_id):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(file_id)
+        tmp = await bot.download_media(file_id, file_name=f"{path}.tmp")
+        width, height, thumb = await fix_thumb(tmp)
+        if thumb is None:
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+            return None
+        os.replace(thumb, path)
+        self._evict()
+        return path
+
+    def discard(self, file_id):
+        if file_id:
+            try:
+                os.remove(self.path(file_id))
+            except OSError:
+                pass
+
+    def _evict(self):
+        try:
+            entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".jpg")]
+        except OSError:
+            return
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda p: os.path.getmtime(p))
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+thumb_cache = ThumbnailCache(Config.THUMB_CACHE_DIR, Config.THUMB_CACHE_SIZE)
@@ -0,0 +1,235 @@
+import asyncio
+import math
+import os
+import time
+from pyrogram import raw
+from pyrogram.errors import AuthBytesInvalid
+from pyrogram.file_id import FileId, FileType
+from pyrogram.session import Session, Auth
+from config import Config
+
+
+class CdnRedirect(Exception):
+    pass
+
+
+class TransferEngine:
+    """
+    Moves big files with several MTProto requests in flight at once.
+
+    Downloads fetch `upload.GetFile` parts concurrently over a small pool of
+    media-DC sessions and write every part at its own offset of a
+    preallocated file. Uploads read parts with pread and send
+    `upload.SaveBigFilePart` requests concurrently.
+
+    Anything the engine can't handle (CDN redirects, unusual media types,
+    expired references...) falls back to Pyrogram's sequential transfer.
+    """
+
+    DOWNLOAD_PART = 1024 * 1024     # GetFile limit, 1 MiB is the maximum
+    UPLOAD_PART = 512 * 1024        # SaveBigFilePart size, 512 KiB is the maximum
+    BIG_FILE = 10 * 1024 * 1024     # Telegram only accepts "big file" parts above this size
+
+    def __init__(self, parallelism=4, sessions=2, min_size=20 * 1024 * 1024):
+        self.parallelism = parallelism
+        self.sessions_per_dc = sessions
+        self.min_size = min_size
+        self.bytes_down = 0
+        self.bytes_up = 0
+        self.last_speed = 0.0
+        self._sessions = {}
+        self._lock = asyncio.Lock()
+
+    #======================= Sessions ========================#
+
+    async def _new_session(self, client, dc_id):
+        test_mode = await client.storage.test_mode()
+        if dc_id == await client.storage.dc_id():
+            session = Session(client, dc_id, await client.storage.auth_key(), test_mode, is_media=True)
+            await session.start()
+            return session
+
+        session = Session(client, dc_id, await Auth(client, dc_id, test_mode).create(), test_mode, is_media=True)
+        await session.start()
+        for _ in range(3):
+            exported_auth = await client.invoke(raw.functions.auth.ExportAuthorization(dc_id=dc_id))
+            try:
+                await session.invoke(
+                    raw.functions.auth.ImportAuthorization(id=exported_auth.id, bytes=exported_auth.bytes)
+                )
+            except AuthBytesInvalid:
+                continue
+            return session
+        await session.stop()
+        raise AuthBytesInvalid
+
+    async def sessions(self, client, dc_id):
+        async with self._lock:
+            pool = self._sessions.get(dc_id)
+            if pool is None:
+                pool = [await self._new_session(client, dc_id) for _ in range(self.sessions_per_dc)]
+                self._sessions[dc_id] = pool
+            return pool
+
+    async def close(self):
+        for pool in self._sessions.values():
+            for session in pool:
+                try:
+                    await session.stop()
+                except Exception:
+                    pass
+        self._sessions = {}
+
+    #======================= Helpers ========================#
+
+    async def _run_parts(self, total_parts, sessions, handle_part):
+        next_part = iter(range(total_parts))
+
+        async def worker(session):
+            for part in next_part:
+                await handle_part(session, part)
+
+        workers = [
+            asyncio.create_task(worker(sessions[i % len(sessions)]))
+            for i in range(min(self.parallelism, total_parts))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            raise
+
+    def _record(self, size, started):
+        took = max(time.monotonic() - started, 1e-6)
+        self.last_speed = size / took
+
+    #======================= Download ========================#
+
+    @staticmethod
+    def _location(file_id):
+        # only the document-like types rename jobs deal with; the rest goes the normal way
+        if file_id.file_type not in (FileType.DOCUMENT, FileType.VIDEO, FileType.AUDIO, FileType.ANIMATION, FileType.VOICE):
+            return None
+        return raw.types.InputDocumentFileLocation(
+            id=file_id.media_id,
+            access_hash=file_id.access_hash,
+            file_reference=file_id.file_reference,
+            thumb_size=file_id.thumbnail_size
+        )
+
+    async def download(self, client, message, file_name, progress=None, progress_args=()):
+        """Download the media of `message` to `file_name` and return the path."""
+        media = getattr(message, message.media.value)
+        size = media.file_size or 0
+        if size < self.min_size or self.parallelism < 2:
+            return await client.download_media(message, file_name=file_name, progress=progress, progress_args=progress_args)
+
+        file_id = FileId.decode(media.file_id)
+        location = self._location(file_id)
+        if location is None:
+            return await client.download_media(message, file_name=file_name, progress=progress, progress_args=progress_args)
+
+        path = os.path.abspath(file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            await self._download(client, file_id.dc_id, location, size, path, progress, progress_args)
+        except CdnRedirect:
+            return await client.download_media(message, file_name=file_name, progress=progress, progress_args=progress_args)
+        except Exception as e:
+            print(f"Parallel Download Failed, Falling Back : {e}")
+            return await client.download_media(message, file_name=file_name, progress=progress, progress_args=progress_args)
+        return path
+
+    async def _download(self, client, dc_id, location, size, path, progress, progress_args):
+        sessions = await self.sessions(client, dc_id)
+        loop = asyncio.get_running_loop()
+        total_parts = math.ceil(size / self.DOWNLOAD_PART)
+        done = 0
+        started = time.monotonic()
+
+        with open(path, "wb") as f:
+            f.truncate(size)  # preallocate so every part can be written at its offset
+        fd = os.open(path, os.O_WRONLY)
+
+        async def fetch(session, part):
+            nonlocal done
+            offset = part * self.DOWNLOAD_PART
+            r = await session.invoke(
+                raw.functions.upload.GetFile(location=location, offset=offset, limit=self.DOWNLOAD_PART),
+                sleep_threshold=30
+            )
+            if not isinstance(r, raw.types.upload.File):
+                raise CdnRedirect()
+            await loop.run_in_executor(None, os.pwrite, fd, r.bytes, offset)
+            done += len(r.bytes)
+            self.bytes_down += len(r.bytes)
+            if progress:
+                self._record(done, started)
+                await progress(min(done, size), size, *progress_args)
+
+        try:
+            await self._run_parts(total_parts, sessions, fetch)
+        except BaseException:
+            os.close(fd)
+            os.remove(path)
+            raise
+        os.close(fd)
+        self._record(size, started)
+
+    #======================= Upload ========================#
+
+    def wants_upload(self, path):
+        if not isinstance(path, str) or self.parallelism < 2 or not os.path.isfile(path):
+            return False
+        return os.path.getsize(path) > max(self.min_size, self.BIG_FILE)
+
+    async def save_big_file(self, client, path, progress=None, progress_args=()):
+        """Upload `path` with parallel SaveBigFilePart calls and return an InputFileBig."""
+        size = os.path.getsize(path)
+        sessions = await self.sessions(client, await client.storage.dc_id())
+        loop = asyncio.get_running_loop()
+        total_parts = math.ceil(size / self.UPLOAD_PART)
+        file_id = client.rnd_id()
+        done = 0
+        started = time.monotonic()
+        fd = os.open(path, os.O_RDONLY)
+
+        async def send(session, part):
+            nonlocal done
+            chunk = await loop.run_in_executor(None, os.pread, fd, self.UPLOAD_PART, part * self.UPLOAD_PART)
+            await session.invoke(
+                raw.functions.upload.SaveBigFilePart(
+                    file_id=file_id,
+                    file_part=part,
+                    file_total_parts=total_parts,
+                    bytes=chunk
+                )
+            )
+            done += len(chunk)
+            self.bytes_up += len(chunk)
+            if progress:
+                self._record(done, started)
+                await progress(min(done, size), size, *progress_args)
+
+        try:
+            await self._run_parts(total_parts, sessions, send)
+        finally:
+            os.close(fd)
+        self._record(size, started)
+        return raw.types.InputFileBig(id=file_id, parts=total_parts, name=os.path.basename(path))
+
+    def stats(self):
+        return {
+            "bytes_down": self.bytes_down,
+            "bytes_up": self.bytes_up,
+            "last_speed": self.last_speed,
+            "parallelism": self.parallelism,
+        }
+
+
+transfer = TransferEngine(
+    parallelism=Config.TRANSFER_PARALLELISM,
+    sessions=Config.TRANSFER_SESSIONS,
+    min_size=Config.PARALLEL_MIN_SIZE * 1024 * 1024
+)
@@ -0,0 +1,160 @@
+import asyncio
+import os
+import shutil
+import uuid
+from contextlib import asynccontextmanager
+from config import Config
+
+
+class DiskQuotaError(Exception):
+    pass
+
+
+class Workspace:
+    """Scratch directory of one job, removed with everything in it when the job ends."""
+
+    def __init__(self, path, reserved):
+        self.path = path
+        self.reserved = reserved
+
+    def file(self, *parts):
+        path = os.path.join(self.path, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+
+class WorkspaceManager:
+    """
+    Hands every job its own directory under `root` and only admits a job
+    when its estimated disk need fits:
+
+    - into `quota` (sum of what running jobs reserved), and
+    - into the free disk space minus what running jobs will still write,
+      keeping `min_free` bytes spare
+
+    Jobs that don't fit wait until another job's directory is removed.
+    """
+
+    LEGACY_DIRS = ("Metadata",)
+
+    def __init__(self, root="downloads", quota=20 * 1024 ** 3, min_free=1024 ** 3, poll=5):
+        self.root = root
+        self.quota = quota
+        self.min_free = min_free
+        self.poll = poll
+        self.reserved = 0
+        self.active = 0
+        self.waiting = 0
+        self._cond = None
+
+    def usage(self):
+        total = 0
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+        return total
+
+    def free(self):
+        try:
+            return shutil.disk_usage(self.root).free
+        except OSError:
+            return None
+
+    def _measure(self, walk):
+        """(free, usage) of the disk; walking the tree is skipped when nothing is reserved."""
+        return self.free(), (self.usage() if walk else 0)
+
+    async def measure(self):
+        # os.walk over every running job's files: keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, self._measure, self.reserved > 0)
+
+    def _fits(self, size, free, used):
+        if self.quota and self.reserved + size > self.quota:
+            return False
+        if free is None:
+            return True
+        pending = max(0, self.reserved - used)
+        return free - pending - size >= self.min_free
+
+    @asynccontextmanager
+    async def job(self, size, on_wait=None):
+        """Reserve `size` bytes, yield a fresh Workspace and always clean it up."""
+        if self.quota and size > self.quota:
+            raise DiskQuotaError("File Is Too Big For The Bot's Disk Quota")
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        os.makedirs(self.root, exist_ok=True)
+
+        notified = False
+        while True:
+            if not (self.quota and self.reserved + size > self.quota):
+                free, used = await self.measure()
+                # no await between this check and the reservation below
+                if self._fits(size, free, used):
+                    break
+            if not self.active:
+                # nothing running that could free space
+                raise DiskQuotaError("Not Enough Disk Space Right Now, Try Again Later")
+            if not notified and on_wait:
+                notified = True
+                await on_wait()
+            self.waiting += 1
+            try:
+                async with self._cond:
+                    await asyncio.wait_for(self._cond.wait(), self.poll)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.waiting -= 1
+
+        self.reserved += size
+        self.active += 1
+        path = os.path.join(self.root, uuid.uuid4().hex)
+        os.makedirs(path, exist_ok=True)
+        try:
+            yield Workspace(path, size)
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+            self.reserved -= size
+            self.active -= 1
+            async with self._cond:
+                self._cond.notify_all()
+
+    def sweep(self):
+        """Delete whatever an earlier run left behind. Call before any job starts."""
+        removed = 0
+        for directory in (self.root, *self.LEGACY_DIRS):
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                    removed += 1
+                except OSError as e:
+                    print(f"Workspace Sweep Error: {e}")
+        return removed
+
+    async def stats(self):
+        free, used = await self.measure()
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "reserved": self.reserved,
+            "quota": self.quota,
+            "usage": used,
+            "free": free or 0,
+        }
+
+
+workspace = WorkspaceManager(
+    Config.WORKSPACE_DIR,
+    quota=Config.WORKSPACE_QUOTA * 1024 ** 3,
+    min_free=Config.MIN_FREE_SPACE * 1024 * 1024
+)
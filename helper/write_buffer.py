@@ -0,0 +1,131 @@
+import asyncio
+
+
+class WriteBehindBuffer:
+    """
+    Gathers user inserts and `$set` updates for a short window and sends them
+    to the storage backend as ordered bulk_write batches.
+
+    There is at most one pending operation per user: later updates are
+    merged into it, also after a failed flush put it back in the queue.
+    When `max_pending` operations are waiting the caller flushes inline
+    before adding another one; if the backend is down that raises, so the
+    queue never grows past `max_pending` while it stays down.
+
+    Reads that miss the cache go to the backend, which doesn't have the
+    buffered writes yet; `overlay` puts them on top of what it returned.
+    """
+
+    def __init__(self, backend, table, interval=1.0, max_pending=1000, batch_size=500):
+        self.backend = backend
+        self.table = table
+        self.interval = interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._ops = []
+        self._updates = {}
+        self._inserts = {}
+        self._flushing = ({}, {})   # (inserts, updates) of the batch being written
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    def __len__(self):
+        return len(self._ops)
+
+    def has_insert(self, id):
+        id = int(id)
+        return id in self._inserts or id in self._flushing[0]
+
+    def pending(self, id):
+        """Copy of what is buffered for `id`: (inserted doc or None, merged `$set` fields)."""
+        id = int(id)
+        inserted, fields = None, {}
+        for inserts, updates in (self._flushing, (self._inserts, self._updates)):
+            if inserted is None and id in inserts:
+                inserted = dict(inserts[id])
+            fields.update(updates.get(id, {}))
+        return inserted, fields
+
+    def overlay(self, id, doc, before=None):
+        """
+        `doc` as read from the backend with the buffered writes for `id` on
+        top: `before` (a pending() taken ahead of the read, in case a flush
+        finished meanwhile), then what is buffered now.
+        """
+        for inserted, fields in (before or (None, {}), self.pending(id)):
+            if doc is None:
+                doc = inserted
+            if doc is not None and fields:
+                doc = {**doc, **fields}
+        return doc
+
+    async def insert(self, doc):
+        await self._make_room()
+        self._add(("insert", doc))
+        self._start()
+
+    async def update(self, id, fields):
+        id = int(id)
+        if id not in self._updates:
+            await self._make_room()
+        pending = self._updates.get(id)
+        if pending is not None:
+            pending.update(fields)
+            return
+        self._add(("set", id, dict(fields)))
+        self._start()
+
+    def _add(self, op):
+        """Queue `op`, merging a `$set` into the one already pending for the same id."""
+        if op[0] == "insert":
+            self._inserts[op[1]['_id']] = op[1]
+        elif op[1] in self._updates:
+            self._updates[op[1]].update(op[2])
+            return
+        else:
+            self._updates[op[1]] = op[2]
+        self._ops.append(op)
+
+    async def _make_room(self):
+        if len(self._ops) >= self.max_pending:
+            await self.flush()
+
+    def _start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Write-Behind Flush Error: {e}")
+
+    async def flush(self):
+        async with self._lock:
+            ops, self._ops = self._ops, []
+            self._flushing = (self._inserts, self._updates)
+            self._updates = {}
+            self._inserts = {}
+            try:
+                for i in range(0, len(ops), self.batch_size):
+                    batch = ops[i:i + self.batch_size]
+                    try:
+                        await self.backend.bulk_write(self.table, batch)
+                    except Exception:
+                        # Keep what was not written so the next flush retries it,
+                        # ahead of (and merged with) what came in meanwhile
+                        newer = self._ops
+                        self._ops, self._updates, self._inserts = [], {}, {}
+                        for op in ops[i:] + newer:
+                            self._add(op)
+                        raise
+            finally:
+                self._flushing = ({}, {})
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
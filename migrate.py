@@ -0,0 +1,56 @@
+"""
+Copy bot data between storage backends.
+
+    python3 migrate.py mongo sqlite      # MongoDB (DATABASE_URL) -> SQLITE_PATH
+    python3 migrate.py sqlite mongo      # and back
+
+Existing documents in the target are left untouched.
+"""
+import argparse
+import asyncio
+from config import Config
+from helper.storage import create_backend
+
+TABLES = ["user", "results", "config"]
+
+
+def open_backend(name):
+    return create_backend(
+        name,
+        uri=Config.DATABASE_URL,
+        database_name=Config.DATABASE_NAME,
+        path=Config.SQLITE_PATH
+    )
+
+
+async def migrate(source_name, target_name, batch_size):
+    source = open_backend(source_name)
+    target = open_backend(target_name)
+    try:
+        for table in TABLES:
+            copied = 0
+            batch = []
+            async for doc in source.iter_docs(table, batch_size=batch_size):
+                batch.append(("insert", doc))
+                if len(batch) >= batch_size:
+                    await target.bulk_write(table, batch)
+                    copied += len(batch)
+                    batch = []
+                    print(f"{table}: {copied} copied...")
+            await target.bulk_write(table, batch)
+            copied += len(batch)
+            print(f"{table}: {copied} documents copied ({await target.count(table)} in target)")
+    finally:
+        await source.close()
+        await target.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy bot data between storage backends.")
+    parser.add_argument("source", choices=["mongo", "sqlite"])
+    parser.add_argument("target", choices=["mongo", "sqlite"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    if args.source == args.target:
+        parser.error("source and target must be different backends")
+    asyncio.run(migrate(args.source, args.target, args.batch_size))
@@ -1,10 +1,19 @@
 
-import os, sys, time, asyncio, logging, datetime
+import os, sys, time, asyncio, logging
 from config import Config
 from pyrogram import Client, filters
 from helper.database import jishubotz
+from helper.membership import membership
+from helper.result_cache import result_cache
+from helper.scheduler import scheduler
+from helper.pipeline import pipeline
+from helper.log_mirror import log_mirror
+from helper.workspace import workspace
+from helper.progress import progress_service
+from helper.ratelimit import limiter
+from helper.broadcast import broadcaster
+from helper.utils import humanbytes
 from pyrogram.types import Message
-from pyrogram.errors import FloodWait, InputUserDeactivated, UserIsBlocked, PeerIdInvalid
 
 
 logger = logging.getLogger(__name__)
@@ -22,7 +31,30 @@ async def get_stats(bot, message):
     st = await message.reply('**Processing The Details.....**', quote=True)    
     end_t = time.time()
     time_taken_s = (end_t - start_t) * 1000
-    await st.edit(text=f"**--Bot Status--** \n\n**⌚ Bot Uptime:** `{uptime}` \n**🐌 Current Ping:** `{time_taken_s:.3f} ms` \n**👭 Total Users:** `{total_users}`")
+    cache = jishubotz.cache_stats()
+    fsub = membership.stats()
+    results = result_cache.stats()
+    jobs = scheduler.stats()
+    disk = await workspace.stats()
+    bars = progress_service.stats()
+    api = limiter.stats()
+    stages = "".join(
+        f"\n  • {name}: `{stage['active']}/{stage['workers']} busy, {stage['queued']} queued, avg {stage['avg_time']:.1f}s (wait {stage['avg_wait']:.1f}s)`"
+        for name, stage in pipeline.stats().items()
+    )
+    await st.edit(text=f"**--Bot Status--** \n\n**⌚ Bot Uptime:** `{uptime}` \n**🐌 Current Ping:** `{time_taken_s:.3f} ms` \n**👭 Total Users:** `{total_users}` \n**🗃 Settings Cache:** `{cache['hits']} hits / {cache['misses']} misses ({cache['hit_rate']:.0%})` \n**📢 Force-Sub Cache:** `{fsub['hits']} hits / {fsub['misses']} misses ({fsub['hit_rate']:.0%})` \n**♻️ Result Cache:** `{results['hits']} hits / {results['misses']} misses, {results['coalesced']} coalesced` \n**⚙️ Jobs:** `{jobs['running']} / {jobs['concurrency']} running, {jobs['queued']} queued ({jobs['users_waiting']} users)`{stages} \n**💾 Scratch Disk:** `{humanbytes(disk['usage']) or '0 B'} used, {humanbytes(disk['reserved']) or '0 B'} reserved, {humanbytes(disk['free']) or '0 B'} free, {disk['waiting']} waiting` \n**✏️ Progress Edits:** `{bars['edits']} edits for {bars['updates']} updates, {bars['flood_waits']} FloodWaits` \n**🚦 Telegram API:** `{api['calls']} calls, waited {api['waited']:.0f}s, {api['flood_waits']} FloodWaits ({api['flood_seconds']}s), {api['paused']} paused`")
+
+
+
+@Client.on_message(filters.command(["logmirror", "lm"]) & filters.user(Config.ADMIN))
+async def log_mirror_settings(bot, message):
+    if len(message.command) == 3 and message.command[1] in log_mirror.MEDIA_TYPES and message.command[2] in ("on", "off"):
+        await log_mirror.set_enabled(message.command[1], message.command[2] == "on")
+    elif len(message.command) != 1:
+        return await message.reply_text("**Usage :** `/logmirror [document|video|audio] [on|off]`", quote=True)
+    status = "\n".join(f"**{media_type.title()} :** `{'On ✅' if on else 'Off ❌'}`" for media_type, on in log_mirror.enabled.items())
+    stats = log_mirror.stats()
+    await message.reply_text(f"**--Log Channel Mirror--**\n\n{status}\n\n**Queued :** `{stats['queued']}` | **Sent :** `{stats['sent']}` | **Failed :** `{stats['failed']}`", quote=True)
 
 
 
@@ -48,49 +80,14 @@ async def ping(_, message):
 
 @Client.on_message(filters.command(["broadcast", "b"]) & filters.user(Config.ADMIN) & filters.reply)
 async def broadcast_handler(bot: Client, m: Message):
+    if broadcaster.running:
+        return await m.reply_text("A Broadcast Is Already Running, Wait For It To Finish.", quote=True)
     await bot.send_message(Config.LOG_CHANNEL, f"{m.from_user.mention} or {m.from_user.id} Is Started The Broadcast......")
-    all_users = await jishubotz.get_all_users()
-    broadcast_msg = m.reply_to_message
-    sts_msg = await m.reply_text("Broadcast Started..!", quote=True) 
-    done = 0
-    failed = 0
-    success = 0
-    start_time = time.time()
-    total_users = await jishubotz.total_users_count()
-    async for user in all_users:
-        sts = await send_msg(user['_id'], broadcast_msg)
-        if sts == 200:
-           success += 1
-        else:
-           failed += 1
-        if sts == 400:
-           await jishubotz.delete_user(user['_id'])
-        done += 1
-        if not done % 20:
-           await sts_msg.edit(f"**Broadcast In Progress:** \n\nTotal Users {total_users} \nCompleted: {done} / {total_users}\nSuccess: {success}\nFailed: {failed}")
-    completed_in = datetime.timedelta(seconds=int(time.time() - start_time))
-    await sts_msg.edit(f"**Broadcast Completed:** \n\nCompleted In `{completed_in}`.\n\nTotal Users {total_users}\nCompleted: {done} / {total_users}\nSuccess: {success}\nFailed: {failed}")
-           
-async def send_msg(user_id, message):
-    try:
-        await message.copy(chat_id=int(user_id))
-        return 200
-    except FloodWait as e:
-        await asyncio.sleep(e.value)
-        return send_msg(user_id, message)
-    except InputUserDeactivated:
-        logger.info(f"{user_id} : Deactivated")
-        return 400
-    except UserIsBlocked:
-        logger.info(f"{user_id} : Blocked The Bot")
-        return 400
-    except PeerIdInvalid:
-        logger.info(f"{user_id} : User ID Invalid")
-        return 400
-    except Exception as e:
-        logger.error(f"{user_id} : {e}")
-        return 500
- 
+    sts_msg = await m.reply_text("Broadcast Started..!", quote=True)
+    # runs in the background, checkpointed and resumed after a restart
+    if not await broadcaster.start(bot, m.reply_to_message, sts_msg):
+        await sts_msg.edit("A Broadcast Is Already Running, Wait For It To Finish.")
+
 
 
 
@@ -0,0 +1,130 @@
+from pyrogram import Client, filters
+from pyrogram.enums import MessageMediaType
+from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from helper.batch import BatchStatus, check_template, render_template
+from helper.database import jishubotz
+from helper.cache import TTLCache
+from plugins.file_rename import rename_file
+from config import Txt
+import asyncio
+
+BATCH_TIMEOUT = 600     # seconds a batch waits for files / the template
+MAX_BATCH_FILES = 100
+
+# user_id -> {"files": [messages], "names": [...]}, expiring BATCH_TIMEOUT after the last file / template
+batches = TTLCache(10000, BATCH_TIMEOUT)
+
+
+def active_batch(user_id):
+    return batches.peek(user_id)
+
+
+async def collecting(_, __, message):
+    return message.from_user is not None and active_batch(message.from_user.id) is not None
+
+in_batch = filters.create(collecting)
+
+
+@Client.on_message(filters.private & filters.command("batch"))
+async def batch_start(client, message):
+    batches.set(message.from_user.id, {"files": [], "names": None})
+    await message.reply_text(Txt.BATCH_TXT.format(max_files=MAX_BATCH_FILES), quote=True)
+
+
+@Client.on_message(filters.private & filters.command("cancel_batch"))
+async def batch_cancel(client, message):
+    if batches.pop(message.from_user.id):
+        return await message.reply_text("❌ Batch Cancelled", quote=True)
+    await message.reply_text("There Is No Batch Running.", quote=True)
+
+
+@Client.on_message(filters.private & (filters.document | filters.audio | filters.video) & in_batch)
+async def batch_collect(client, message):
+    # no reply per file: albums and long batches would cost one message each
+    session = active_batch(message.from_user.id)
+    file = getattr(message, message.media.value)
+    if file.file_size > 2000 * 1024 * 1024:
+        return await message.reply_text("❌ This bot doesn’t support files bigger than 2GB, skipped", quote=True)
+    if len(session["files"]) >= MAX_BATCH_FILES:
+        if len(session["files"]) == MAX_BATCH_FILES:
+            session["files"].append(None)  # warn only once
+            await message.reply_text(f"⚠️ Only {MAX_BATCH_FILES} Files Per Batch, The Rest Is Ignored.", quote=True)
+        return
+    session["files"].append(message)
+    batches.set(message.from_user.id, session)
+
+
+@Client.on_message(filters.private & filters.text & ~filters.regex(r"^/") & in_batch)
+async def batch_template(client, message):
+    session = active_batch(message.from_user.id)
+    files = sorted((m for m in session["files"] if m is not None), key=lambda m: m.id)
+    if not files:
+        return await message.reply_text("Send The Files First, Then The Template.", quote=True)
+
+    template = message.text.strip()
+    try:
+        check_template(template)
+        names = [render_template(template, getattr(m, m.media.value).file_name, n) for n, m in enumerate(files, 1)]
+    except (ValueError, KeyError, IndexError) as e:
+        return await message.reply_text(f"❌ {e}\n\nSee /batch For The Variables.", quote=True)
+    session["files"] = files
+    session["names"] = names
+    batches.set(message.from_user.id, session)
+
+    preview = "\n".join(f"`{name}`" for name in names[:5])
+    if len(names) > 5:
+        preview += f"\n... And {len(names) - 5} More"
+    button = [
+        [InlineKeyboardButton("📁 Document", callback_data="batch_document"),
+         InlineKeyboardButton("🎥 Video / 🎵 Audio", callback_data="batch_media")],
+        [InlineKeyboardButton("✖️ Cancel", callback_data="batch_cancel")]
+    ]
+    await message.reply_text(
+        f"**{len(names)} Files Will Be Renamed To :**\n\n{preview}\n\n**Select The Output File Type**",
+        reply_markup=InlineKeyboardMarkup(button),
+        quote=True
+    )
+
+
+def output_type(file_msg, choice):
+    if choice == "document":
+        return "document"
+    if file_msg.media == MessageMediaType.AUDIO:
+        return "audio"
+    if file_msg.media == MessageMediaType.VIDEO:
+        return "video"
+    # documents: only real media becomes video / audio, PDFs and archives stay documents
+    mime_type = file_msg.document.mime_type or ""
+    if mime_type.startswith("video/"):
+        return "video"
+    if mime_type.startswith("audio/"):
+        return "audio"
+    return "document"
+
+
+@Client.on_callback_query(filters.regex(r"^batch_"))
+async def batch_run(client, query):
+    choice = query.data.split("_", 1)[1]
+    user_id = query.from_user.id
+    session = batches.peek(user_id)
+    if choice == "cancel":
+        batches.pop(user_id)
+        return await query.message.edit("❌ Batch Cancelled")
+    if not session or not session["names"]:
+        return await query.message.edit("This Batch Has Expired, Start Again With /batch")
+    batches.pop(user_id)
+
+    # every file goes through the normal rename path; one message shows all of them
+    settings = await jishubotz.get_user_settings(user_id)
+    status = BatchStatus(query.message, session["names"])
+
+    async def one(job_status, file_msg, name):
+        try:
+            await rename_file(client, job_status, user_id, file_msg, name, output_type(file_msg, choice), settings)
+        except Exception as e:
+            await job_status.edit(f"❌ {e}")
+        # a finished job deletes its status message; anything else was an error
+        status.finish(job_status, job_status.finished)
+
+    jobs = [one(job_status, file_msg, name) for job_status, file_msg, name in zip(status.jobs, session["files"], session["names"])]
+    asyncio.create_task(status.run(jobs))
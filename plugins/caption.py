@@ -11,7 +11,7 @@ async def add_caption(client, message):
    
 @Client.on_message(filters.private & filters.command(['del_caption', "dc"]))
 async def delete_caption(client, message):
-    caption = await jishubotz.get_caption(message.from_user.id)  
+    caption = (await jishubotz.get_user_settings(message.from_user.id)).caption  
     if not caption:
        return await message.reply_text("**You Don't Have Any Caption ❌**", quote=True)
     await jishubotz.set_caption(message.from_user.id, caption=None)
@@ -19,7 +19,7 @@ async def delete_caption(client, message):
                                        
 @Client.on_message(filters.private & filters.command(['see_caption', 'view_caption', "vc"]))
 async def see_caption(client, message):
-    caption = await jishubotz.get_caption(message.from_user.id)  
+    caption = (await jishubotz.get_user_settings(message.from_user.id)).caption  
     if caption:
        await message.reply_text(f"**Your Caption :**\n\n`{caption}`", quote=True)
     else:
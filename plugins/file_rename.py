@@ -2,32 +2,25 @@ from pyrogram import Client, filters
 from pyrogram.enums import MessageMediaType
 from pyrogram.errors import FloodWait
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ForceReply
-from helper.ffmpeg import fix_thumb, take_screen_shot, add_metadata
-from helper.utils import progress_for_pyrogram, convert, humanbytes, add_prefix_suffix
+from helper.ffmpeg import smart_thumbnail, add_metadata, process_media, can_stream_remux, stream_add_metadata
+from helper.utils import convert, humanbytes, add_prefix_suffix
+from helper.progress import progress_for_pyrogram, progress_service
 from helper.database import jishubotz
+from helper.result_cache import result_cache
+from helper.scheduler import scheduler
+from helper.pipeline import pipeline
+from helper.transfer import transfer
+from helper.log_mirror import log_mirror
+from helper.probe import media_probe, MediaInfo
+from helper.thumbs import thumb_cache
+from helper.tags import can_tag_in_place, write_tags_in_place
+from helper.workspace import workspace, DiskQuotaError
+from helper.conversation import conversations
+from helper.leech import downloader, UrlFile
+from helper.metrics import metrics
+from config import Config
 from PIL import Image
-import os, time, random, asyncio, subprocess
-
-# ================== CONFIG ==================
-LOG_CHANNEL = -1003058967184  # <-- Put your log channel ID here
-MAX_CONCURRENT = 3            # Limit concurrent rename+upload tasks
-semaphore = asyncio.Semaphore(MAX_CONCURRENT)
-# ===========================================
-
-def get_duration(path):
-    """Get actual video/audio duration using ffprobe."""
-    try:
-        result = subprocess.run(
-            ["ffprobe", "-v", "error", "-show_entries",
-             "format=duration", "-of",
-             "default=noprint_wrappers=1:nokey=1", path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT
-        )
-        return int(float(result.stdout))
-    except:
-        return 0
-
+import os, time, asyncio
 
 @Client.on_message(filters.private & (filters.document | filters.audio | filters.video))
 async def rename_start(client, message):
@@ -39,33 +32,43 @@ async def rename_start(client, message):
             quote=True
         )
 
+    await ask_new_name(message, filename)
+
+
+async def ask_new_name(message, filename, media=None):
+    # remember the file under the prompt and return; the reply arrives as a new update
     try:
-        await message.reply_text(
+        prompt = await message.reply_text(
             text=f"**Please Enter New Filename...**\n\n**Old File Name** :- `{filename}`",
             reply_to_message_id=message.id,
             reply_markup=ForceReply(True)
         )
-        await asyncio.sleep(30)
     except FloodWait as e:
         await asyncio.sleep(e.value)
-        await message.reply_text(
+        prompt = await message.reply_text(
             text=f"**Please Enter New Filename...**\n\n**Old File Name** :- `{filename}`",
             reply_to_message_id=message.id,
             reply_markup=ForceReply(True)
         )
     except:
-        pass
+        return
+    conversations.open(message.chat.id, prompt.id, message, media)
 
 
 @Client.on_message(filters.private & filters.reply)
 async def refunc(client, message):
     reply_message = message.reply_to_message
     if (reply_message.reply_markup) and isinstance(reply_message.reply_markup, ForceReply):
+        pending = conversations.get(message.chat.id, reply_message.id)
+        if pending is None:
+            await reply_message.delete()
+            return await message.reply_text("**Request Timed Out.**\n\nSend The File Again To Rename It.", quote=True)
+        if not message.text:
+            return
         new_name = message.text
         await message.delete()
-        msg = await client.get_messages(message.chat.id, reply_message.id)
-        file = msg.reply_to_message
-        media = getattr(file, file.media.value)
+        file = pending.source
+        media = pending.media
 
         if "." not in new_name:
             if "." in media.file_name:
@@ -74,142 +77,291 @@ async def refunc(client, message):
                 extn = "mkv"
             new_name = new_name + "." + extn
         await reply_message.delete()
+        pending.new_name = new_name
 
+        # leeched links have no Telegram media type, only a mime type
+        mime_type = getattr(media, "mime_type", None) or ""
         button = [[InlineKeyboardButton("📁 Document", callback_data="upload_document")]]
-        if file.media in [MessageMediaType.VIDEO, MessageMediaType.DOCUMENT]:
+        if file.media in [MessageMediaType.VIDEO, MessageMediaType.DOCUMENT] or mime_type.startswith("video/"):
             button.append([InlineKeyboardButton("🎥 Video", callback_data="upload_video")])
-        elif file.media == MessageMediaType.AUDIO:
+        elif file.media == MessageMediaType.AUDIO or mime_type.startswith("audio/"):
             button.append([InlineKeyboardButton("🎵 Audio", callback_data="upload_audio")])
 
-        await message.reply(
+        choice = await message.reply(
             text=f"**Select The Output File Type**\n\n**File Name :-** `{new_name}`",
             reply_to_message_id=file.id,
             reply_markup=InlineKeyboardMarkup(button)
         )
+        conversations.move(message.chat.id, reply_message.id, choice.id)
 
 
 @Client.on_callback_query(filters.regex("upload"))
 async def doc(bot, update):
     asyncio.create_task(process_file(bot, update))  # run in background
 
-async def process_file(bot, update):
-    async with semaphore:  # limit concurrency
-        os.makedirs("Metadata", exist_ok=True)
-
-        # Get prefix/suffix
-        prefix = await jishubotz.get_prefix(update.message.chat.id)
-        suffix = await jishubotz.get_suffix(update.message.chat.id)
 
-        new_name = update.message.text
+def build_caption(settings, new_filename, media, duration):
+    if settings.caption:
         try:
-            new_filename_ = new_name.split(":-")[1]
-            new_filename = add_prefix_suffix(new_filename_, prefix, suffix)
-        except Exception as e:
-            return await update.message.edit(f"Prefix/Suffix Error: {e}")
+            return settings.caption.format(
+                filename=new_filename,
+                filesize=humanbytes(media.file_size),
+                duration=convert(duration)
+            )
+        except:
+            pass
+    return f"**{new_filename}**"
 
-        # Paths
-        user_id = update.from_user.id
-        download_path = f"downloads/{user_id}/{new_filename}"
-        file_msg = update.message.reply_to_message
 
-        ms = await update.message.edit("⬇️ Downloading...")
-        try:
-            path = await bot.download_media(
-                message=file_msg,
-                file_name=download_path,
-                progress=progress_for_pyrogram,
-                progress_args=("⬇️ Downloading...", ms, time.time())
-            )
-        except Exception as e:
-            return await ms.edit(f"Download Error: {e}")
-
-        # Add metadata
-        metadata_enabled = await jishubotz.get_metadata(update.message.chat.id)
-        metadata_failed = False
-        if metadata_enabled:
-            metadata_code = await jishubotz.get_metadata_code(update.message.chat.id)
-            metadata_path = f"Metadata/{new_filename}"
-            result = await add_metadata(path, metadata_path, metadata_code, ms)
-            if result:
-                metadata_path = result
-            else:
-                metadata_failed = True
-                metadata_path = path  # fallback to original file
-        else:
-            metadata_path = path
+async def process_file(bot, update):
+    # popped, so a second tap on the buttons can't start the same job twice
+    pending = conversations.pop(update.message.chat.id, update.message.id)
+    if pending is None:
+        return await update.message.edit("**Request Timed Out.**\n\nSend The File Again To Rename It.")
+    pending.type_ = update.data.split("_")[1]
+    await rename_file(bot, update.message, update.from_user.id, pending.source, pending.new_name, pending.type_, media=pending.media)
+
+
+async def rename_file(bot, ms, user_id, file_msg, new_filename, type_, settings=None, media=None):
+    """
+    Rename one file and upload it as `type_`, reporting into the status
+    message `ms`. `media` defaults to the media of `file_msg`; a UrlFile
+    makes the job download a link instead. Returns the finished RenameJob
+    (or None if nothing ran).
+    """
+    # All user settings in one read
+    if settings is None:
+        settings = await jishubotz.get_user_settings(user_id)
+
+    try:
+        new_filename = add_prefix_suffix(new_filename, settings.prefix, settings.suffix)
+    except Exception as e:
+        return await ms.edit(f"Prefix/Suffix Error: {e}")
 
-        # Duration
-        duration = get_duration(metadata_path)
+    media = media or getattr(file_msg, file_msg.media.value)
 
-        # Caption
-        media = getattr(file_msg, file_msg.media.value)
-        user_caption = await jishubotz.get_caption(update.message.chat.id)
-        if user_caption:
+    # Same source file + same transformation already done before? Reuse its upload.
+    cache_key = None
+    if result_cache.enabled and media.file_unique_id:
+        cache_key = result_cache.make_key(
+            media.file_unique_id,
+            new_filename,
+            settings.metadata_code if settings.metadata else None,
+            type_,
+            settings.thumbnail
+        )
+        cached_file_id = await result_cache.acquire(cache_key)
+        retried = False
+        while cached_file_id:
+            caption = build_caption(settings, new_filename, media, getattr(media, "duration", 0) or 0)
             try:
-                caption = user_caption.format(
-                    filename=new_filename,
-                    filesize=humanbytes(media.file_size),
-                    duration=convert(duration)
-                )
-            except:
-                caption = f"**{new_filename}**"
-        else:
-            caption = f"**{new_filename}**"
+                await bot.send_cached_media(ms.chat.id, cached_file_id, caption=caption)
+                await ms.delete()
+                metrics.jobs.inc("cached")
+                return None
+            except Exception as e:
+                # Stored file_id no longer usable: forget it and look again,
+                # another job may just have stored a fresh one
+                print(f"Cached Result Error: {e}")
+                await result_cache.discard(cache_key)
+                cached_file_id = await result_cache.acquire(cache_key)
+                if cached_file_id and retried:
+                    cache_key = None  # the fresh one failed too: do the job without owning the key
+                    break
+                retried = True
+
+    async def on_position(position, depth):
+        await ms.edit(f"⏳ Waiting In Queue...\n\n**Position :** `{position}` / `{depth}`")
+
+    job = RenameJob(bot, ms, user_id, settings, new_filename, file_msg, media, type_)
+    try:
+        # fair per-user queue, small files take the express lane
+        async with scheduler.slot(job.user_id, job.size, on_position):
+            await rename_and_upload(job)
+    finally:
+        metrics.jobs.inc("completed" if job.sent_msg else "failed")
+        if cache_key:
+            file_id = None
+            sent_msg = job.sent_msg
+            if sent_msg and sent_msg.media and not job.metadata_failed:
+                file_id = getattr(sent_msg, sent_msg.media.value).file_id
+                await result_cache.put(cache_key, file_id, sent_msg.media.value)
+            result_cache.release(cache_key, file_id)
+    return job
+
+
+class RenameJob:
+    """State of one rename while it moves through the pipeline stages."""
+
+    def __init__(self, bot, ms, user_id, settings, new_filename, file_msg, media, type_):
+        self.bot = bot
+        self.chat_id = ms.chat.id
+        self.user_id = user_id
+        self.settings = settings
+        self.new_filename = new_filename
+        self.file_msg = file_msg
+        self.media = media
+        # a link without a Content-Length is planned as the biggest file allowed
+        self.size = media.file_size or downloader.max_size
+        self.type_ = type_
+        self.ms = ms
+        self.workspace = None        # scratch directory, removed when the job ends
+        self.path = None             # downloaded file
+        self.output_path = None      # file that gets uploaded
+        self.duration = 0
+        self.thumb = None
+        self.caption = None
+        self.metadata_failed = False
+        self.sent_msg = None
+
+
+async def rename_and_upload(job):
+    # room for the download plus a remuxed copy
+    need = job.size * (2 if job.settings.metadata else 1)
 
-        # Thumbnail
-        c_thumb = await jishubotz.get_thumbnail(update.message.chat.id)
-        if c_thumb:
-            ph_path = await bot.download_media(c_thumb)
-            width, height, ph_path = await fix_thumb(ph_path)
+    async def on_wait():
+        await job.ms.edit("💾 Waiting For Free Disk Space...")
+
+    try:
+        async with workspace.job(need, on_wait) as job.workspace:
+            await run_stages(job)
+    except DiskQuotaError as e:
+        await job.ms.edit(f"❌ {e}")
+
+
+async def run_stages(job):
+    try:
+        await pipeline.download.run(download_stage, job, size=job.media.file_size)
+    except Exception as e:
+        progress_service.stop(job.ms)
+        return await job.ms.edit(f"Download Error: {e}")
+
+    try:
+        await pipeline.process.run(process_stage, job, size=job.media.file_size)
+    except Exception as e:
+        progress_service.stop(job.ms)
+        return await job.ms.edit(f"Processing Error: {e}")
+
+    try:
+        await pipeline.upload.run(upload_stage, job, size=os.path.getsize(job.output_path))
+    except Exception as e:
+        progress_service.stop(job.ms)
+        return await job.ms.edit(f"Upload Error: {e}")
+
+    await job.ms.delete()
+
+
+async def download_stage(job):
+    job.ms = await job.ms.edit("⬇️ Downloading...")
+
+    if isinstance(job.media, UrlFile):
+        job.path = await downloader.download(
+            job.media,
+            job.workspace.file("in", job.new_filename),
+            progress=progress_for_pyrogram,
+            progress_args=("⬇️ Downloading...", job.ms, time.time())
+        )
+        return
+
+    # Remux while downloading: chunks go straight into ffmpeg, no untagged copy on disk.
+    # MKV/MP4 skip this when they can be tagged in place after a plain download.
+    inplace = Config.INPLACE_TAGS and can_tag_in_place(job.media.file_name)
+    if job.settings.metadata and Config.STREAM_REMUX and not inplace and can_stream_remux(job.media.file_name):
+        job.output_path = await stream_add_metadata(
+            job.bot, job.file_msg,
+            job.workspace.file("out", job.new_filename),
+            job.settings.metadata_code,
+            file_size=job.media.file_size,
+            progress=progress_for_pyrogram,
+            progress_args=("⬇️ Downloading + Adding Metadata...", job.ms, time.time())
+        )
+        if job.output_path:
+            return
+
+    download_path = job.workspace.file("in", job.new_filename)
+    job.path = await transfer.download(
+        job.bot,
+        job.file_msg,
+        download_path,
+        progress=progress_for_pyrogram,
+        progress_args=("⬇️ Downloading...", job.ms, time.time())
+    )
+
+
+async def process_stage(job):
+    settings = job.settings
+    known = MediaInfo.from_media(job.media)
+    info = None
+    mime_type = getattr(job.media, "mime_type", None) or ""
+    auto_thumb = not settings.thumbnail and (job.type_ == "video" or mime_type.startswith("video/"))
+
+    # Add metadata (unless it was already done while streaming the download)
+    if job.output_path:
+        pass
+    elif settings.metadata and Config.INPLACE_TAGS and can_tag_in_place(job.path) and await write_tags_in_place(job.path, settings.metadata_code):
+        job.output_path = job.path  # only the header was rewritten, no remux
+    elif settings.metadata:
+        # One ffmpeg run for the tagged copy, the thumbnail and the duration
+        await job.ms.edit("<i>I Found Metadata, Adding Into Your File ⚡</i>")
+        metadata_path = job.workspace.file("out", job.new_filename)
+        thumb_path = job.workspace.file("thumb.jpg") if auto_thumb else None
+        result, job.thumb, info = await process_media(job.path, metadata_path, settings.metadata_code, thumb_path, known.duration)
+        if result:
+            await job.ms.edit("<i>Metadata Has Been Successfully Added ✅</i>")
+        elif thumb_path:
+            # the thumbnail output can sink the whole run (e.g. no video stream)
+            result = await add_metadata(job.path, metadata_path, settings.metadata_code, job.ms)
         else:
-            try:
-                ph_path_ = await take_screen_shot(
-                    metadata_path,
-                    os.path.dirname(metadata_path),
-                    random.randint(0, max(duration - 1, 0))
-                )
-                width, height, ph_path = await fix_thumb(ph_path_)
-            except:
-                ph_path = None
-
-        # Upload to user
-        await ms.edit("⬆️ Uploading...")
-        type_ = update.data.split("_")[1]
-        sent_msg = None
-        try:
-            if type_ == "document":
-                sent_msg = await bot.send_document(update.message.chat.id, document=metadata_path, thumb=ph_path, caption=caption)
-            elif type_ == "video":
-                sent_msg = await bot.send_video(update.message.chat.id, video=metadata_path, thumb=ph_path, caption=caption, duration=duration)
-            elif type_ == "audio":
-                sent_msg = await bot.send_audio(update.message.chat.id, audio=metadata_path, thumb=ph_path, caption=caption, duration=duration)
-        except Exception as e:
-            return await ms.edit(f"Upload Error: {e}")
-
-        # ⚠️ Warning if metadata failed
-        if metadata_failed and sent_msg:
-            await sent_msg.reply_text("⚠️ Metadata could not be added. Uploaded original file instead.")
-
-        # Forward to log channel
+            await job.ms.edit("<i>Failed To Add Metadata ❌</i>")
+        if result:
+            job.output_path = result
+        else:
+            job.metadata_failed = True
+            job.output_path = job.path  # fallback to original file
+    else:
+        job.output_path = job.path
+
+    # Duration: Telegram's own value, else the combined run's, else one ffprobe run
+    if known.duration:
+        job.duration = known.duration
+    elif info is not None and info.duration:
+        job.duration = info.duration
+    else:
+        job.duration = (await media_probe.media_info(job.media, job.output_path)).duration
+
+    # Caption
+    job.caption = build_caption(settings, job.new_filename, job.media, job.duration)
+
+    # Thumbnail
+    c_thumb = settings.thumbnail
+    if c_thumb:
+        job.thumb = await thumb_cache.get(job.bot, c_thumb)
+    elif not job.thumb:
         try:
-            if media.thumbs or c_thumb:
-                thumb_for_log = ph_path
-            else:
-                thumb_for_log = None
+            job.thumb = await smart_thumbnail(
+                job.output_path,
+                job.workspace.path,
+                job.duration
+            )
+        except:
+            job.thumb = None
 
-            if file_msg.media == MessageMediaType.VIDEO:
-                await bot.send_video(LOG_CHANNEL, video=metadata_path, caption=f"**{new_filename}**", thumb=thumb_for_log, duration=duration)
-            elif file_msg.media == MessageMediaType.AUDIO:
-                await bot.send_audio(LOG_CHANNEL, audio=metadata_path, caption=f"**{new_filename}**", thumb=thumb_for_log, duration=duration)
-            else:
-                await bot.send_document(LOG_CHANNEL, document=metadata_path, caption=f"**{new_filename}**")
-        except Exception as e:
-            print(f"Log Forward Error: {e}")
 
-        # Cleanup
-        if ph_path and os.path.exists(ph_path):
-            os.remove(ph_path)
-        if path and os.path.exists(path):
-            os.remove(path)
+async def upload_stage(job):
+    bot = job.bot
+    await job.ms.edit("⬆️ Uploading...")
+    upload_progress = dict(progress=progress_for_pyrogram, progress_args=("⬆️ Uploading...", job.ms, time.time()))
+    if job.type_ == "document":
+        job.sent_msg = await bot.send_document(job.chat_id, document=job.output_path, thumb=job.thumb, caption=job.caption, **upload_progress)
+    elif job.type_ == "video":
+        job.sent_msg = await bot.send_video(job.chat_id, video=job.output_path, thumb=job.thumb, caption=job.caption, duration=job.duration, **upload_progress)
+    elif job.type_ == "audio":
+        job.sent_msg = await bot.send_audio(job.chat_id, audio=job.output_path, thumb=job.thumb, caption=job.caption, duration=job.duration, **upload_progress)
+    progress_service.stop(job.ms)
+
+    # ⚠️ Warning if metadata failed
+    if job.metadata_failed and job.sent_msg:
+        await job.sent_msg.reply_text("⚠️ Metadata could not be added. Uploaded original file instead.")
 
-        await ms.delete()
+    # Mirror to log channel by file_id, in the background
+    log_mirror.submit(job.sent_msg, caption=f"**{job.new_filename}**")
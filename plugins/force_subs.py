@@ -1,8 +1,8 @@
 from pyrogram import Client, filters, enums 
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from pyrogram.errors import UserNotParticipant
 from config import Config
 from helper.database import jishubotz
+from helper.membership import membership, NOT_MEMBER
 
 
 
@@ -10,30 +10,31 @@ async def not_subscribed(_, client, message):
     await jishubotz.add_user(client, message)
     if not Config.FORCE_SUBS:
         return False
-    try:             
-        user = await client.get_chat_member(Config.FORCE_SUBS, message.from_user.id) 
-        if user.status == enums.ChatMemberStatus.BANNED:
-            return True 
-        else:
-            return False                
-    except UserNotParticipant:
-        pass
-    return True
+    status = await membership.get_status(client, message.from_user.id)
+    return status in (NOT_MEMBER, enums.ChatMemberStatus.LEFT, enums.ChatMemberStatus.BANNED)
 
 
 @Client.on_message(filters.private & filters.create(not_subscribed))
 async def forces_sub(client, message):
     buttons = [[InlineKeyboardButton(text="📢 Join Update Channel 📢", url=f"https://t.me/{Config.FORCE_SUBS}") ]]
     text = f"""<b>Hello {message.from_user.mention} \n\nYou Need To Join In My Channel To Use Me\n\nKindly Please Join Channel</b>"""
-    try:
-        user = await client.get_chat_member(Config.FORCE_SUBS, message.from_user.id)    
-        if user.status == enums.ChatMemberStatus.BANNED:                                   
-            return await client.send_message(message.from_user.id, text="Sorry You Are Banned To Use Me")  
-    except UserNotParticipant:                       
-        return await message.reply_text(text=text,quote=True, reply_markup=InlineKeyboardMarkup(buttons))
+    status = await membership.get_status(client, message.from_user.id)
+    if status == enums.ChatMemberStatus.BANNED:
+        return await client.send_message(message.from_user.id, text="Sorry You Are Banned To Use Me")  
     return await message.reply_text(text=text,quote=True, reply_markup=InlineKeyboardMarkup(buttons))
 
 
+@Client.on_chat_member_updated(filters.chat(Config.FORCE_SUBS))
+async def force_sub_member_updated(client, update):
+    # Join / leave / ban in the force-sub channel: refresh the cached status right away
+    member = update.new_chat_member or update.old_chat_member
+    if not member or not member.user:
+        return
+    if update.new_chat_member:
+        membership.set(member.user.id, update.new_chat_member.status)
+    else:
+        membership.set(member.user.id, NOT_MEMBER)
+
 
 
 
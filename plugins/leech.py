@@ -0,0 +1,22 @@
+from pyrogram import Client, filters
+from helper.leech import downloader
+from plugins.file_rename import ask_new_name
+import re
+
+
+@Client.on_message(filters.private & filters.command("leech"))
+async def leech(client, message):
+    if len(message.command) < 2 or not re.match(r"^https?://\S+$", message.command[1]):
+        return await message.reply_text("**Give A Direct Download Link**\n\nExample :- `/leech https://example.com/video.mkv`", quote=True)
+
+    ms = await message.reply_text("🔍 Checking The Link...", quote=True)
+    try:
+        file = await downloader.probe(message.command[1])
+    except Exception as e:
+        return await ms.edit(f"❌ Link Error: {e}")
+    if file.file_size > 2000 * 1024 * 1024:
+        return await ms.edit("❌ This bot doesn’t support files bigger than 2GB")
+    await ms.delete()
+
+    # from here on it is a normal rename: new name, output type, the same pipeline
+    await ask_new_name(message, file.file_name, media=file)
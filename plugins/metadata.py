@@ -16,8 +16,9 @@ OFF = [[InlineKeyboardButton('Metadata Off ❌', callback_data='metadata_0')], [
 async def handle_metadata(bot: Client, message: Message):
 
     ms = await message.reply_text("**Please Wait...**", reply_to_message_id=message.id)
-    bool_metadata = await jishubotz.get_metadata(message.from_user.id)
-    user_metadata = await jishubotz.get_metadata_code(message.from_user.id)
+    settings = await jishubotz.get_user_settings(message.from_user.id)
+    bool_metadata = settings.metadata
+    user_metadata = settings.metadata_code
     await ms.delete()
     if bool_metadata:
         return await message.reply_text(f"**Your Current Metadata :-**\n\n➜ `{user_metadata}` ",quote=True, reply_markup=InlineKeyboardMarkup(ON))
@@ -31,7 +32,7 @@ async def query_metadata(bot: Client, query: CallbackQuery):
 
     if data.startswith('metadata_'):
         _bool = data.split('_')[1]
-        user_metadata = await jishubotz.get_metadata_code(query.from_user.id)
+        user_metadata = (await jishubotz.get_user_settings(query.from_user.id)).metadata_code
 
         if bool(eval(_bool)):
             await jishubotz.set_metadata(query.from_user.id, bool_meta=False)
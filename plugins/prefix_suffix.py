@@ -17,7 +17,7 @@ async def add_caption(client, message):
 async def delete_prefix(client, message):
 
     JishuDeveloper = await message.reply_text("Please Wait ...", quote=True)
-    prefix = await jishubotz.get_prefix(message.from_user.id)
+    prefix = (await jishubotz.get_user_settings(message.from_user.id)).prefix
     if not prefix:
         return await JishuDeveloper.edit("**You Don't Have Any Prefix ❌**")
     await jishubotz.set_prefix(message.from_user.id, None)
@@ -28,7 +28,7 @@ async def delete_prefix(client, message):
 async def see_caption(client, message):
 
     JishuDeveloper = await message.reply_text("Please Wait ...", quote=True)
-    prefix = await jishubotz.get_prefix(message.from_user.id)
+    prefix = (await jishubotz.get_user_settings(message.from_user.id)).prefix
     if prefix:
         await JishuDeveloper.edit(f"**Your Prefix :-**\n\n`{prefix}`")
     else:
@@ -51,7 +51,7 @@ async def add_csuffix(client, message):
 async def delete_suffix(client, message):
 
     JishuDeveloper = await message.reply_text("Please Wait ...", quote=True)
-    suffix = await jishubotz.get_suffix(message.from_user.id)
+    suffix = (await jishubotz.get_user_settings(message.from_user.id)).suffix
     if not suffix:
         return await JishuDeveloper.edit("**You Don't Have Any Suffix ❌**")
     await jishubotz.set_suffix(message.from_user.id, None)
@@ -62,7 +62,7 @@ async def delete_suffix(client, message):
 async def see_csuffix(client, message):
 
     JishuDeveloper = await message.reply_text("Please Wait ...", quote=True)
-    suffix = await jishubotz.get_suffix(message.from_user.id)
+    suffix = (await jishubotz.get_user_settings(message.from_user.id)).suffix
     if suffix:
         await JishuDeveloper.edit(f"**Your Suffix :-**\n\n`{suffix}`")
     else:
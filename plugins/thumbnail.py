@@ -1,10 +1,11 @@
 from pyrogram import Client, filters 
 from helper.database import jishubotz
+from helper.thumbs import thumb_cache
 
 
 @Client.on_message(filters.private & filters.command(['view_thumb', 'viewthumb']))
 async def viewthumb(client, message):    
-    thumb = await jishubotz.get_thumbnail(message.from_user.id)
+    thumb = (await jishubotz.get_user_settings(message.from_user.id)).thumbnail
     if thumb:
        await client.send_photo(chat_id=message.chat.id, photo=thumb)
     else:
@@ -12,13 +13,22 @@ async def viewthumb(client, message):
 		
 @Client.on_message(filters.private & filters.command(['del_thumb', 'delthumb']))
 async def removethumb(client, message):
+    thumb_cache.discard((await jishubotz.get_user_settings(message.from_user.id)).thumbnail)
     await jishubotz.set_thumbnail(message.from_user.id, file_id=None)
     await message.reply_text("**Thumbnail Deleted Successfully 🗑️**", quote=True)
 	
 @Client.on_message(filters.private & filters.photo)
 async def addthumbs(client, message):
     mkn = await message.reply_text("Please Wait ...", quote=True)
+    old_thumb = (await jishubotz.get_user_settings(message.from_user.id)).thumbnail
     await jishubotz.set_thumbnail(message.from_user.id, file_id=message.photo.file_id)                
+    # prepare the upload-ready thumbnail now so rename jobs never have to
+    try:
+        await thumb_cache.build(client, message.photo.file_id)
+        if old_thumb != message.photo.file_id:
+            thumb_cache.discard(old_thumb)
+    except Exception as e:
+        print(f"Thumbnail Cache Error: {e}")
     await mkn.edit("**Thumbnail Saved Successfully ✅️**")
 
 
@@ -1,4 +1,13 @@
+import asyncio
 from aiohttp import web
+from config import Config
+from helper.metrics import metrics, series, directory_size
+from helper.scheduler import scheduler
+from helper.pipeline import pipeline
+from helper.ratelimit import limiter
+from helper.workspace import workspace
+from helper.transfer import transfer
+from helper.leech import downloader
 
 routes = web.RouteTableDef()
 
@@ -7,9 +16,46 @@ async def root_route_handler(request):
     return web.json_response("JishuBotz")
 
 
+@routes.get("/metrics")
+async def metrics_route_handler(request):
+    # gauges are read from the modules that already track them, only when scraped
+    loop = asyncio.get_running_loop()
+    jobs = scheduler.stats()
+    stages = pipeline.stats()
+    disk = {
+        Config.WORKSPACE_DIR: await loop.run_in_executor(None, workspace.usage),
+        Config.LEECH_DIR: await loop.run_in_executor(None, directory_size, Config.LEECH_DIR),
+    }
+    lines = metrics.render()
+    lines += series("renamer_jobs", "Rename jobs by state.", "gauge", {
+        "queued": jobs["queued"],
+        "running": jobs["running"],
+        "waiting_for_disk": workspace.waiting,
+    }, "state")
+    lines += series("renamer_stage_active", "Jobs being worked on per pipeline stage.", "gauge", {name: stage["active"] for name, stage in stages.items()}, "stage")
+    lines += series("renamer_stage_queued", "Jobs queued per pipeline stage.", "gauge", {name: stage["queued"] for name, stage in stages.items()}, "stage")
+    lines += series("renamer_stage_failed_total", "Failed jobs per pipeline stage.", "counter", {name: stage["failed"] for name, stage in stages.items()}, "stage")
+    lines += series("renamer_telegram_calls_total", "Telegram API calls by method.", "counter", dict(limiter.calls), "method")
+    lines += series("renamer_telegram_flood_waits_total", "FloodWait errors by method.", "counter", dict(limiter.flood_waits), "method")
+    lines += series("renamer_telegram_flood_wait_seconds_total", "Seconds Telegram asked to wait, by method.", "counter", dict(limiter.flood_seconds), "method")
+    lines += series("renamer_transfer_bytes_total", "Bytes moved by parallel transfers and link downloads.", "counter", {
+        "telegram_download": transfer.bytes_down,
+        "telegram_upload": transfer.bytes_up,
+        "link_download": downloader.bytes_down,
+    }, "direction")
+    lines += series("renamer_scratch_disk_bytes", "Disk used by scratch directories.", "gauge", disk, "directory")
+    lines += series("renamer_scratch_disk_reserved_bytes", "Disk reserved by running jobs.", "gauge", {"": workspace.reserved})
+    return web.Response(text="\n".join(lines) + "\n", headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+async def start_metrics(app):
+    metrics.start_lag_monitor()
+
+
 async def web_server():
     web_app = web.Application(client_max_size=30000000)
     web_app.add_routes(routes)
+    web_app.on_startup.append(start_metrics)
     return web_app
 
 
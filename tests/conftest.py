@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# config.py reads the environment at import time; use an embedded store
+os.environ.setdefault("DATABASE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bot.db"))
+os.environ.setdefault("LOG_CHANNEL", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,34 @@
+import types
+from pyrogram.enums import MessageMediaType
+from helper.batch import name_variables
+from plugins.batch_rename import output_type
+
+
+def test_quality_is_a_whole_word():
+    assert name_variables("Mahdi Show S01E02.mkv", 1)["quality"] == ""
+    assert name_variables("Show_HD_E02.mkv", 1)["quality"] == "HD"
+    assert name_variables("Show.S01E02.1080p.WEB.mkv", 1)["quality"] == "1080p"
+
+
+def test_years_are_not_episodes():
+    assert name_variables("Movie [2019].mkv", 7)["episode"] == 7
+    assert name_variables("Movie - 2019.mkv", 7)["episode"] == 7
+    assert name_variables("Show [2019] - 05.mkv", 7)["episode"] == 5
+    assert name_variables("Show [12].mkv", 7)["episode"] == 12
+    assert name_variables("Show - 1100.mkv", 7)["episode"] == 1100
+    assert name_variables("Show S02E03 (2019).mkv", 7)["season"] == 2
+
+
+def message(media, mime_type=None):
+    document = types.SimpleNamespace(mime_type=mime_type)
+    return types.SimpleNamespace(media=media, document=document)
+
+
+def test_media_choice_keeps_plain_documents():
+    assert output_type(message(MessageMediaType.VIDEO), "media") == "video"
+    assert output_type(message(MessageMediaType.AUDIO), "media") == "audio"
+    assert output_type(message(MessageMediaType.DOCUMENT, "video/x-matroska"), "media") == "video"
+    assert output_type(message(MessageMediaType.DOCUMENT, "audio/flac"), "media") == "audio"
+    assert output_type(message(MessageMediaType.DOCUMENT, "application/pdf"), "media") == "document"
+    assert output_type(message(MessageMediaType.DOCUMENT), "media") == "document"
+    assert output_type(message(MessageMediaType.VIDEO), "document") == "document"
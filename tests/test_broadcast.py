@@ -0,0 +1,51 @@
+import asyncio
+import types
+from helper.broadcast import BroadcastEngine
+from helper.storage import create_backend
+
+
+class Users:
+    def __init__(self, backend, ids):
+        self.backend = backend
+        self.ids = ids
+
+    async def total_users_count(self):
+        await asyncio.sleep(0.01)
+        return len(self.ids)
+
+    async def iter_user_ids(self, after=None, batch_size=100):
+        for user_id in self.ids:
+            yield user_id
+
+    async def delete_users(self, ids):
+        pass
+
+
+class Bot:
+    def __init__(self):
+        self.copied = []
+
+    async def copy_message(self, chat_id, from_chat, message_id):
+        self.copied.append(chat_id)
+
+    async def edit_message_text(self, chat_id, message_id, text):
+        pass
+
+
+def message(chat_id, message_id):
+    return types.SimpleNamespace(chat=types.SimpleNamespace(id=chat_id), id=message_id)
+
+
+def test_only_one_of_two_concurrent_starts_wins(tmp_path):
+    async def main():
+        backend = create_backend("sqlite", path=str(tmp_path / "b.db"))
+        engine = BroadcastEngine(Users(backend, [1, 2, 3]))
+        bot = Bot()
+        started = await asyncio.gather(*(engine.start(bot, message(9, i), message(9, 100 + i)) for i in range(2)))
+        assert sorted(started) == [False, True]
+        await engine._task
+        assert sorted(bot.copied) == [1, 2, 3]
+        assert engine.state["total"] == 3
+        assert (await backend.find_one("config", "broadcast"))["running"] is False
+        await backend.close()
+    asyncio.run(main())
@@ -0,0 +1,36 @@
+import types
+from helper import cache
+from helper.conversation import ConversationStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def source():
+    media = types.SimpleNamespace(file_name="a.mkv")
+    return types.SimpleNamespace(media=types.SimpleNamespace(value="document"), document=media)
+
+
+def test_expired_conversations_are_gone(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    store = ConversationStore(ttl=60)
+
+    store.open(1, 10, source())
+    store.open(1, 20, source())
+    clock.now += 30
+    assert store.move(1, 10, 11) is not None    # still alive, re-keyed with a fresh ttl
+    clock.now += 45
+    assert store.pop(1, 20) is None             # expired: not handed out by pop
+    assert store.move(1, 10, 12) is None        # the old key is gone after a move
+    assert store.get(1, 11) is not None
+
+    clock.now += 61
+    assert store.move(1, 11, 13) is None        # expired: not revived under a new key
+    assert store.get(1, 13) is None
+    assert len(store) == 0
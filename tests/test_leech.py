@@ -0,0 +1,177 @@
+import asyncio
+import os
+import pytest
+from aiohttp import web
+from helper.leech import HttpDownloader, PublicResolver
+
+DATA = os.urandom(1024 * 1024 + 4321)
+CHUNK = 64 * 1024
+
+
+class FileServer:
+    """Serves DATA with Range support on /file, streams without a length on /endless."""
+
+    def __init__(self):
+        self.ranges = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.delay = 0.005
+
+    async def file(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            start, _, end = request.headers.get("Range", "bytes=0-").partition("=")[2].partition("-")
+            start, end = int(start), int(end or len(DATA) - 1)
+            self.ranges.append(start)
+            return web.Response(
+                status=206, body=DATA[start:end + 1], content_type="video/mp4",
+                headers={"Content-Range": f"bytes {start}-{end}/{len(DATA)}"}
+            )
+        finally:
+            self.in_flight -= 1
+
+    async def endless(self, request):
+        resp = web.StreamResponse()
+        resp.enable_chunked_encoding()
+        await resp.prepare(request)
+        try:
+            for _ in range(1000):
+                await resp.write(b"x" * 16384)
+        except ConnectionError:
+            pass
+        return resp
+
+    async def redirect(self, request):
+        raise web.HTTPFound("http://169.254.169.254/latest/meta-data/")
+
+
+async def serve(server):
+    app = web.Application()
+    app.router.add_get("/file", server.file)
+    app.router.add_get("/endless", server.endless)
+    app.router.add_get("/redirect", server.redirect)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def downloader(tmp_path, **kwargs):
+    kwargs.setdefault("allow_private", True)
+    loader = HttpDownloader(str(tmp_path / "partial"), connections=4, **kwargs)
+    loader.CHUNK = CHUNK
+    return loader
+
+
+def test_parallel_range_download(tmp_path):
+    async def main():
+        server = FileServer()
+        runner, base = await serve(server)
+        loader = downloader(tmp_path)
+        try:
+            file = await loader.probe(f"{base}/file")
+            assert file.ranges and file.file_size == len(DATA)
+            path = await loader.download(file, str(tmp_path / "out.mp4"))
+            with open(path, "rb") as f:
+                assert f.read() == DATA
+            assert server.max_in_flight > 1
+            assert not os.listdir(loader.root)  # partial file and sidecar are gone
+        finally:
+            await loader.close()
+            await runner.cleanup()
+    asyncio.run(main())
+
+
+def test_interrupted_download_resumes(tmp_path):
+    async def main():
+        server = FileServer()
+        server.delay = 0.02
+        runner, base = await serve(server)
+        loader = downloader(tmp_path)
+        chunks = -(-len(DATA) // CHUNK)
+        try:
+            file = await loader.probe(f"{base}/file")
+            server.ranges.clear()
+            task = asyncio.create_task(loader.download(file, str(tmp_path / "out.mp4")))
+            while len(server.ranges) < chunks // 2:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+            server.ranges.clear()
+            path = await loader.download(file, str(tmp_path / "out.mp4"))
+            with open(path, "rb") as f:
+                assert f.read() == DATA
+            assert 0 < len(server.ranges) < chunks
+        finally:
+            await loader.close()
+            await runner.cleanup()
+    asyncio.run(main())
+
+
+def test_stream_without_length_is_capped(tmp_path):
+    async def main():
+        runner, base = await serve(FileServer())
+        loader = downloader(tmp_path, max_size=256 * 1024)
+        try:
+            file = await loader.probe(f"{base}/endless")
+            assert file.file_size == 0 and not file.ranges
+            with pytest.raises(Exception, match="bigger than 2GB"):
+                await loader.download(file, str(tmp_path / "out.bin"))
+            assert os.path.getsize(tmp_path / "out.bin") <= 256 * 1024
+        finally:
+            await loader.close()
+            await runner.cleanup()
+    asyncio.run(main())
+
+
+def test_private_addresses_are_refused(tmp_path):
+    async def main():
+        server = FileServer()
+        runner, base = await serve(server)
+        loader = downloader(tmp_path, allow_private=False)
+        try:
+            for url in (f"{base}/file", "http://169.254.169.254/", "http://[::1]:8080/metrics", "http://10.0.0.1/a"):
+                with pytest.raises(Exception, match="private or local"):
+                    await loader.probe(url)
+            assert server.ranges == []
+
+            # a redirect hop is checked before it is requested
+            loader.allow_private = True
+            check_url = loader._check_url
+
+            def only_first_hop(url):
+                loader.allow_private = url.path == "/redirect"
+                check_url(url)
+            loader._check_url = only_first_hop
+            with pytest.raises(Exception, match="private or local"):
+                await loader.probe(f"{base}/redirect")
+        finally:
+            await loader.close()
+            await runner.cleanup()
+    asyncio.run(main())
+
+
+def test_resolver_refuses_private_answers():
+    class Answers:
+        def __init__(self, *addresses):
+            self.addresses = addresses
+
+        async def resolve(self, host, port=0, family=0):
+            return [{"hostname": host, "host": a, "port": port, "family": 0, "proto": 0, "flags": 0} for a in self.addresses]
+
+        async def close(self):
+            pass
+
+    async def main():
+        assert await PublicResolver(Answers("93.184.216.34")).resolve("example.com", 80)
+        for address in ("127.0.0.1", "169.254.169.254", "192.168.1.5", "::1", "::ffff:10.0.0.1", "fe80::1"):
+            with pytest.raises(Exception, match="private or local"):
+                await PublicResolver(Answers("93.184.216.34", address)).resolve("evil.example", 80)
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+import asyncio
+import types
+from helper.log_mirror import LogMirror
+
+
+class Sent:
+    def __init__(self, log):
+        self.log = log
+        self.reply_failures = 1
+
+    async def reply_text(self, text, quote=False):
+        if self.reply_failures:
+            self.reply_failures -= 1
+            raise ConnectionError("reply failed")
+        self.log.append(("reply", text))
+
+
+def test_failed_reply_does_not_copy_the_file_again(monkeypatch):
+    async def main():
+        monkeypatch.setattr(asyncio, "sleep", fast_sleep)
+        log = []
+
+        async def copy(chat_id, caption=None):
+            log.append(("copy", chat_id))
+            return Sent(log)
+
+        message = types.SimpleNamespace(media=types.SimpleNamespace(value="document"), copy=copy)
+        mirror = LogMirror(backend=None, chat_id=-100)
+        mirror.submit(message, caption="x", user=types.SimpleNamespace(mention="@user"))
+        while mirror.sent == 0 or len(log) < 2:
+            await real_sleep(0)
+        assert log == [("copy", -100), ("reply", "This file was renamed by @user")]
+        assert mirror.failed == 0
+    asyncio.run(main())
+
+
+real_sleep = asyncio.sleep
+
+
+async def fast_sleep(seconds):
+    await real_sleep(0)
@@ -0,0 +1,101 @@
+import asyncio
+import re
+import pytest
+import route
+from helper.metrics import Counter, Histogram, Metrics, metrics, series
+
+
+def test_counter_lines():
+    plain = Counter("jobs_total", "Jobs.")
+    plain.inc()
+    plain.inc(amount=2)
+    assert plain.render() == ["# HELP jobs_total Jobs.", "# TYPE jobs_total counter", "jobs_total 3"]
+
+    labeled = Counter("calls_total", "Calls.", "method")
+    labeled.inc("Send")
+    labeled.inc('a"b\\c\nd')
+    assert labeled.render() == [
+        "# HELP calls_total Calls.",
+        "# TYPE calls_total counter",
+        'calls_total{method="Send"} 1',
+        'calls_total{method="a\\"b\\\\c\\nd"} 1',
+    ]
+
+
+def test_histogram_lines():
+    plain = Histogram("lag_seconds", "Lag.", (0.5, 1))
+    for value in (0.1, 0.5, 0.7, 3):
+        plain.observe(value)
+    assert plain.render() == [
+        "# HELP lag_seconds Lag.",
+        "# TYPE lag_seconds histogram",
+        'lag_seconds_bucket{le="0.5"} 2',      # le is inclusive and buckets are cumulative
+        'lag_seconds_bucket{le="1"} 3',
+        'lag_seconds_bucket{le="+Inf"} 4',
+        "lag_seconds_sum 4.3",
+        "lag_seconds_count 4",
+    ]
+
+    labeled = Histogram("stage_seconds", "Stage time.", (1,), "stage")
+    labeled.observe(2, "upload")
+    assert labeled.render()[2:] == [
+        'stage_seconds_bucket{stage="upload",le="1"} 0',
+        'stage_seconds_bucket{stage="upload",le="+Inf"} 1',
+        'stage_seconds_sum{stage="upload"} 2.0',
+        'stage_seconds_count{stage="upload"} 1',
+    ]
+
+
+def test_series_lines():
+    assert series("free_bytes", "Free.", "gauge", {"": 5}) == ["# HELP free_bytes Free.", "# TYPE free_bytes gauge", "free_bytes 5"]
+    assert series("jobs", "Jobs.", "gauge", {"queued": 1}, "state")[2:] == ['jobs{state="queued"} 1']
+
+
+def test_timed_records_success_and_failure():
+    recorder = Metrics()
+
+    class Database:
+        @recorder.timed
+        async def get_user(self, user_id):
+            return user_id
+
+        @recorder.timed
+        async def broken(self):
+            raise ConnectionError("down")
+
+    async def main():
+        db = Database()
+        assert await db.get_user(7) == 7
+        with pytest.raises(ConnectionError):
+            await db.broken()
+    asyncio.run(main())
+    counts = {line.split("{")[1].split('"')[1]: line.rsplit(" ", 1)[1]
+              for line in recorder.db_latency.render() if line.startswith("renamer_db_call_duration_seconds_count")}
+    assert counts == {"get_user": "1", "broken": "1"}
+    assert Database.get_user.__name__ == "get_user"
+
+
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*"(,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*")*\})? -?[0-9.e+-]+(Inf)?$')
+
+
+def test_metrics_page_is_valid_text_format():
+    metrics.jobs.inc("completed")
+    metrics.stage_duration.observe(3, "download")
+
+    async def main():
+        return await route.metrics_route_handler(None)
+    response = asyncio.run(main())
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert response.text.endswith("\n")
+    typed = set()
+    for line in lines:
+        if line.startswith("# TYPE "):
+            name = line.split()[2]
+            assert name not in typed   # one TYPE per metric family
+            typed.add(name)
+        elif not line.startswith("# HELP "):
+            assert SAMPLE.match(line), line
+    # the shared singleton: other tests may have recorded into it too
+    assert any(line.startswith('renamer_jobs_total{result="completed"} ') for line in lines)
+    assert any(line.startswith('renamer_stage_duration_seconds_bucket{stage="download",le="+Inf"} ') for line in lines)
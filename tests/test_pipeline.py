@@ -0,0 +1,27 @@
+import asyncio
+import pytest
+from helper.pipeline import Stage
+
+
+def test_stage_survives_jobs_that_die_of_base_exceptions():
+    async def main():
+        stage = Stage("test", workers=1, queue_size=5)
+
+        async def cancelled():
+            raise asyncio.CancelledError()
+
+        async def broken():
+            raise ValueError("boom")
+
+        async def ok(value):
+            return value
+
+        with pytest.raises(Exception, match="cancelled"):
+            await asyncio.wait_for(stage.run(cancelled), 1)
+        with pytest.raises(ValueError):
+            await asyncio.wait_for(stage.run(broken), 1)
+        # the single worker is still alive
+        assert await asyncio.wait_for(stage.run(ok, 42), 1) == 42
+        stats = stage.stats()
+        assert stats["failed"] == 2 and stats["completed"] == 1 and stats["active"] == 0
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+import asyncio
+import time
+import types
+from pyrogram.errors import FloodWait, MessageNotModified, MessageIdInvalid
+from helper.progress import ProgressService
+
+
+class Message:
+    def __init__(self, chat_id, message_id=1, error=None):
+        self.chat = types.SimpleNamespace(id=chat_id)
+        self.id = message_id
+        self.error = error
+        self.edits = 0
+
+    async def edit(self, text=None, reply_markup=None):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        self.edits += 1
+
+
+async def transfer(service, messages, seconds, total=100):
+    """Report growing progress for every message, like download/upload callbacks do."""
+    started = time.time()
+    current = 0
+    while time.time() - started < seconds:
+        current += 1
+        for message in messages:
+            service.update(current, total, "Downloading", message, started)
+        await asyncio.sleep(0.005)
+
+
+def test_flood_wait_pauses_only_that_chat():
+    async def main():
+        service = ProgressService(interval=0.02)
+        flooded = Message(1, error=FloodWait(value=30))
+        other = Message(2)
+        await transfer(service, [flooded, other], 0.2, total=10 ** 6)
+
+        assert service.flood_waits == 1
+        assert 29 < service.chat_pause[1] - time.time() <= 30
+        assert flooded.edits == 0
+        assert other.edits >= 3
+
+        # the pause is over: the chat gets edits again
+        service.chat_pause[1] = time.time() - 1
+        await transfer(service, [flooded, other], 0.1, total=10 ** 6)
+        assert flooded.edits >= 1
+        service.stop(flooded)
+        service.stop(other)
+    asyncio.run(main())
+
+
+def test_bad_request_drops_the_tracker_but_not_modified_does_not():
+    async def main():
+        service = ProgressService(interval=0.02)
+        gone = Message(1, error=MessageIdInvalid())
+        same = Message(2, error=MessageNotModified())
+        current = 0
+        while gone.error is not None or same.error is not None:   # until both edits failed once
+            current += 1
+            for message in (gone, same):
+                service.update(current, 10 ** 6, "Downloading", message, time.time())
+            await asyncio.sleep(0.005)
+        assert (1, 1) not in service.trackers and gone.edits == 0
+        assert (2, 1) in service.trackers
+        await transfer(service, [same], 0.1, total=10 ** 6)
+        assert same.edits >= 1
+        service.stop(same)
+    asyncio.run(main())
+
+
+def test_finished_and_stale_trackers_are_dropped():
+    async def main():
+        service = ProgressService(interval=0.02, stale_after=0.1)
+        done, stalled = Message(1), Message(2)
+        service.update(50, 100, "Downloading", done, time.time())
+        service.update(50, 100, "Downloading", stalled, time.time())
+        service.update(100, 100, "Downloading", done, time.time())
+        assert list(service.trackers) == [(2, 1)]
+
+        await asyncio.sleep(0.3)
+        assert service.trackers == {}
+        assert service._task.done()   # the ticker stops with nothing left to track
+    asyncio.run(main())
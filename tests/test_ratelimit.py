@@ -0,0 +1,19 @@
+import asyncio
+from helper.ratelimit import LOW, RateLimiter, outbound_priority
+
+
+def test_background_calls_get_through_a_small_burst():
+    async def main():
+        for rate in (1, 3, 5):
+            limiter = RateLimiter(global_rate=rate, reserve=5)
+            outbound_priority.set(LOW)
+            await asyncio.wait_for(limiter.acquire("SendMessage", None), 2)
+    asyncio.run(main())
+
+
+def test_background_calls_leave_the_reserve():
+    limiter = RateLimiter(global_rate=30, reserve=5)
+    limiter.global_bucket.tokens = 5
+    now = limiter.global_bucket.stamp
+    assert limiter._delay("SendMessage", None, LOW, now) > 0
+    assert limiter._delay("SendMessage", None, 0, now) == 0
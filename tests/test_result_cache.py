@@ -0,0 +1,96 @@
+import asyncio
+from helper.storage import SQLiteBackend
+from helper.result_cache import ResultCache
+
+
+class BrokenWrites(SQLiteBackend):
+    async def update_one(self, table, _id, fields, upsert=False):
+        if not upsert:
+            raise ConnectionError("backend down")
+        await super().update_one(table, _id, fields, upsert)
+
+
+def test_backend_error_during_lookup_releases_the_key(tmp_path):
+    async def main():
+        cache = ResultCache(BrokenWrites(str(tmp_path / "r.db")))
+        await cache.put("k", "file-id", "video")
+        # the hit-counter update fails: treated as a miss, not an exception
+        assert await cache.acquire("k") is None
+        cache.release("k")
+        assert await asyncio.wait_for(cache.acquire("k"), 1) is None
+        cache.release("k")
+    asyncio.run(main())
+
+
+def test_cancelled_lookup_does_not_block_later_jobs(tmp_path):
+    async def main():
+        backend = SQLiteBackend(str(tmp_path / "r.db"))
+        cache = ResultCache(backend)
+        found = asyncio.Event()
+        original = backend.find_one
+
+        async def slow_find_one(*args):
+            found.set()
+            await asyncio.sleep(10)
+            return await original(*args)
+        backend.find_one = slow_find_one
+        first = asyncio.create_task(cache.acquire("k"))
+        await found.wait()
+        first.cancel()
+        backend.find_one = original
+        assert await asyncio.wait_for(cache.acquire("k"), 1) is None
+        cache.release("k")
+    asyncio.run(main())
+
+
+def test_discard_forgets_the_file_id(tmp_path):
+    async def main():
+        cache = ResultCache(SQLiteBackend(str(tmp_path / "r.db")))
+        await cache.put("k", "dead-id", "video")
+        assert await cache.acquire("k") == "dead-id"
+        await cache.discard("k")
+        assert await cache.acquire("k") is None
+        cache.release("k")
+    asyncio.run(main())
+
+
+def test_fresh_file_id_from_another_job_is_used(tmp_path, monkeypatch):
+    import types
+    from plugins import file_rename
+
+    async def main():
+        cache = ResultCache(SQLiteBackend(str(tmp_path / "r.db")))
+        monkeypatch.setattr(file_rename, "result_cache", cache)
+        settings = types.SimpleNamespace(prefix=None, suffix=None, metadata=False, metadata_code=None, thumbnail=None, caption=None)
+        media = types.SimpleNamespace(file_unique_id="u1", file_size=10, duration=0)
+        key = cache.make_key("u1", "new.mkv", None, "video", None)
+        await cache.put(key, "dead-id", "video")
+        sent = []
+
+        class Bot:
+            async def send_cached_media(self, chat_id, file_id, caption=None):
+                sent.append(file_id)
+                if file_id == "dead-id":
+                    raise ValueError("FILE_REFERENCE_EXPIRED")
+
+        class Status:
+            chat = types.SimpleNamespace(id=1)
+
+            async def delete(self):
+                pass
+
+        discard = cache.discard
+
+        async def discard_then_store(key):
+            await discard(key)
+            # meanwhile a duplicate job finished and stored its upload
+            await cache.put(key, "fresh-id", "video")
+        monkeypatch.setattr(cache, "discard", discard_then_store)
+
+        def full_job(*args):
+            raise AssertionError("the fresh file_id should have been sent")
+        monkeypatch.setattr(file_rename, "RenameJob", full_job)
+        assert await file_rename.rename_file(Bot(), Status(), 5, None, "new.mkv", "video", settings, media) is None
+        assert sent == ["dead-id", "fresh-id"]
+        assert key not in cache._inflight
+    asyncio.run(main())
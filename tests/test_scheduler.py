@@ -0,0 +1,93 @@
+import asyncio
+from helper.scheduler import JobScheduler
+
+
+class Jobs:
+    """Runs jobs through a scheduler and records the order they got their slot in."""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.started = []
+        self.running = {}
+        self.max_running = {}
+
+    async def job(self, name, user_id, size=0, gate=None, on_position=None):
+        async with self.scheduler.slot(user_id, size, on_position, interval=0.01):
+            self.started.append(name)
+            self.running[user_id] = self.running.get(user_id, 0) + 1
+            self.max_running[user_id] = max(self.max_running.get(user_id, 0), self.running[user_id])
+            if gate is not None:
+                await gate.wait()
+            await asyncio.sleep(0)
+            self.running[user_id] -= 1
+
+    async def queue(self, *jobs):
+        tasks = []
+        for job in jobs:
+            tasks.append(asyncio.create_task(self.job(*job)))
+            await asyncio.sleep(0)  # queued in this order
+        return tasks
+
+
+def test_users_are_served_round_robin():
+    async def main():
+        jobs = Jobs(JobScheduler(concurrency=1, per_user=1))
+        gate = asyncio.Event()
+        tasks = await jobs.queue(("hold", "x", 0, gate), ("a1", "a"), ("a2", "a"), ("a3", "a"), ("b1", "b"), ("b2", "b"))
+        gate.set()
+        await asyncio.gather(*tasks)
+        assert jobs.started == ["hold", "a1", "b1", "a2", "b2", "a3"]
+        assert jobs.scheduler.running == 0 and not jobs.scheduler.queues
+    asyncio.run(main())
+
+
+def test_per_user_cap():
+    async def main():
+        scheduler = JobScheduler(concurrency=5, per_user=2)
+        jobs = Jobs(scheduler)
+        gate = asyncio.Event()
+        tasks = await jobs.queue(*[(f"a{i}", "a", 0, gate) for i in range(5)], ("b1", "b", 0, gate))
+        await asyncio.sleep(0.01)
+        assert sorted(jobs.started) == ["a0", "a1", "b1"]
+        assert scheduler.running == 3 and scheduler.depth == 3
+        gate.set()
+        await asyncio.gather(*tasks)
+        assert jobs.max_running == {"a": 2, "b": 1}
+    asyncio.run(main())
+
+
+def test_big_job_is_skipped_at_most_max_skips_times():
+    async def main():
+        jobs = Jobs(JobScheduler(concurrency=1, per_user=1, express_limit=100, max_skips=2))
+        gate = asyncio.Event()
+        small = [(f"s{i}", f"user{i}", 10) for i in range(5)]
+        tasks = await jobs.queue(("hold", "x", 0, gate), ("big", "b", 1000), *small)
+        gate.set()
+        await asyncio.gather(*tasks)
+        assert jobs.started == ["hold", "s0", "s1", "big", "s2", "s3", "s4"]
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_frees_its_place():
+    async def main():
+        scheduler = JobScheduler(concurrency=1, per_user=1)
+        jobs = Jobs(scheduler)
+        gate = asyncio.Event()
+        positions = []
+
+        async def on_position(position, depth):
+            positions.append((position, depth))
+        hold, first, second = await jobs.queue(("hold", "x", 0, gate), ("first", "a"), ("second", "b", 0, None, on_position))
+        await asyncio.sleep(0.02)
+        assert positions == [(2, 2)]
+
+        first.cancel()
+        await asyncio.sleep(0.05)
+        assert scheduler.depth == 1
+        assert positions[-1] == (1, 1)
+
+        gate.set()
+        await asyncio.gather(hold, second)
+        assert jobs.started == ["hold", "second"]
+        assert scheduler.running == 0 and not scheduler.queues and not scheduler.user_running
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+"""
+One suite for every storage backend. MongoDB runs when TEST_MONGO_URL
+points at a reachable server (a throwaway database is used and dropped).
+"""
+import asyncio
+import os
+import uuid
+import pymongo
+import pytest
+import migrate
+from helper.storage import create_backend
+
+
+def mongo_url():
+    url = os.environ.get("TEST_MONGO_URL")
+    if not url:
+        pytest.skip("TEST_MONGO_URL not set")
+    client = pymongo.MongoClient(url, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except Exception as e:
+        pytest.skip(f"MongoDB not reachable: {e}")
+    return client
+
+
+@pytest.fixture(params=["sqlite", "mongo"])
+def backend_name(request):
+    return request.param
+
+
+@pytest.fixture
+def open_backend(backend_name, tmp_path):
+    """A factory, so each test opens its backend inside its own event loop (motor binds to it)."""
+    if backend_name == "mongo":
+        client = mongo_url()
+        name = f"test_{uuid.uuid4().hex[:8]}"
+        yield lambda: create_backend("mongo", uri=os.environ["TEST_MONGO_URL"], database_name=name)
+        client.drop_database(name)
+        client.close()
+    else:
+        path = str(tmp_path / "test.db")
+        yield lambda: create_backend("sqlite", path=path)
+
+
+def run(open_backend, test):
+    async def main():
+        backend = open_backend()
+        try:
+            await test(backend)
+        finally:
+            await backend.close()
+    asyncio.run(main())
+
+
+def test_find_insert_update(open_backend):
+    async def test(db):
+        assert await db.find_one("user", 1) is None
+        await db.insert_one("user", {"_id": 1, "caption": "c", "prefix": "p"})
+        assert await db.find_one("user", 1) == {"_id": 1, "caption": "c", "prefix": "p"}
+        assert await db.find_one("user", 1, ("caption",)) == {"_id": 1, "caption": "c"}
+
+        await db.update_one("user", 1, {"caption": "d"})
+        assert (await db.find_one("user", 1))["caption"] == "d"
+        await db.update_one("user", 2, {"caption": "x"})
+        assert await db.find_one("user", 2) is None
+        await db.update_one("config", "key", {"value": 5}, upsert=True)
+        assert (await db.find_one("config", "key"))["value"] == 5
+    run(open_backend, test)
+
+
+def test_bulk_write(open_backend):
+    async def test(db):
+        await db.insert_one("user", {"_id": 1, "caption": "old"})
+        await db.bulk_write("user", [
+            ("insert", {"_id": 1, "caption": "ignored"}),   # exists: left alone
+            ("insert", {"_id": 2, "caption": "two"}),
+            ("set", 2, {"prefix": "p"}),                     # ordered: sees the insert
+            ("set", 3, {"prefix": "missing"}),               # no upsert
+        ])
+        assert (await db.find_one("user", 1))["caption"] == "old"
+        assert await db.find_one("user", 2) == {"_id": 2, "caption": "two", "prefix": "p"}
+        assert await db.find_one("user", 3) is None
+        await db.bulk_write("user", [])
+        assert await db.count("user") == 2
+    run(open_backend, test)
+
+
+def test_iter_ids_paging(open_backend):
+    async def test(db):
+        ids = list(range(1, 26))
+        await db.bulk_write("user", [("insert", {"_id": i}) for i in reversed(ids)])
+        assert [i async for i in db.iter_ids("user", batch_size=7)] == ids
+        assert [i async for i in db.iter_ids("user", after=20, batch_size=2)] == ids[20:]
+        assert [i async for i in db.iter_ids("user", after=25)] == []
+        assert sorted([d["_id"] async for d in db.iter_docs("user", batch_size=4)]) == ids
+    run(open_backend, test)
+
+
+def test_oldest_ids_and_delete(open_backend):
+    async def test(db):
+        await db.bulk_write("results", [("insert", {"_id": f"k{i}", "used": 100 - i}) for i in range(10)])
+        assert await db.oldest_ids("results", "used", 3) == ["k9", "k8", "k7"]
+        await db.delete_many("results", ["k9", "k8", "nope"])
+        await db.delete_many("results", [])
+        assert await db.count("results") == 8
+        assert await db.oldest_ids("results", "used", 1) == ["k7"]
+    run(open_backend, test)
+
+
+def test_migrate_copies_every_table(backend_name, open_backend, tmp_path, monkeypatch):
+    source_path = str(tmp_path / "source.db")
+
+    async def fill():
+        source = create_backend("sqlite", path=source_path)
+        await source.bulk_write("user", [("insert", {"_id": i, "caption": str(i)}) for i in range(5)])
+        await source.update_one("config", "broadcast", {"running": False}, upsert=True)
+        await source.close()
+    asyncio.run(fill())
+
+    backends = {"source": lambda: create_backend("sqlite", path=source_path), "target": open_backend}
+    monkeypatch.setattr(migrate, "open_backend", lambda name: backends[name]())
+    asyncio.run(migrate.migrate("source", "target", batch_size=2))
+
+    async def check(db):
+        assert await db.count("user") == 5
+        assert (await db.find_one("user", 3))["caption"] == "3"
+        assert (await db.find_one("config", "broadcast"))["running"] is False
+    run(open_backend, check)
@@ -0,0 +1,280 @@
+"""
+In-place tagging against small synthetic files: every case re-parses the
+result, checks that the media data did not move and that the indexes
+(SeekHead, stco/co64) still point at the right bytes.
+"""
+import os
+import struct
+from helper import tags
+from helper.tags import (
+    ebml_element as el, ebml_void_header, encode_size, read_element_header, iter_children, iter_boxes,
+    mp4_box as box, write_tags, can_tag_in_place,
+    EBML_HEADER, SEGMENT, SEEK_HEAD, SEEK, SEEK_ID, SEEK_POSITION, INFO, TITLE, TRACKS, TRACK_ENTRY,
+    TRACK_NAME, TAGS, TAG, SIMPLE_TAG, TAG_NAME, TAG_STRING, CLUSTER, VOID,
+)
+
+NEW = "New Title"
+OLD = "Old Title"   # same length: Info and Tracks fit their old slots exactly
+FRAMES = os.urandom(3000)
+
+
+#======================= Matroska ========================#
+
+def uint(eid, value, length=1):
+    return el(eid, value.to_bytes(length, "big"))
+
+
+def simple_tag(name, value):
+    return el(SIMPLE_TAG, el(TAG_NAME, name.encode()) + el(TAG_STRING, value.encode()))
+
+
+def old_tags(value="old"):
+    return el(TAGS, el(TAG, simple_tag("ARTIST", value) + simple_tag("COMMENT", "keep me")))
+
+
+def void(length):
+    return ebml_void_header(length) + b"\0" * (length - len(ebml_void_header(length)))
+
+
+def mkv(title=OLD, name=OLD, void_size=0, head_tags=None, tail_tags=None, seek=True, seg_size_len=8, frames=FRAMES):
+    info = el(INFO, uint(0x2AD7B1, 1000000, 3) + el(TITLE, title.encode()))
+    tracks = el(TRACKS, el(TRACK_ENTRY, uint(0xD7, 1) + el(TRACK_NAME, name.encode())) +
+                el(TRACK_ENTRY, uint(0xD7, 2) + el(TRACK_NAME, name.encode())))
+    cluster = el(CLUSTER, uint(0xE7, 0) + el(0xA3, frames))
+    body = [info, tracks] + ([head_tags] if head_tags else []) + [cluster] + ([tail_tags] if tail_tags else [])
+    ids = [INFO, TRACKS] + ([TAGS] if head_tags else []) + [CLUSTER] + ([TAGS] if tail_tags else [])
+    seek_len = len(el(SEEK_HEAD, b"".join(tags._seek_entry(i, 0) for i in ids if i != CLUSTER))) if seek else 0
+
+    entries, position = [], seek_len + void_size
+    for eid, blob in zip(ids, body):
+        if eid != CLUSTER:
+            entries.append(tags._seek_entry(eid, position))
+        position += len(blob)
+    head = (el(SEEK_HEAD, b"".join(entries)) if seek else b"") + (void(void_size) if void_size else b"")
+    payload = head + b"".join(body)
+    segment = tags.encode_id(SEGMENT) + encode_size(len(payload), seg_size_len) + payload
+    return el(EBML_HEADER, el(0x4282, b"matroska")) + segment
+
+
+def parse_mkv(data):
+    """{position in segment: (id, payload)} of every level-1 element, checking the sizes add up."""
+    _, size, header = read_element_header(data, 0)
+    seg_offset = header + size
+    eid, seg_size, header = read_element_header(data, seg_offset)
+    assert eid == SEGMENT
+    seg_start = seg_offset + header
+    assert seg_start + seg_size == len(data)
+    elements, pos = {}, seg_start
+    while pos < len(data):
+        eid, size, header = read_element_header(data, pos)
+        elements[pos - seg_start] = (eid, data[pos + header:pos + header + size])
+        pos += header + size
+    assert pos == len(data)
+    return elements
+
+
+def only(elements, eid):
+    found = [(position, payload) for position, (e, payload) in elements.items() if e == eid]
+    assert len(found) == 1
+    return found[0]
+
+
+def children(payload, eid):
+    return [data for e, data, _ in iter_children(payload) if e == eid]
+
+
+def simple_tags(payload):
+    found = {}
+    for tag in children(payload, TAG):
+        for simple in children(tag, SIMPLE_TAG):
+            found[children(simple, TAG_NAME)[0].decode()] = children(simple, TAG_STRING)[0].decode()
+    return found
+
+
+def check_mkv(data, seek=True):
+    elements = parse_mkv(data)
+    _, info = only(elements, INFO)
+    assert children(info, TITLE) == [NEW.encode()]
+    _, tracks = only(elements, TRACKS)
+    assert [children(entry, TRACK_NAME) for entry in children(tracks, TRACK_ENTRY)] == [[NEW.encode()]] * 2
+    _, tag_payload = only(elements, TAGS)
+    assert simple_tags(tag_payload)["ARTIST"] == NEW
+    _, cluster = only(elements, CLUSTER)
+    assert cluster.endswith(FRAMES)
+    if seek:
+        # the SeekHead is the first element and every entry points at its element
+        position, seek_head = only(elements, SEEK_HEAD)
+        assert position == 0
+        pointed = {}
+        for entry in children(seek_head, SEEK):
+            eid = int.from_bytes(children(entry, SEEK_ID)[0], "big")
+            pointed[eid] = int.from_bytes(children(entry, SEEK_POSITION)[0], "big")
+            assert elements[pointed[eid]][0] == eid
+        assert set(pointed) == {INFO, TRACKS, TAGS}
+    return elements
+
+
+def tag(tmp_path, data, name="file.mkv"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return write_tags(str(path), NEW), path.read_bytes()
+
+
+def cluster_offset(data):
+    return data.index(tags.encode_id(CLUSTER))
+
+
+def test_mkv_rewrites_elements_in_their_own_slot(tmp_path):
+    # long old values: the new elements are smaller and fit where the old ones were
+    data = mkv(title="an old and much longer title", name="an old long track name", head_tags=old_tags("x" * 60))
+    ok, result = tag(tmp_path, data)
+    assert ok and len(result) == len(data)
+    assert cluster_offset(result) == cluster_offset(data)
+    elements = check_mkv(result)
+    assert simple_tags(only(elements, TAGS)[1])["COMMENT"] == "keep me"
+    assert any(eid == VOID for eid, _ in elements.values())  # what was left over became padding
+
+
+def test_mkv_uses_void_padding(tmp_path):
+    data = mkv(void_size=400)
+    ok, result = tag(tmp_path, data)
+    assert ok and len(result) == len(data)
+    assert cluster_offset(result) == cluster_offset(data)
+    check_mkv(result)
+
+
+def test_mkv_moves_tags_to_the_end(tmp_path):
+    # room for the longer SeekHead but not for a Tags element before the Cluster
+    data = mkv(void_size=30)
+    ok, result = tag(tmp_path, data)
+    assert ok and len(result) > len(data)
+    assert cluster_offset(result) == cluster_offset(data)
+    elements = check_mkv(result)
+    position, _ = only(elements, TAGS)
+    assert position > only(elements, CLUSTER)[0]
+
+
+def test_mkv_rewrites_tags_already_at_the_end(tmp_path):
+    data = mkv(tail_tags=old_tags())
+    ok, result = tag(tmp_path, data)
+    assert ok
+    assert cluster_offset(result) == cluster_offset(data)
+    elements = check_mkv(result)
+    assert simple_tags(only(elements, TAGS)[1])["COMMENT"] == "keep me"
+
+
+def test_mkv_without_room_is_left_untouched(tmp_path):
+    # a longer title and no padding
+    data = mkv(title="old")
+    ok, result = tag(tmp_path, data)
+    assert not ok and result == data
+
+    # no SeekHead, so Tags can't go to the end of the file
+    data = mkv(seek=False)
+    ok, result = tag(tmp_path, data)
+    assert not ok and result == data
+
+    # Tags would go to the end, but the 2-byte Segment size can't hold the new size
+    small = mkv(void_size=30, seg_size_len=2)
+    payload = len(small) - small.index(tags.encode_id(SEGMENT)) - 6
+    data = mkv(void_size=30, seg_size_len=2, frames=os.urandom(16382 - 20 - payload) + FRAMES)
+    ok, result = tag(tmp_path, data)
+    assert not ok and result == data
+
+
+#======================= MP4 ========================#
+
+SAMPLES = [os.urandom(500) for _ in range(4)]
+
+
+def full_box(btype, payload):
+    return box(btype, b"\0" * 4 + payload)
+
+
+def ilst_item(key, text):
+    return box(key, box(b"data", struct.pack(">II", 1, 0) + text.encode()))
+
+
+def moov(mdat_offset, co64=False, ilst=None):
+    offsets = [mdat_offset + 8 + i * 500 for i in range(len(SAMPLES))]
+    if co64:
+        table = full_box(b"co64", struct.pack(">I", len(offsets)) + b"".join(struct.pack(">Q", o) for o in offsets))
+    else:
+        table = full_box(b"stco", struct.pack(">I", len(offsets)) + b"".join(struct.pack(">I", o) for o in offsets))
+    stbl = box(b"stbl", table)
+    trak = box(b"trak", box(b"mdia", box(b"minf", stbl)))
+    kids = full_box(b"mvhd", b"\0" * 96) + trak
+    if ilst is not None:
+        hdlr = full_box(b"hdlr", b"\0" * 4 + b"mdir" + b"appl" + b"\0" * 9)
+        kids += box(b"udta", full_box(b"meta", hdlr + box(b"ilst", ilst)))
+    return box(b"moov", kids)
+
+
+def mp4(layout, co64=False, ilst=None, free=0):
+    ftyp = box(b"ftyp", b"isom\0\0\0\0isom")
+    mdat = box(b"mdat", b"".join(SAMPLES))
+    if layout == "moov-last":
+        return ftyp + mdat + moov(len(ftyp), co64, ilst)
+    padding = box(b"free", b"\0" * (free - 8)) if free else b""
+    size = len(moov(0, co64, ilst)) + len(padding)
+    return ftyp + moov(len(ftyp) + size, co64, ilst) + padding + mdat
+
+
+def find(payload, *path):
+    for btype, data, _ in iter_boxes(payload):
+        if btype == path[0]:
+            return data if len(path) == 1 else find(data, *path[1:])
+    return None
+
+
+def check_mp4(data):
+    top = [(btype, payload) for btype, payload, _ in iter_boxes(data)]   # sizes cover the file exactly
+    assert [b for b, _ in top].count(b"moov") == 1
+    moov_payload = dict(top)[b"moov"]
+    stbl = find(moov_payload, b"trak", b"mdia", b"minf", b"stbl")
+    stco, co64 = find(stbl, b"stco"), find(stbl, b"co64")
+    if co64 is not None:
+        offsets = [struct.unpack(">Q", co64[8 + i * 8:16 + i * 8])[0] for i in range(len(SAMPLES))]
+    else:
+        offsets = [struct.unpack(">I", stco[8 + i * 4:12 + i * 4])[0] for i in range(len(SAMPLES))]
+    assert [data[o:o + 500] for o in offsets] == SAMPLES
+    ilst = find(find(moov_payload, b"udta", b"meta")[4:], b"ilst")
+    items = {key: find(value, b"data")[8:].decode() for key, value, _ in iter_boxes(ilst)}
+    assert items[b"\xa9nam"] == NEW and items[b"\xa9ART"] == NEW
+    return items
+
+
+def test_mp4_moov_last(tmp_path):
+    for co64 in (False, True):
+        ok, result = tag(tmp_path, mp4("moov-last", co64), "file.mp4")
+        assert ok
+        check_mp4(result)
+
+
+def test_mp4_moov_before_free_padding(tmp_path):
+    data = mp4("moov-first", free=200)
+    ok, result = tag(tmp_path, data, "file.mp4")
+    assert ok and len(result) == len(data)
+    assert result.index(b"mdat") == data.index(b"mdat")
+    check_mp4(result)
+
+
+def test_mp4_existing_ilst_is_updated(tmp_path):
+    ilst = ilst_item(b"\xa9nam", "old") + ilst_item(b"\xa9too", "encoder")
+    for data in (mp4("moov-first", co64=True, ilst=ilst, free=100), mp4("moov-last", ilst=ilst)):
+        ok, result = tag(tmp_path, data, "file.mp4")
+        assert ok
+        items = check_mp4(result)
+        assert items[b"\xa9too"] == "encoder"
+
+
+def test_mp4_without_room_is_left_untouched(tmp_path):
+    for free in (0, 16):
+        data = mp4("moov-first", free=free)
+        ok, result = tag(tmp_path, data, "file.mp4")
+        assert not ok and result == data
+
+
+def test_can_tag_in_place():
+    assert can_tag_in_place("a.MKV") and can_tag_in_place("b.mp4")
+    assert not can_tag_in_place("c.avi") and not can_tag_in_place("mkv") and not can_tag_in_place(None)
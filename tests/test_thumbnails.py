@@ -0,0 +1,71 @@
+import asyncio
+import numpy as np
+from PIL import Image
+from helper import ffmpeg
+
+
+class FakeFfmpeg:
+    """Writes frame `i` of FRAMES to the i-th .jpg output of the command, like ffmpeg would."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.commands = []
+
+    async def __call__(self, *command, **kwargs):
+        self.commands.append(command)
+        jpgs = [arg for arg in command if str(arg).endswith(".jpg")]
+        for frame, path in zip(self.frames, jpgs):
+            Image.fromarray(frame).save(path)
+        return self
+
+    async def wait(self):
+        self.returncode = 0
+
+    @property
+    def stdout(self):
+        return self._lines()
+
+    async def _lines(self):
+        for line in (b"out_time_us=5000000\n",):
+            yield line
+
+    @property
+    def stderr(self):
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"  Duration: 00:01:40.00, start: 0.000000, bitrate: 1 kb/s\n")
+        reader.feed_eof()
+        return reader
+
+
+def frames():
+    rng = np.random.default_rng(1)
+    black = np.zeros((90, 160), dtype=np.uint8)
+    flat = np.full((90, 160), 128, dtype=np.uint8)
+    busy = rng.integers(0, 256, (90, 160), dtype=np.uint8)
+    return [black, flat, busy, black, flat, black]
+
+
+def test_both_paths_pick_the_same_frame(tmp_path, monkeypatch):
+    async def main():
+        fake = FakeFfmpeg(frames())
+        monkeypatch.setattr(asyncio, "create_subprocess_exec", fake)
+        video = str(tmp_path / "in.mkv")
+
+        (tmp_path / "a").mkdir()
+        smart = await ffmpeg.smart_thumbnail(video, str(tmp_path / "a"), 100)
+        thumb_path = str(tmp_path / "thumb.jpg")
+        _, combined, info = await ffmpeg.process_media(video, None, None, thumb_path, 100)
+
+        assert combined == thumb_path
+        assert smart.endswith("_2.jpg")     # the busy frame wins, not the black or flat ones
+        with Image.open(smart) as a, Image.open(combined) as b:
+            assert np.array_equal(np.asarray(a), np.asarray(b))
+        # losers are deleted, and no thumbnail filter is used any more
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["a", "thumb.jpg"]
+        assert len(list((tmp_path / "a").iterdir())) == 1
+        seeks = [arg for prev, arg in zip(fake.commands[0], fake.commands[0][1:]) if prev == "-ss"]
+        graph = fake.commands[1][fake.commands[1].index("-filter_complex") + 1]
+        assert len(seeks) == 6 and all(f"gte(t\\,{t})" in graph for t in seeks)
+        assert not any("thumbnail=" in str(arg) for arg in fake.commands[1])
+        assert info.duration == 100
+    asyncio.run(main())
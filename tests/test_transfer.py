@@ -0,0 +1,120 @@
+import asyncio
+import os
+import random
+import types
+from pyrogram import raw
+from pyrogram.file_id import FileId, FileType
+from helper.transfer import TransferEngine
+
+DATA = os.urandom(3 * 1024 * 1024 + 12345)
+
+
+class PartServer:
+    """Answers GetFile from DATA and stores SaveBigFilePart parts, slowly and out of order."""
+
+    def __init__(self, cdn=False):
+        self.cdn = cdn
+        self.parts = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def invoke(self, query, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(random.uniform(0, 0.01))
+            if isinstance(query, raw.functions.upload.GetFile):
+                if self.cdn:
+                    return raw.types.upload.FileCdnRedirect(dc_id=1, file_token=b"", encryption_key=b"", encryption_iv=b"", file_hashes=[])
+                return raw.types.upload.File(
+                    type=raw.types.storage.FilePartial(), mtime=0,
+                    bytes=DATA[query.offset:query.offset + query.limit]
+                )
+            if isinstance(query, raw.functions.upload.SaveBigFilePart):
+                assert query.file_total_parts == -(-len(DATA) // TransferEngine.UPLOAD_PART)
+                self.parts[query.file_part] = query.bytes
+                return True
+            raise AssertionError(f"unexpected query {query}")
+        finally:
+            self.in_flight -= 1
+
+
+class FakeClient:
+    def __init__(self):
+        self.storage = types.SimpleNamespace(dc_id=self._dc_id)
+        self.sequential = 0
+
+    @staticmethod
+    async def _dc_id():
+        return 2
+
+    @staticmethod
+    def rnd_id():
+        return 777
+
+    async def download_media(self, message, file_name, progress=None, progress_args=()):
+        self.sequential += 1
+        with open(file_name, "wb") as f:
+            f.write(DATA)
+        return file_name
+
+
+def media_message():
+    file_id = FileId(file_type=FileType.DOCUMENT, dc_id=2, media_id=1, access_hash=2, file_reference=b"ref").encode()
+    document = types.SimpleNamespace(file_id=file_id, file_size=len(DATA))
+    return types.SimpleNamespace(media=types.SimpleNamespace(value="document"), document=document)
+
+
+def engine_with(server, min_size=1):
+    engine = TransferEngine(parallelism=4, sessions=2, min_size=min_size)
+
+    async def sessions(client, dc_id):
+        return [server, server]
+    engine.sessions = sessions
+    return engine
+
+
+def test_parallel_download_is_byte_identical(tmp_path):
+    async def main():
+        server = PartServer()
+        client = FakeClient()
+        seen = []
+
+        async def progress(current, total):
+            seen.append(current)
+        path = await engine_with(server).download(client, media_message(), str(tmp_path / "down.bin"), progress)
+        with open(path, "rb") as f:
+            assert f.read() == DATA
+        assert client.sequential == 0
+        assert server.max_in_flight > 1
+        assert max(seen) == len(DATA)
+    asyncio.run(main())
+
+
+def test_parallel_upload_is_byte_identical(tmp_path):
+    async def main():
+        server = PartServer()
+        path = tmp_path / "up.bin"
+        path.write_bytes(DATA)
+        result = await engine_with(server).save_big_file(FakeClient(), str(path))
+        assert isinstance(result, raw.types.InputFileBig)
+        assert result.parts == len(server.parts)
+        assert b"".join(server.parts[i] for i in range(result.parts)) == DATA
+        assert server.max_in_flight > 1
+    asyncio.run(main())
+
+
+def test_falls_back_to_sequential_download(tmp_path):
+    async def main():
+        # CDN redirect: the parallel path gives up and the partial file is replaced
+        client = FakeClient()
+        path = await engine_with(PartServer(cdn=True)).download(client, media_message(), str(tmp_path / "cdn.bin"))
+        assert client.sequential == 1
+        with open(path, "rb") as f:
+            assert f.read() == DATA
+
+        # below min_size parallel transfers are not used at all
+        client = FakeClient()
+        await engine_with(PartServer(), min_size=len(DATA) + 1).download(client, media_message(), str(tmp_path / "small.bin"))
+        assert client.sequential == 1
+    asyncio.run(main())
@@ -0,0 +1,33 @@
+import asyncio
+import threading
+from helper.workspace import WorkspaceManager
+
+
+def test_disk_is_measured_off_the_event_loop(tmp_path, monkeypatch):
+    async def main():
+        manager = WorkspaceManager(str(tmp_path / "ws"), quota=100, min_free=0, poll=0.01)
+        loop_thread = threading.get_ident()
+        walked_on = []
+        usage = manager.usage
+
+        def tracked_usage():
+            walked_on.append(threading.get_ident())
+            return usage()
+        monkeypatch.setattr(manager, "usage", tracked_usage)
+
+        async with manager.job(60) as first:
+            with open(first.file("a.bin"), "wb") as f:
+                f.write(b"x" * 10)
+            pending = manager.job(60)
+            second = asyncio.create_task(pending.__aenter__())
+            await asyncio.sleep(0.05)
+            # over the quota: waits instead of being admitted
+            assert not second.done() and manager.waiting == 1
+            stats = await manager.stats()
+            assert stats["usage"] == 10 and stats["reserved"] == 60
+        await asyncio.wait_for(second, 1)
+        assert manager.reserved == 60
+        await pending.__aexit__(None, None, None)
+        assert manager.reserved == 0
+        assert walked_on and loop_thread not in walked_on
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from helper.storage import SQLiteBackend
+from helper.write_buffer import WriteBehindBuffer
+from helper.database import Database
+
+
+class FlakyBackend(SQLiteBackend):
+    down = False
+
+    async def bulk_write(self, table, ops):
+        if self.down:
+            raise ConnectionError("backend down")
+        await super().bulk_write(table, ops)
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return FlakyBackend(str(tmp_path / "test.db"))
+
+
+def test_read_sees_buffered_update(backend):
+    async def main():
+        db = Database(backend)
+        db.buffer = WriteBehindBuffer(backend, "user", interval=60)
+        await backend.insert_one("user", db.new_user(1))
+        await db.set_caption(1, "new caption")
+        settings = await db.get_user_settings(1)
+        assert settings.caption == "new caption"
+        # and it is what got cached
+        assert (await db.get_user_settings(1)).caption == "new caption"
+        await db.close()
+    asyncio.run(main())
+
+
+def test_read_sees_buffered_insert(backend):
+    async def main():
+        db = Database(backend)
+        db.buffer = WriteBehindBuffer(backend, "user", interval=60)
+        await db.buffer.insert(db.new_user(2))
+        await db.buffer.update(2, {"prefix": "[x]"})
+        settings = await db.get_user(2)
+        assert settings is not None and settings.prefix == "[x]"
+        await db.close()
+    asyncio.run(main())
+
+
+def test_failed_flush_keeps_one_op_per_user_and_stays_bounded(backend):
+    async def main():
+        buffer = WriteBehindBuffer(backend, "user", interval=60, max_pending=3)
+        await backend.insert_one("user", {"_id": 1, "caption": None})
+        await buffer.update(1, {"caption": "a"})
+        backend.down = True
+        with pytest.raises(ConnectionError):
+            await buffer.flush()
+        await buffer.update(1, {"caption": "b"})
+        await buffer.update(1, {"prefix": "p"})
+        assert len(buffer) == 1
+
+        await buffer.update(2, {"caption": "x"})
+        await buffer.update(3, {"caption": "y"})
+        with pytest.raises(ConnectionError):
+            await buffer.update(4, {"caption": "z"})   # full and the backend is down
+        assert len(buffer) == 3
+
+        backend.down = False
+        await buffer.flush()
+        doc = await backend.find_one("user", 1)
+        assert doc["caption"] == "b" and doc["prefix"] == "p"
+        assert len(buffer) == 0
+        await buffer.close()
+        await backend.close()
+    asyncio.run(main())